@@ -12,6 +12,10 @@ e.g. to benchmark LazyMemmapStorage, run the following commands using either two
     - python3 benchmark_sample_latency_over_rpc.py --rank=0 --storage=LazyMemmapStorage
     - python3 benchmark_sample_latency_over_rpc.py --rank=1 --storage=LazyMemmapStorage
 This code is based on examples/distributed/distributed_replay_buffer.py.
+
+For comparison, the same benchmark can be run with a local replay buffer server
+process exchanging the batches through shared memory (no rank needed):
+    - python3 benchmark_sample_latency_over_rpc.py --transport=shm --storage=LazyMemmapStorage
 """
 import argparse
 import os
@@ -20,12 +24,13 @@ import sys
 import time
 import timeit
 from datetime import datetime
+from functools import partial
 
 import torch
 import torch.distributed.rpc as rpc
 from tensordict import TensorDict
 from torchrl._utils import logger as torchrl_logger
-from torchrl.data.replay_buffers import RemoteTensorDictReplayBuffer
+from torchrl.data.replay_buffers import RemoteTensorDictReplayBuffer, ReplayBufferServer
 from torchrl.data.replay_buffers.samplers import RandomSampler
 from torchrl.data.replay_buffers.storages import (
     LazyMemmapStorage,
@@ -73,6 +78,14 @@ parser.add_argument(
     help="Storage type [LazyMemmapStorage, LazyTensorStorage, ListStorage]",
 )
 
+parser.add_argument(
+    "--transport",
+    type=str,
+    default="rpc",
+    help="Transport [rpc, shm]. shm runs a local ReplayBufferServer exchanging "
+    "batches through shared memory.",
+)
+
 
 class DummyTrainerNode:
     def __init__(self) -> None:
@@ -139,11 +152,60 @@ class ReplayBufferNode(RemoteTensorDictReplayBuffer):
         self.extend(tds)
 
 
+def run_shm_benchmark() -> list[float]:
+    server = ReplayBufferServer(
+        template=TensorDict(
+            {
+                "observation": torch.zeros(TENSOR_SIZE),
+                "next_observation": torch.zeros(TENSOR_SIZE),
+            }
+        ),
+        batch_size=BATCH_SIZE,
+        storage=partial(
+            storage_options[storage_type],
+            max_size=1000000,
+            **storage_arg_options[storage_type],
+        ),
+        sampler=RandomSampler,
+        writer=RoundRobinWriter,
+    )
+    client = server.clients[0]
+    client.extend(
+        TensorDict(
+            {
+                "observation": torch.randn(BUFFER_SIZE, TENSOR_SIZE),
+                "next_observation": torch.randn(BUFFER_SIZE, TENSOR_SIZE),
+            },
+            batch_size=[BUFFER_SIZE],
+        )
+    )
+    results = []
+    for i in range(REPEATS):
+        start_time = timeit.default_timer()
+        ret = client.sample(reuse_output=True)
+        # make sure the content is read
+        ret["observation"] + 1
+        ret["next_observation"] + 1
+        result = timeit.default_timer() - start_time
+        if i == 0:
+            continue
+        results.append(result)
+        torchrl_logger.info(f"{i}, {results[-1]}")
+    server.shutdown()
+    return results
+
+
 if __name__ == "__main__":
     args = parser.parse_args()
     rank = args.rank
     storage_type = args.storage
 
+    if args.transport == "shm":
+        torchrl_logger.info(f"Transport: shm; Storage: {storage_type}")
+        tensor_results = torch.tensor(run_shm_benchmark())
+        torchrl_logger.info(f"Mean: {torch.mean(tensor_results)}")
+        sys.exit(0)
+
     torchrl_logger.info(f"Rank: {rank}; Storage: {storage_type}")
 
     os.environ["MASTER_ADDR"] = "localhost"
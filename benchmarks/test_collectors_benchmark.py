@@ -8,17 +8,23 @@ import time
 import pytest
 import torch.cuda
 import tqdm
+from tensordict import TensorDict
+from tensordict.nn import TensorDictModule, TensorDictSequential
 
 from torchrl.collectors import (
+    DeltaWeightUpdater,
     MultiaSyncDataCollector,
+    MultiProcessedWeightUpdater,
     MultiSyncDataCollector,
     SyncDataCollector,
 )
 from torchrl.data import LazyTensorStorage, ReplayBuffer
 from torchrl.data.utils import CloudpickleWrapper
 from torchrl.envs import EnvCreator, GymEnv, ParallelEnv, StepCounter, TransformedEnv
+from torchrl.envs.custom.pendulum import PendulumEnv
 from torchrl.envs.libs.dm_control import DMControlEnv
 from torchrl.envs.utils import RandomPolicy
+from torchrl.modules import Actor, MLP
 
 
 def single_collector_setup():
@@ -146,6 +152,68 @@ def async_collector_setup_pixels():
     return ((c,), {})
 
 
+def _make_pendulum():
+    return TransformedEnv(PendulumEnv(), StepCounter(50))
+
+
+def _make_pendulum_policy():
+    return TensorDictSequential(
+        TensorDictModule(
+            lambda th, thdot: torch.stack([th, thdot], -1),
+            in_keys=["th", "thdot"],
+            out_keys=["observation"],
+        ),
+        Actor(MLP(in_features=2, out_features=1, num_cells=[256, 256])),
+    )
+
+
+def pipelined_collector_setup(pipelined, num_workers=4):
+    env = ParallelEnv(num_workers, EnvCreator(_make_pendulum))
+    policy = _make_pendulum_policy()
+    c = SyncDataCollector(
+        env,
+        policy,
+        total_frames=-1,
+        frames_per_batch=100 * num_workers,
+        pipelined=pipelined,
+    )
+    c = iter(c)
+    for i, _ in enumerate(c):
+        if i == 2:
+            break
+    return ((c,), {})
+
+
+def inference_server_collector_setup(inference_server, num_workers=4):
+    c = MultiSyncDataCollector(
+        [EnvCreator(_make_pendulum)] * num_workers,
+        _make_pendulum_policy(),
+        total_frames=-1,
+        frames_per_batch=100 * num_workers,
+        inference_server=inference_server,
+    )
+    c = iter(c)
+    for i, _ in enumerate(c):
+        if i == 2:
+            break
+    return ((c,), {})
+
+
+def ring_collector_setup(num_slots, num_workers=4):
+    c = MultiaSyncDataCollector(
+        [EnvCreator(_make_pendulum)] * num_workers,
+        _make_pendulum_policy(),
+        total_frames=-1,
+        frames_per_batch=100,
+        num_slots=num_slots,
+    )
+    c = iter(c)
+    for i, _ in enumerate(c):
+        if i == num_workers:
+            break
+    return ((c,), {})
+
+
 def execute_collector(c):
     # will run for 9 iterations (1 during setup)
     next(c)
@@ -184,6 +252,94 @@ def test_async_pixels(benchmark):
     benchmark(execute_collector, c)
 
 
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_pipelined(benchmark, pipelined):
+    (c,), _ = pipelined_collector_setup(pipelined)
+    try:
+        benchmark(execute_collector, c)
+    finally:
+        c.shutdown()
+
+
+@pytest.mark.parametrize("inference_server", [False, True])
+def test_inference_server(benchmark, inference_server):
+    (c,), _ = inference_server_collector_setup(inference_server)
+    try:
+        benchmark(execute_collector, c)
+    finally:
+        c.shutdown()
+
+
+def execute_collector_bursty(c, num_batches=8):
+    # A consumer that processes several batches at once after a pause (e.g. a
+    # training step), during which the workers can only run ahead as far as their
+    # ring of buffers allows.
+    time.sleep(0.1)
+    for _ in range(num_batches):
+        next(c)
+
+
+@pytest.mark.parametrize("num_slots", [1, 4])
+def test_async_ring(benchmark, num_slots):
+    (c,), _ = ring_collector_setup(num_slots)
+    try:
+        benchmark(execute_collector_bursty, c)
+    finally:
+        c.shutdown()
+
+
+def weight_update_setup(mode, frozen, num_workers=4):
+    torch.manual_seed(0)
+    policy = MLP(in_features=256, out_features=256, num_cells=[1024] * 4)
+    weights = TensorDict.from_module(policy).data
+    if mode is None:
+        policy_weights = {
+            i: weights.clone().share_memory_() for i in range(num_workers)
+        }
+        updater = MultiProcessedWeightUpdater(
+            get_server_weights=None, policy_weights=policy_weights
+        )
+
+        def update():
+            # The full weights are copied in the memory shared with every worker
+            updater(weights)
+
+    else:
+        updater = DeltaWeightUpdater(mode=mode, delta_dtype=torch.bfloat16, topk=0.01)
+        updater._init_subscribers(weights, num_workers)
+        subscribers = [updater.subscriber(i) for i in range(num_workers)]
+        local_weights = [subscriber.init_weights() for subscriber in subscribers]
+
+        def update():
+            # The payload is sent once and decoded by every worker
+            updater(weights)
+            for subscriber, worker_weights in zip(subscribers, local_weights):
+                while subscriber.current_version < updater.version:
+                    subscriber.pull(worker_weights)
+
+    # Only the last layer is trained if the rest of the network is frozen
+    trained = weights[str(len(policy) - 1)] if frozen else weights
+
+    def train_step():
+        trained.apply_(lambda x: x.add_(torch.randn_like(x), alpha=1e-3))
+
+    return updater, weights, update, train_step
+
+
+@pytest.mark.parametrize("frozen", [False, True])
+@pytest.mark.parametrize("mode", [None, "changed", "delta", "topk"])
+def test_weight_update(benchmark, mode, frozen):
+    updater, weights, update, train_step = weight_update_setup(mode, frozen)
+    benchmark.pedantic(update, setup=train_step, rounds=20, warmup_rounds=1)
+    if mode is None:
+        bytes_sent = len(updater.all_worker_ids()) * sum(
+            v.numel() * v.element_size() for v in weights.values(True, True)
+        )
+    else:
+        bytes_sent = updater.last_bytes_sent
+    benchmark.extra_info["bytes_per_update"] = bytes_sent
+
+
 class TestRBGCollector:
     @pytest.mark.parametrize(
         "n_col,n_wokrers_per_col",
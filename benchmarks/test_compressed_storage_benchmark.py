@@ -7,6 +7,8 @@ import pickle
 
 import pytest
 import torch
+from tensordict import TensorDict
+from torchrl.data import CompressedListStorage
 
 
 try:
@@ -143,3 +145,35 @@ class TestCompressedStorageBenchmark:
 
         # Run the actual benchmark
         benchmark(serialize_fn, data)
+
+    @staticmethod
+    def make_storage(codec: str, num_threads: int, size: int = 256):
+        try:
+            storage = CompressedListStorage(
+                size, codec=codec, num_threads=num_threads, compression_level=1
+            )
+        except ImportError as err:
+            pytest.skip(str(err))
+        # Atari-like stacks of frames with some structure to compress
+        observations = torch.randint(0, 8, (size, 4, 84, 84), dtype=torch.uint8)
+        data = TensorDict(
+            {"observations": observations, "rewards": torch.zeros(size)}, [size]
+        )
+        return storage, data
+
+    @pytest.mark.parametrize("codec", ["zstd", "lz4", "zlib", "raw"])
+    @pytest.mark.parametrize("num_threads", [1, 4])
+    def test_compressed_storage_set_batch(self, benchmark, codec, num_threads):
+        """Benchmark the batched compression of 256 stacks of frames."""
+        storage, data = self.make_storage(codec, num_threads)
+        cursor = torch.arange(data.shape[0])
+        benchmark(storage.set, cursor, data)
+
+    @pytest.mark.parametrize("codec", ["zstd", "lz4", "zlib", "raw"])
+    @pytest.mark.parametrize("num_threads", [1, 4])
+    def test_compressed_storage_get_batch(self, benchmark, codec, num_threads):
+        """Benchmark the batched decompression of 256 stacks of frames."""
+        storage, data = self.make_storage(codec, num_threads)
+        cursor = torch.arange(data.shape[0])
+        storage.set(cursor, data)
+        benchmark(storage.get, cursor)
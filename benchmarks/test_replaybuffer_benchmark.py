@@ -4,10 +4,14 @@
 # LICENSE file in the root directory of this source tree.
 import argparse
 import functools
+import os
+import tempfile
+from pathlib import Path
 
 import pytest
 import torch
 from tensordict import TensorDict
+from torch import multiprocessing as mp
 
 from torchrl.data import (
     LazyMemmapStorage,
@@ -21,6 +25,12 @@ from torchrl.data.replay_buffers import (
     RandomSampler,
     SamplerWithoutReplacement,
     SliceSampler,
+    TensorDictRoundRobinWriter,
+)
+from torchrl.data.replay_buffers.samplers import (
+    _slice_index,
+    MinSegmentTreeFp32,
+    SumSegmentTreeFp32,
 )
 
 _TensorDictPrioritizedReplayBuffer = functools.partial(
@@ -249,6 +259,212 @@ def test_rb_extend_sample(
     )
 
 
+def _looped_slice_index(start, seq_length, storage_length):
+    # Former SliceSampler code path: one arange per slice when the lengths differ
+    index = []
+    for _start, _seq_len in zip(start, seq_length):
+        arange = torch.arange(_seq_len, dtype=start.dtype).unsqueeze(-1)
+        index.append(arange + _start.expand(arange.shape[0], -1))
+    index = torch.cat(index)
+    index[:, 0] %= storage_length
+    return seq_length.cumsum(0) - seq_length, index
+
+
+@pytest.mark.parametrize("impl", ["loop", "fused"])
+@pytest.mark.parametrize("num_slices,slice_len", [[32, 64], [256, 64]])
+def test_slice_index_variable_length(benchmark, impl, num_slices, slice_len):
+    # strict_length=False and span clip the slices to their trajectory
+    torch.manual_seed(0)
+    storage_length = 1_000_000
+    start = torch.randint(storage_length, (num_slices, 1))
+    seq_length = torch.randint(1, slice_len + 1, (num_slices,))
+    fn = _looped_slice_index if impl == "loop" else _slice_index
+    benchmark(fn, start, seq_length, storage_length)
+
+
+@pytest.mark.parametrize(
+    "strict_length,span", [[True, False], [False, False], [True, 8], [False, True]]
+)
+def test_slice_sampler_sample(benchmark, strict_length, span):
+    torch.manual_seed(0)
+    size = 100_000
+    rb = TensorDictReplayBuffer(
+        storage=LazyTensorStorage(size),
+        sampler=SliceSampler(
+            slice_len=64,
+            traj_key="traj",
+            cache_values=True,
+            strict_length=strict_length,
+            span=span,
+        ),
+        batch_size=64 * 32,
+    )
+    # trajectories of random lengths, some shorter than the slices
+    traj = torch.randint(size // 50, (size,)).sort().values
+    rb.extend(TensorDict({"a": torch.zeros(size, 5), "traj": traj}, [size]))
+    benchmark(sample, rb)
+
+
+class create_segment_trees:
+    def __init__(self, size, batch_size, backend):
+        self.size = size
+        self.batch_size = batch_size
+        self.backend = backend
+
+    def __call__(self):
+        sum_tree = SumSegmentTreeFp32(self.size)
+        min_tree = MinSegmentTreeFp32(self.size)
+        priority = torch.rand(self.size)
+        sum_tree[torch.arange(self.size)] = priority
+        min_tree[torch.arange(self.size)] = priority
+        index = torch.randint(self.size, (self.batch_size,))
+        priority = torch.rand(self.batch_size)
+        mass = torch.rand(self.batch_size) * sum_tree.query(0, self.size)
+        if self.backend == "numpy":
+            # Former PrioritizedSampler code path: element-wise, single thread
+            index, priority, mass = index.numpy(), priority.numpy(), mass.numpy()
+        return ((sum_tree, min_tree, index, priority, mass), {})
+
+
+def update_and_scan(sum_tree, min_tree, index, priority, mass):
+    sum_tree[index] = priority
+    min_tree[index] = priority
+    sum_tree.scan_lower_bound(mass)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "torch"])
+@pytest.mark.parametrize(
+    "size,batch_size", [[1_000_000, 4096], [10_000_000, 4096], [10_000_000, 256]]
+)
+def test_segment_tree_update_and_scan(benchmark, backend, size, batch_size):
+    benchmark.pedantic(
+        update_and_scan,
+        setup=create_segment_trees(size=size, batch_size=batch_size, backend=backend),
+        iterations=1,
+        warmup_rounds=2,
+        rounds=20,
+    )
+
+
+class create_cold_memmap_rb:
+    """Creates a populated memmap buffer whose files are dropped from the page cache.
+
+    Evicting the pages of the memmap files before each round emulates a buffer
+    that is larger than the page cache: every sample reads from disk.
+    """
+
+    def __init__(self, sampler, size, coalesce_reads):
+        self.sampler = sampler
+        self.size = size
+        self.coalesce_reads = coalesce_reads
+        self.rb = None
+
+    def __call__(self):
+        if self.rb is None:
+            self.tmpdir = tempfile.TemporaryDirectory()
+            storage = LazyMemmapStorage(
+                self.size,
+                scratch_dir=self.tmpdir.name,
+                coalesce_reads=self.coalesce_reads,
+            )
+            self.rb = TensorDictReplayBuffer(
+                storage=storage, sampler=self.sampler(), batch_size=256
+            )
+            data = TensorDict(
+                {
+                    "a": torch.zeros(self.size, 5),
+                    ("b", "c"): torch.zeros(self.size, 3, 32, 32, dtype=torch.uint8),
+                    "traj": torch.arange(self.size) // 123,
+                },
+                batch_size=[self.size],
+            )
+            self.rb.extend(data)
+        for filename in Path(self.tmpdir.name).rglob("*.memmap"):
+            fd = os.open(filename, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        return ((self.rb,), {})
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available."
+)
+@pytest.mark.parametrize("coalesce_reads", [False, True])
+@pytest.mark.parametrize(
+    "sampler",
+    [RandomSampler, functools.partial(SliceSampler, num_slices=8, traj_key="traj")],
+)
+def test_rb_sample_cold_memmap(benchmark, sampler, coalesce_reads):
+    torch.manual_seed(0)
+    benchmark.pedantic(
+        sample,
+        setup=create_cold_memmap_rb(
+            sampler=sampler, size=200_000, coalesce_reads=coalesce_reads
+        ),
+        iterations=1,
+        rounds=20,
+    )
+
+
+def _shared_rb_writer(rb, data, stop):
+    while not stop.is_set():
+        rb.extend(data)
+
+
+class create_shared_rb:
+    """Creates a shared buffer and starts processes extending it until the round ends."""
+
+    def __init__(self, num_writers, lock_free, size=100_000):
+        self.num_writers = num_writers
+        self.lock_free = lock_free
+        self.size = size
+
+    def __call__(self):
+        rb = TensorDictReplayBuffer(
+            storage=LazyMemmapStorage(self.size),
+            writer=TensorDictRoundRobinWriter(lock_free=self.lock_free),
+            batch_size=256,
+            shared=True,
+        )
+        data = TensorDict(
+            {
+                "a": torch.zeros(256, 5),
+                ("b", "c"): torch.zeros(256, 3, 32, 32, dtype=torch.uint8),
+            },
+            batch_size=[256],
+        )
+        rb.extend(data)
+        stop = mp.Event()
+        procs = [
+            mp.Process(target=_shared_rb_writer, args=(rb, data, stop))
+            for _ in range(self.num_writers)
+        ]
+        for proc in procs:
+            proc.start()
+        return ((rb, stop, procs), {})
+
+
+def sample_while_writing(rb, stop, procs, iters=100):
+    for _ in range(iters):
+        rb.sample()
+    stop.set()
+    for proc in procs:
+        proc.join()
+
+
+@pytest.mark.parametrize("lock_free", [False, True])
+@pytest.mark.parametrize("num_writers", [1, 4])
+def test_rb_sample_concurrent_writers(benchmark, num_writers, lock_free):
+    benchmark.pedantic(
+        sample_while_writing,
+        setup=create_shared_rb(num_writers=num_writers, lock_free=lock_free),
+        iterations=1,
+        rounds=5,
+    )
+
+
 if __name__ == "__main__":
     args, unknown = argparse.ArgumentParser().parse_known_args()
     pytest.main([__file__, "--capture", "no", "--exitfirst"] + unknown)
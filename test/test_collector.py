@@ -10,6 +10,7 @@ import contextlib
 import functools
 import gc
 import os
+import queue
 import subprocess
 import sys
 import time
@@ -43,9 +44,12 @@ from torchrl._utils import (
 )
 from torchrl.collectors import (
     aSyncDataCollector,
+    DeltaWeightUpdater,
+    InferenceServer,
     MultiaSyncDataCollector,
     MultiSyncDataCollector,
     SyncDataCollector,
+    VersionedWeightUpdater,
     WeightUpdaterBase,
 )
 from torchrl.collectors.collectors import _Interruptor
@@ -2870,6 +2874,292 @@ class TestUpdateParams:
             del col
 
 
+class TestDeltaWeightUpdater:
+    class _Collector:
+        def __init__(self, weights, num_workers=2):
+            self.num_workers = num_workers
+            self._policy_weights_dict = {torch.device("cpu"): weights}
+
+    @staticmethod
+    def _make_weights():
+        return TensorDict(
+            {
+                "linear": {"weight": torch.randn(10, 10), "bias": torch.randn(10)},
+                "step": torch.zeros((), dtype=torch.long),
+            }
+        )
+
+    @staticmethod
+    def _pull(subscriber, weights, version):
+        # the updates are flushed to the queue by a background thread
+        deadline = time.monotonic() + 10
+        while subscriber.current_version < version:
+            subscriber.pull(weights)
+            assert time.monotonic() < deadline
+
+    @pytest.mark.parametrize("mode", ["changed", "delta", "topk"])
+    def test_delta_updater_sync(self, mode):
+        torch.manual_seed(0)
+        server_weights = self._make_weights()
+        updater = DeltaWeightUpdater(mode=mode, delta_dtype=torch.bfloat16, topk=0.1)
+        updater.register_collector(self._Collector(server_weights.clone()))
+        subscribers = [updater.subscriber(i) for i in range(2)]
+        local_weights = [subscriber.init_weights() for subscriber in subscribers]
+        # no change, nothing to send
+        updater(server_weights)
+        assert updater.version == 1
+        assert updater.last_bytes_sent == 0
+        # a change in a single tensor
+        server_weights["linear", "bias"] += torch.randn(10)
+        updater(server_weights)
+        if mode == "changed":
+            assert updater.last_bytes_sent == 40
+        elif mode == "delta":
+            assert updater.last_bytes_sent == 20
+        else:
+            # one (int32 index, bf16 value) pair
+            assert updater.last_bytes_sent == 6
+        self._pull(subscribers[0], local_weights[0], 2)
+        assert updater.subscriber_versions.tolist() == [2, 0]
+        assert (
+            local_weights[0]["linear", "bias"] != local_weights[1]["linear", "bias"]
+        ).any()
+        assert (
+            local_weights[0]["linear", "weight"] == server_weights["linear", "weight"]
+        ).all()
+        # the quantization / sparsification errors are sent with the next updates
+        for _ in range(20):
+            updater(server_weights)
+        for subscriber, weights in zip(subscribers, local_weights):
+            self._pull(subscriber, weights, updater.version)
+            torch.testing.assert_close(weights, server_weights, atol=1e-5, rtol=1e-5)
+        assert updater.subscriber_versions.tolist() == [22, 22]
+
+    def test_delta_updater_full_sync(self):
+        torch.manual_seed(0)
+        server_weights = self._make_weights()
+        updater = DeltaWeightUpdater(mode="topk", topk=0.01, full_sync_interval=3)
+        updater.register_collector(self._Collector(server_weights.clone(), 1))
+        subscriber = updater.subscriber(0)
+        weights = subscriber.init_weights()
+        server_weights["linear", "weight"] += 1
+        updater(server_weights)
+        updater(server_weights)
+        self._pull(subscriber, weights, 2)
+        assert (weights != server_weights).any()
+        updater(server_weights)
+        full_bytes = sum(
+            v.numel() * v.element_size() for v in server_weights.values(True, True)
+        )
+        assert updater.last_bytes_sent == full_bytes
+        self._pull(subscriber, weights, 3)
+        assert (weights == server_weights).all()
+
+    def test_delta_updater_lost_update(self):
+        weights = TensorDict(param=torch.zeros(3))
+        updater = DeltaWeightUpdater()
+        updater.register_collector(self._Collector(weights.clone(), 1))
+        subscriber = updater.subscriber(0)
+        updater(TensorDict(param=torch.ones(3)))
+        updater(TensorDict(param=torch.full((3,), 2.0)))
+        # the first update is lost
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                subscriber.updates.get(timeout=0.1)
+                break
+            except queue.Empty:
+                assert time.monotonic() < deadline
+        with pytest.raises(RuntimeError, match="received version 2 of the weights"):
+            self._pull(subscriber, weights, 2)
+
+    def test_delta_updater_errors(self):
+        with pytest.raises(ValueError, match="mode must be one of"):
+            DeltaWeightUpdater(mode="sparse")
+        with pytest.raises(ValueError, match="topk must be in"):
+            DeltaWeightUpdater(mode="topk", topk=0.0)
+        with pytest.raises(RuntimeError, match="must be registered"):
+            DeltaWeightUpdater()(self._make_weights())
+        updater = DeltaWeightUpdater()
+        updater.register_collector(self._Collector(self._make_weights()))
+        with pytest.raises(ValueError, match="worker_ids cannot be passed"):
+            updater(self._make_weights(), worker_ids=0)
+        env = CountingEnv()
+        with pytest.raises(ValueError, match="not compatible with a Delta"):
+            MultiSyncDataCollector(
+                [CountingEnv] * 2,
+                CountingEnvCountPolicy(env.action_spec),
+                frames_per_batch=10,
+                total_frames=100,
+                weight_updater=DeltaWeightUpdater(),
+                inference_server=True,
+            )
+
+    @pytest.mark.parametrize(
+        "collector",
+        [
+            functools.partial(MultiSyncDataCollector, cat_results="stack"),
+            MultiaSyncDataCollector,
+        ],
+    )
+    def test_delta_updater_collector(self, collector):
+        policy = TestUpdateParams.Policy()
+        env = EnvCreator(lambda: TestUpdateParams.DummyEnv(device="cpu"))
+        col = collector(
+            [env] * 2,
+            policy,
+            total_frames=200,
+            frames_per_batch=10,
+            weight_updater=DeltaWeightUpdater(mode="delta", delta_dtype=torch.bfloat16),
+        )
+        try:
+            for i, data in enumerate(col):
+                if i == 0:
+                    assert (data["action"] == 0).all()
+                    policy.param.data += 1
+                    policy.buf.data += 2
+                    col.update_policy_weights_()
+                    # both tensors are sent as bf16 deltas
+                    assert col.weight_updater.last_bytes_sent == 4
+                elif i == 1:
+                    policy.param.data += 1
+                    col.update_policy_weights_()
+                    # only the param has changed
+                    assert col.weight_updater.last_bytes_sent == 2
+                    assert col.weight_updater.version == 2
+            # the workers hold their own copy of the weights, updated between batches
+            assert (data["action"] == 4).all()
+            assert (col.weight_updater.subscriber_versions == 2).all()
+        finally:
+            col.shutdown()
+            del col
+
+
+class TestVersionedWeightUpdater:
+    class _Collector:
+        num_workers = 2
+
+        def __init__(self, weights):
+            self._policy_weights_dict = {torch.device("cpu"): weights}
+
+    def test_versioned_updater_pull(self):
+        weights = TensorDict(param=torch.zeros(3))
+        updater = VersionedWeightUpdater()
+        updater.register_collector(self._Collector(weights))
+        subscribers = [updater.subscriber(i) for i in range(2)]
+        local_weights = [weights.clone() for _ in range(2)]
+        assert updater.version == 0
+        assert not subscribers[0].pull(local_weights[0])
+        for i in range(1, 4):
+            updater(TensorDict(param=torch.full((3,), float(i))))
+            assert updater.version == i
+        # the worker picks up the latest version only
+        assert subscribers[0].pull(local_weights[0])
+        assert (local_weights[0]["param"] == 3).all()
+        assert (local_weights[1]["param"] == 0).all()
+        assert updater.subscriber_versions.tolist() == [3, 0]
+        # without arguments, the collector weights are published
+        weights["param"] += 10
+        updater()
+        assert subscribers[1].pull(local_weights[1])
+        assert (local_weights[1]["param"] == 10).all()
+        assert updater.subscriber_versions.tolist() == [3, 4]
+
+    def test_versioned_updater_staleness(self):
+        weights = TensorDict(param=torch.zeros(3))
+        updater = VersionedWeightUpdater(max_staleness=1)
+        updater.register_collector(self._Collector(weights))
+        subscriber = updater.subscriber(0)
+        updater()
+        assert not subscriber.is_stale()
+        updater()
+        assert subscriber.is_stale()
+        assert updater.num_dropped.tolist() == [1, 0]
+        subscriber.pull(weights.clone())
+        assert not subscriber.is_stale()
+
+        updater = VersionedWeightUpdater(max_staleness=1, staleness_policy="throttle")
+        updater.register_collector(self._Collector(weights))
+        updater._THROTTLE_TIMEOUT = 0.1
+        updater()
+        # the workers still hold version 0
+        with pytest.raises(RuntimeError, match="did not pick up version 1"):
+            updater()
+
+    @pytest.mark.parametrize(
+        "collector",
+        [
+            functools.partial(MultiSyncDataCollector, cat_results="stack"),
+            MultiaSyncDataCollector,
+        ],
+    )
+    @pytest.mark.parametrize(
+        "max_staleness,staleness_policy", [[None, "drop"], [0, "drop"], [1, "throttle"]]
+    )
+    def test_versioned_updater_collector(
+        self, collector, max_staleness, staleness_policy
+    ):
+        policy = TestUpdateParams.Policy()
+        env = EnvCreator(lambda: TestUpdateParams.DummyEnv(device="cpu"))
+        col = collector(
+            [env] * 2,
+            policy,
+            total_frames=200,
+            frames_per_batch=10,
+            weight_updater=VersionedWeightUpdater(
+                max_staleness=max_staleness, staleness_policy=staleness_policy
+            ),
+        )
+        try:
+            versions = []
+            for data in col:
+                policy_version = data["collector", "policy_version"]
+                # the weights are only updated between batches
+                batch_version = policy_version.flatten()[0]
+                assert (policy_version == batch_version).all()
+                # the action is the value of the param, i.e. the version
+                assert (data["action"] == batch_version).all()
+                versions.append(int(batch_version))
+                policy.param.data += 1
+                col.update_policy_weights_()
+                if staleness_policy == "throttle":
+                    assert (
+                        col.weight_updater.subscriber_versions
+                        >= col.weight_updater.version - max_staleness
+                    ).all()
+            assert versions[0] == 0
+            assert versions[-1] > 0
+        finally:
+            col.shutdown()
+            del col
+
+    def test_versioned_updater_errors(self):
+        with pytest.raises(ValueError, match="staleness_policy must be one of"):
+            VersionedWeightUpdater(staleness_policy="block")
+        with pytest.raises(ValueError, match="max_staleness must be"):
+            VersionedWeightUpdater(max_staleness=-1)
+        with pytest.raises(RuntimeError, match="must be registered"):
+            VersionedWeightUpdater()(TensorDict(param=torch.zeros(())))
+        env = CountingEnv()
+        with pytest.raises(RuntimeError, match="policy_factory is not supported"):
+            MultiSyncDataCollector(
+                [CountingEnv] * 2,
+                policy_factory=lambda: CountingEnvCountPolicy(env.action_spec),
+                frames_per_batch=10,
+                total_frames=100,
+                weight_updater=VersionedWeightUpdater(),
+            )
+        with pytest.raises(ValueError, match="not compatible with a Versioned"):
+            MultiSyncDataCollector(
+                [CountingEnv] * 2,
+                CountingEnvCountPolicy(env.action_spec),
+                frames_per_batch=10,
+                total_frames=100,
+                weight_updater=VersionedWeightUpdater(),
+                inference_server=True,
+            )
+
+
 class TestAggregateReset:
     def test_aggregate_reset_to_root(self):
         # simple
@@ -3712,6 +4002,243 @@ def __deepcopy_error__(*args, **kwargs):
     raise RuntimeError("deepcopy not allowed")
 
 
+class TestPipelinedCollector:
+    @staticmethod
+    def _make_env(env_type, n_envs=4):
+        env_fns = [functools.partial(CountingEnv, 3 + i) for i in range(n_envs)]
+        if env_type == "parallel":
+            return ParallelEnv(n_envs, env_fns)
+        return SerialEnv(n_envs, env_fns)
+
+    @staticmethod
+    def _make_policy(action_spec):
+        # the policy must accept any batch-size as it is run on half of the envs
+        return TensorDictModule(
+            lambda obs: torch.ones_like(obs, dtype=action_spec.dtype),
+            in_keys=["observation"],
+            out_keys=["action"],
+        )
+
+    @pytest.mark.parametrize("env_type", ["serial", "parallel"])
+    @pytest.mark.parametrize("use_buffers", [False, True])
+    @pytest.mark.parametrize("n_envs", [3, 4])
+    def test_pipelined_consistency(self, env_type, use_buffers, n_envs):
+        results = []
+        for pipelined in (False, True):
+            env = self._make_env(env_type, n_envs)
+            collector = SyncDataCollector(
+                env,
+                self._make_policy(env.action_spec),
+                frames_per_batch=n_envs * 10,
+                total_frames=n_envs * 30,
+                use_buffers=use_buffers,
+                pipelined=pipelined,
+            )
+            try:
+                results.append([data.clone() for data in collector])
+            finally:
+                collector.shutdown()
+        for data, data_pipelined in zip(*results):
+            assert data.shape == data_pipelined.shape
+            assert_allclose_td(data, data_pipelined)
+
+    def test_pipelined_rb(self):
+        env = self._make_env("serial")
+        rb = ReplayBuffer(storage=LazyTensorStorage(120, ndim=2))
+        collector = SyncDataCollector(
+            env,
+            self._make_policy(env.action_spec),
+            frames_per_batch=40,
+            total_frames=120,
+            replay_buffer=rb,
+            extend_buffer=True,
+            pipelined=True,
+        )
+        try:
+            for data in collector:
+                assert data is None
+        finally:
+            collector.shutdown()
+        assert len(rb) == 120
+        assert (rb[:]["next", "observation"] == rb[:]["observation"] + 1).all()
+
+    def test_pipelined_errors(self):
+        env = CountingEnv()
+        with pytest.raises(ValueError, match="requires a batched environment"):
+            SyncDataCollector(
+                env,
+                CountingEnvCountPolicy(env.action_spec),
+                frames_per_batch=10,
+                pipelined=True,
+            )
+        env = SerialEnv(1, CountingEnv)
+        with pytest.raises(ValueError, match="at least 2 sub-environments"):
+            SyncDataCollector(
+                env,
+                CountingEnvCountPolicy(env.action_spec),
+                frames_per_batch=10,
+                pipelined=True,
+            )
+
+
+class TestInferenceServer:
+    def test_inference_server_clients(self):
+        policy = TensorDictModule(
+            nn.Linear(3, 2), in_keys=["observation"], out_keys=["action"]
+        )
+        server = InferenceServer(policy, num_clients=2, max_batch_size=4)
+        try:
+            for batch_size in ([5], [2, 3], [5]):
+                for client in server.clients:
+                    td = TensorDict(
+                        {"observation": torch.randn(*batch_size, 3)}, batch_size
+                    )
+                    out = client(td)
+                    assert out is td
+                    torch.testing.assert_close(
+                        out["action"], policy(td.exclude("action"))["action"]
+                    )
+        finally:
+            server.shutdown()
+
+    def test_inference_server_no_wait(self):
+        # The server does not wait for more requests once every client sent one
+        policy = TensorDictModule(
+            nn.Linear(3, 2), in_keys=["observation"], out_keys=["action"]
+        )
+        server = InferenceServer(policy, num_clients=1, timeout=5.0)
+        try:
+            (client,) = server.clients
+            td = TensorDict({"observation": torch.randn(5, 3)}, [5])
+            client(td)
+            t0 = time.monotonic()
+            for _ in range(3):
+                client(td)
+            assert time.monotonic() - t0 < 5.0
+        finally:
+            server.shutdown()
+
+    @pytest.mark.parametrize(
+        "collector_cls", [MultiSyncDataCollector, MultiaSyncDataCollector]
+    )
+    def test_inference_server_collector(self, collector_cls):
+        torch.manual_seed(0)
+        env = ContinuousActionVecMockEnv()
+        policy = TensorDictModule(
+            nn.Linear(
+                env.observation_spec["observation"].shape[-1],
+                env.action_spec.shape[-1],
+            ),
+            in_keys=["observation"],
+            out_keys=["action"],
+        )
+        num_workers = 2
+        collector = collector_cls(
+            [ContinuousActionVecMockEnv] * num_workers,
+            policy,
+            frames_per_batch=20,
+            total_frames=300,
+            inference_server={"max_batch_size": 2},
+        )
+        try:
+            for i, data in enumerate(collector):
+                if i == 3:
+                    policy.module.weight.data.zero_()
+                    policy.module.bias.data.fill_(0.5)
+                    collector.update_policy_weights_()
+                # The batches that the workers started before the update (at most
+                # one being collected and one waiting per worker) are skipped
+                if i <= 3 + 2 * num_workers:
+                    continue
+                # the actions must have been computed with the latest weights
+                assert (data["action"] == 0.5).all()
+            torch.testing.assert_close(
+                policy(data.select("observation"))["action"], data["action"]
+            )
+        finally:
+            collector.shutdown()
+
+    def test_inference_server_errors(self):
+        env = ContinuousActionVecMockEnv()
+        with pytest.raises(ValueError, match="not compatible with policy_factory"):
+            MultiSyncDataCollector(
+                [ContinuousActionVecMockEnv] * 2,
+                policy_factory=lambda: RandomPolicy(env.action_spec),
+                frames_per_batch=20,
+                total_frames=200,
+                inference_server=True,
+            )
+
+
+class TestRingBuffer:
+    @pytest.mark.parametrize("num_slots", [1, 3])
+    def test_ring_buffer_data(self, num_slots):
+        env = CountingEnv(max_steps=10_000)
+        policy = CountingEnvCountPolicy(env.action_spec)
+        collector = MultiaSyncDataCollector(
+            [functools.partial(CountingEnv, max_steps=10_000)] * 2,
+            policy,
+            frames_per_batch=10,
+            total_frames=200,
+            num_slots=num_slots,
+        )
+        try:
+            batches = []
+            for i, data in enumerate(collector):
+                if i % 5 == 0:
+                    # let the workers run ahead
+                    time.sleep(0.5)
+                occupancy = collector.queue_occupancy()
+                assert occupancy.shape == (2,)
+                assert ((occupancy >= 0) & (occupancy <= num_slots)).all()
+                batches.append(data)
+        finally:
+            collector.shutdown()
+        # The trajectories are never reset: the batches of each worker must be
+        # contiguous, which would not be the case if a slot was overwritten
+        # before being read.
+        last_obs = {}
+        for data in batches:
+            traj_id = data["collector", "traj_ids"].unique()
+            assert traj_id.numel() == 1
+            traj_id = int(traj_id)
+            obs = data["observation"].squeeze(-1)
+            assert (obs[1:] == obs[:-1] + 1).all()
+            if traj_id in last_obs:
+                assert obs[0] == last_obs[traj_id] + 1
+            last_obs[traj_id] = obs[-1]
+        assert len(last_obs) == 2
+
+    def test_ring_buffer_errors(self):
+        env = CountingEnv()
+        policy = CountingEnvCountPolicy(env.action_spec)
+        with pytest.raises(ValueError, match="positive integer"):
+            MultiaSyncDataCollector(
+                [CountingEnv] * 2,
+                policy,
+                frames_per_batch=10,
+                total_frames=100,
+                num_slots=0,
+            )
+        with pytest.raises(ValueError, match="only supported by MultiaSync"):
+            MultiSyncDataCollector(
+                [CountingEnv] * 2,
+                policy,
+                frames_per_batch=10,
+                total_frames=100,
+                num_slots=2,
+            )
+        with pytest.raises(ValueError, match="use_buffers=False"):
+            MultiaSyncDataCollector(
+                [CountingEnv] * 2,
+                policy,
+                frames_per_batch=10,
+                total_frames=100,
+                num_slots=2,
+                use_buffers=False,
+            )
+
+
 class TestPolicyFactory:
     class MPSWeightUpdaterBase(WeightUpdaterBase):
         def __init__(self, policy_weights, num_workers):
@@ -8,10 +8,13 @@ import argparse
 import contextlib
 import functools
 import importlib
+import json
 import os
 import pickle
+import shutil
 import sys
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from pathlib import Path
 from unittest import mock
@@ -27,6 +30,7 @@ from tensordict import (
     is_tensor_collection,
     is_tensorclass,
     LazyStackedTensorDict,
+    MemoryMappedTensor,
     tensorclass,
     TensorDict,
     TensorDictBase,
@@ -40,18 +44,27 @@ from torchrl.collectors.utils import split_trajectories
 from torchrl.data import (
     CompressedListStorage,
     FlatStorageCheckpointer,
+    IncrementalStorageCheckpointer,
     MultiStep,
     NestedStorageCheckpointer,
     PrioritizedReplayBuffer,
+    PriorityEvictionWriter,
     RayReplayBuffer,
     RemoteTensorDictReplayBuffer,
     ReplayBuffer,
     ReplayBufferEnsemble,
+    ReplayBufferServer,
+    ReservoirWriter,
+    ShardedReplayBuffer,
+    StratifiedWriter,
     TensorDictPrioritizedReplayBuffer,
     TensorDictReplayBuffer,
 )
 from torchrl.data.replay_buffers import samplers, writers
-from torchrl.data.replay_buffers.checkpointers import H5StorageCheckpointer
+from torchrl.data.replay_buffers.checkpointers import (
+    H5StorageCheckpointer,
+    TensorStorageCheckpointer,
+)
 from torchrl.data.replay_buffers.samplers import (
     PrioritizedSampler,
     PrioritizedSliceSampler,
@@ -68,12 +81,15 @@ from torchrl.data.replay_buffers.scheduler import (
 )
 
 from torchrl.data.replay_buffers.storages import (
+    _CODECS,
+    FrameStackStorage,
     LazyMemmapStorage,
     LazyStackStorage,
     LazyTensorStorage,
     ListStorage,
     StorageEnsemble,
     TensorStorage,
+    TieredMemmapStorage,
 )
 from torchrl.data.replay_buffers.utils import tree_iter
 from torchrl.data.replay_buffers.writers import (
@@ -720,6 +736,167 @@ class TestStorages:
             storage.set(range(10), torch.zeros_like(data))
             assert (storage.get(range(10)) == 0).all()
 
+    @pytest.mark.parametrize(
+        "data_type", ["tensor", "tensordict", "tensorclass", "pytree"]
+    )
+    @pytest.mark.parametrize(
+        "index",
+        [torch.tensor([3, 0, 3, 9]), (torch.tensor([3, 0, 3, 9]),), range(2, 6)],
+    )
+    def test_get_out(self, data_type, index):
+        if data_type == "tensor":
+            data = self._get_tensor()
+        elif data_type == "tensorclass":
+            data = self._get_tensorclass()
+        elif data_type == "tensordict":
+            data = self._get_tensordict()
+        elif data_type == "pytree":
+            data = self._get_pytree()
+        storage = TensorStorage(data)
+        expected = storage.get(index)
+        out = tree_map(torch.zeros_like, expected)
+        result = storage.get(index, out=out)
+        assert result is out
+
+        def check(x, y):
+            assert (x == y).all()
+
+        if data_type == "pytree":
+            tree_map(check, result, expected)
+        else:
+            assert (result == expected).all()
+
+    @pytest.mark.parametrize("data_type", ["tensor", "tensordict", "tensorclass"])
+    @pytest.mark.parametrize("coalesce_gap", [None, 0, 3])
+    def test_memmap_coalesce_reads(self, data_type, coalesce_gap, tmpdir):
+        if data_type == "tensor":
+            data = self._get_tensor()
+        elif data_type == "tensorclass":
+            data = self._get_tensorclass()
+        else:
+            data = self._get_tensordict()
+        storage = LazyMemmapStorage(
+            100, scratch_dir=tmpdir, coalesce_reads=True, coalesce_gap=coalesce_gap
+        )
+        storage.set(torch.arange(data.shape[0]), data)
+        # unsorted indices with duplicates and contiguous runs
+        index = torch.cat([torch.tensor([7, 2, 2, 0]), torch.arange(4, 9)])
+        result = storage.get(index)
+        assert type(result) is type(data)
+        assert (result == data[index]).all()
+        assert (storage.get(index[:1]) == data[index[:1]]).all()
+        assert (storage.get(3) == data[3]).all()
+        # negative rows are counted from the end of the storage
+        index = torch.tensor([-1, 5, -3])
+        assert (storage.get(index) == data[index]).all()
+
+    @pytest.mark.parametrize("eviction_policy", ["lru", "priority"])
+    def test_tiered_memmap_storage(self, eviction_policy, tmpdir):
+        torch.manual_seed(0)
+        storage = TieredMemmapStorage(
+            100, hot_size=10, eviction_policy=eviction_policy, scratch_dir=tmpdir
+        )
+        rb = ReplayBuffer(
+            storage=storage,
+            sampler=PrioritizedSampler(100, alpha=1.0, beta=1.0),
+            batch_size=16,
+        )
+        data = TensorDict(
+            {"obs": torch.randn(100, 3), "index": torch.arange(100)}, [100]
+        )
+        rb.extend(data)
+        rb.update_priority(torch.arange(100), torch.arange(100.0) + 1)
+        # the last rows written are hot
+        assert (storage._row_of_slot.sort().values == torch.arange(90, 100)).all()
+
+        index = torch.randint(100, (50,))
+        assert (storage.get(index) == data[index]).all()
+        assert (storage.get(3) == data[3]).all()
+        assert (storage[5:20] == data[5:20]).all()
+        stats = storage.stats()
+        assert stats["hits"] + stats["misses"] == 66
+        assert stats["hit_rate"] == stats["hits"] / 66
+        assert stats["cold_bytes_read"] >= stats["misses"] * 20
+
+        hot = storage._row_of_slot
+        assert (storage._slot_of_row[hot] == torch.arange(10)).all()
+        assert (storage._hot_storage._storage == data[hot]).all()
+        if eviction_policy == "priority":
+            # rows read from disk only replace hot rows of lower priority
+            assert (hot.sort().values == torch.arange(90, 100)).all()
+
+        # overwritten rows are updated in both tiers
+        storage.set(torch.arange(5), data[:5].apply(torch.zeros_like))
+        assert (storage.get(torch.arange(10))["index"][:5] == 0).all()
+        storage.reset_stats()
+        assert storage.stats()["hits"] == 0
+
+    @pytest.mark.parametrize("padding", ["same", "constant"])
+    def test_frame_stack_storage(self, padding):
+        torch.manual_seed(0)
+        T = 30
+        done = torch.rand(T, 1) < 0.2
+        pixels = torch.randn(T, 1, 2, 2)
+        next_pixels = torch.cat([pixels[1:], torch.randn(1, 1, 2, 2)])
+        # the observation that follows a done state is a reset frame
+        next_pixels[done.squeeze(-1)] = torch.randn(int(done.sum()), 1, 2, 2)
+        data = TensorDict(
+            {"pixels": pixels, "next": {"pixels": next_pixels, "done": done}}, [T]
+        )
+        catframes = CatFrames(
+            N=4,
+            dim=-3,
+            in_keys=["pixels", ("next", "pixels")],
+            out_keys=["stack", ("next", "stack")],
+            padding=padding,
+            padding_value=-1,
+        )
+        expected = catframes(data.unsqueeze(0).refine_names(None, "time"))[0]
+
+        storage = FrameStackStorage(
+            100, N=4, out_keys=["stack"], padding=padding, padding_value=-1
+        )
+        rb = ReplayBuffer(storage=storage)
+        # trajectories are continued across writes
+        for chunk in data.split([7, 13, 10]):
+            rb.extend(chunk)
+        assert "pixels" not in storage._storage.keys(True)
+        # each frame is stored once, plus the first frame of each trajectory
+        assert storage._frame_count == T + 1 + int(done[:-1].sum())
+        result = rb[:]
+        for key in ("pixels", "stack", ("next", "pixels"), ("next", "stack")):
+            torch.testing.assert_close(result[key], expected[key])
+
+        storage2 = FrameStackStorage(
+            100, N=4, out_keys=["stack"], padding=padding, padding_value=-1
+        )
+        storage2.load_state_dict(storage.state_dict())
+        assert (storage2[:] == result).all()
+
+    @pytest.mark.parametrize("min_episode_len", [1, 3])
+    def test_frame_stack_storage_capacity(self, min_episode_len):
+        # the default frame ring holds a full buffer of the shortest trajectories
+        T = 50
+        frames = torch.arange(T + 1.0).view(-1, 1, 1, 1)
+        done = torch.zeros(T, 1, dtype=torch.bool)
+        done[min_episode_len - 1 :: min_episode_len] = True
+        data = TensorDict(
+            {"pixels": frames[:-1], "next": {"pixels": frames[1:], "done": done}},
+            [T],
+        )
+        storage = FrameStackStorage(20, N=4, min_episode_len=min_episode_len)
+        rb = ReplayBuffer(storage=storage)
+        for chunk in data.split(7):
+            rb.extend(chunk)
+        result = rb[:]
+        # reading does not modify the stored data
+        assert (rb[:] == result).all()
+        assert set(result["next", "pixels"][:, -1].flatten().tolist()) == set(
+            frames[T - 20 + 1 :].flatten().tolist()
+        )
+        with pytest.raises(ValueError, match="min_episode_len"):
+            FrameStackStorage(20, N=4, min_episode_len=0)
+
     @pytest.mark.parametrize(
         "data_type", ["tensor", "tensordict", "tensorclass", "pytree"]
     )
@@ -1171,6 +1348,51 @@ class TestStorages:
         assert isinstance(sample["a"], torch.Tensor)
         assert sample["a"].shape[0] == 10
 
+    @pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+    def test_lock_free_writer(self, storage_type):
+        rb = ReplayBuffer(
+            storage=storage_type(10),
+            writer=RoundRobinWriter(lock_free=True),
+            batch_size=4,
+        )
+        rb.extend(torch.arange(8))
+        assert len(rb) == 8
+        rb.extend(torch.arange(8, 14))
+        rb.add(torch.tensor(14))
+        assert len(rb) == 10
+        assert rb.write_count == 15
+        assert (rb[:] == torch.tensor([10, 11, 12, 13, 14, 5, 6, 7, 8, 9])).all()
+        assert rb[1] == 11
+        assert (rb[[[0, 1], [5, 6]]] == torch.tensor([[10, 11], [5, 6]])).all()
+        for reuse_output in (False, True):
+            sample, info = rb.sample(return_info=True, reuse_output=reuse_output)
+            assert (sample == rb[info["index"]]).all()
+        # every row has been committed during the second pass, or the first
+        assert (rb._storage._row_seq == torch.tensor([4] * 5 + [2] * 5)).all()
+        # the write count of lock-free writers restarts with the storage
+        rb.empty(empty_write_count=False)
+        assert rb.write_count == 0
+        rb.extend(torch.arange(100, 104))
+        assert (rb[:] == torch.arange(100, 104)).all()
+        assert (rb._storage._row_seq == torch.tensor([2] * 4 + [-1] * 6)).all()
+        # a row that is reserved but not written yet cannot be read
+        rb._storage._seqlock_timeout = 0.1
+        rb._storage._len = 5
+        with pytest.raises(RuntimeError, match="Timed out"):
+            rb[4]
+        rb._storage._len = 4
+        with pytest.raises(RuntimeError, match="Cannot write 11 elements"):
+            rb.extend(torch.arange(11))
+        with pytest.raises(ValueError, match="only supported by non-compilable"):
+            ReplayBuffer(
+                storage=storage_type(10, ndim=2),
+                writer=RoundRobinWriter(lock_free=True),
+            )
+        with pytest.raises(ValueError, match="not supported by storages of type"):
+            ReplayBuffer(
+                storage=ListStorage(10), writer=RoundRobinWriter(lock_free=True)
+            )
+
 
 @pytest.mark.parametrize("max_size", [1000])
 @pytest.mark.parametrize("shape", [[3, 4]])
@@ -1931,6 +2153,235 @@ def test_shared_storage_prioritized_sampler():
     assert rb1._sampler._sum_tree.query(0, 70) == 50
 
 
+@pytest.mark.parametrize("size", [7, 1000])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+@pytest.mark.parametrize("num_threads", [1, 4])
+def test_segment_tree_batched_update(size, dtype, num_threads):
+    # The tensor code path updates disjoint subtrees in parallel: results must
+    # match the element-wise numpy code path, duplicated indices included.
+    sampler_np = PrioritizedSampler(size, alpha=1.0, beta=1.0, dtype=dtype)
+    sampler_pt = PrioritizedSampler(size, alpha=1.0, beta=1.0, dtype=dtype)
+    torch.manual_seed(0)
+    prev_num_threads = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        for _ in range(3):
+            index = torch.randint(size, (4096,))
+            value = torch.rand(4096, dtype=dtype)
+            sampler_np._sum_tree[index.numpy()] = value.numpy()
+            sampler_np._min_tree[index.numpy()] = value.numpy()
+            sampler_pt._sum_tree[index] = value
+            sampler_pt._min_tree[index] = value
+    finally:
+        torch.set_num_threads(prev_num_threads)
+    assert sampler_np._sum_tree.query(0, size) == sampler_pt._sum_tree.query(0, size)
+    assert sampler_np._min_tree.query(0, size) == sampler_pt._min_tree.query(0, size)
+    leaves = torch.arange(size)
+    torch.testing.assert_close(
+        torch.as_tensor(sampler_np._sum_tree[leaves.numpy()]),
+        torch.as_tensor(sampler_pt._sum_tree[leaves]),
+    )
+    mass = torch.rand(100, dtype=dtype) * sampler_pt._sum_tree.query(0, size)
+    torch.testing.assert_close(
+        torch.as_tensor(sampler_np._sum_tree.scan_lower_bound(mass.numpy())),
+        sampler_pt._sum_tree.scan_lower_bound(mass),
+    )
+    sampler_pt._sum_tree[leaves] = 0.0
+    assert sampler_pt._sum_tree.query(0, size) == 0
+
+
+@pytest.mark.parametrize("sampler", [PrioritizedSampler, PrioritizedSliceSampler])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+@pytest.mark.parametrize("device", get_default_devices())
+def test_prioritized_sampler_torch_backend(sampler, dtype, device):
+    # The tensor trees live on the storage device and match the C++ trees
+    size = 100
+    if sampler is PrioritizedSliceSampler:
+        sampler = functools.partial(sampler, slice_len=5, traj_key="traj")
+    rbs = []
+    for backend in ("cpp", "torch"):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(size, device=device),
+            sampler=sampler(size, alpha=0.7, beta=0.9, dtype=dtype, backend=backend),
+            batch_size=20,
+        )
+        rb.set_rng(torch.Generator().manual_seed(0))
+        rbs.append(rb)
+    torch.manual_seed(0)
+    for _ in range(3):
+        data = TensorDict(
+            {"obs": torch.randn(60), "traj": torch.arange(60) // 10}, [60]
+        )
+        priority = torch.rand(60, device=device)
+        for rb in rbs:
+            index = rb.extend(data)
+            rb.update_priority(index, priority)
+    rb_cpp, rb_torch = rbs
+    assert rb_torch.sampler._sum_tree.device == torch.device(device)
+    for _ in range(3):
+        sample_cpp, info_cpp = rb_cpp.sample(return_info=True)
+        sample_torch, info_torch = rb_torch.sample(return_info=True)
+        assert (sample_cpp["obs"] == sample_torch["obs"]).all()
+        torch.testing.assert_close(
+            torch.as_tensor(info_cpp["_weight"], device=device),
+            info_torch["_weight"].to(device),
+        )
+
+
+def test_prioritized_sampler_torch_backend_masked():
+    # Negative indices and null priorities are handled without filtering
+    size = 100
+    samplers = [
+        PrioritizedSampler(size, alpha=0.7, beta=0.9, backend=backend)
+        for backend in ("cpp", "torch")
+    ]
+    index = torch.arange(50)
+    index[::3] = -1
+    priority = torch.rand(50) + 0.1
+    priority[1] = 10.0
+    for sampler in samplers:
+        sampler.update_priority(torch.full((4,), -1), 100.0)
+        assert sampler.default_priority == pytest.approx((1 + sampler._eps) ** 0.7)
+        sampler.update_priority(index, priority)
+        sampler.update_priority(-1, 100.0)
+    sampler_cpp, sampler_torch = samplers
+    leaves = torch.arange(size)
+    torch.testing.assert_close(
+        torch.as_tensor(sampler_cpp._sum_tree[leaves]), sampler_torch._sum_tree[leaves]
+    )
+    assert sampler_torch._max_priority[0] == 10.0
+    assert sampler_torch._max_priority[1] == 1
+    assert sampler_torch.default_priority == pytest.approx(sampler_cpp.default_priority)
+
+    tree = sampler_torch._sum_tree
+    leaves = tree[leaves]
+    index = torch.arange(size)
+    expected = torch.tensor(
+        [max((j for j in range(i + 1) if leaves[j] != 0), default=-1) for i in index]
+    )
+    assert (tree.last_nonzero(index) == expected).all()
+    # masses beyond the stored priorities fall back on the last non-null one
+    storage = LazyTensorStorage(size)
+    storage.set(torch.arange(size), torch.zeros(size))
+    sampler_torch._rng = torch.Generator().manual_seed(0)
+    sampler_torch._sum_tree.scan_lower_bound = lambda mass: torch.full_like(
+        mass, size, dtype=torch.long
+    )
+    sample, info = sampler_torch.sample(storage, 10)
+    assert (sample == 49).all()
+
+
+@pytest.mark.skipif(
+    TORCH_VERSION < version.parse("2.5.0"), reason="requires Torch >= 2.5.0"
+)
+@pytest.mark.parametrize("backend_out", ["cpp", "torch"])
+@pytest.mark.parametrize("backend_in", ["cpp", "torch"])
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_prioritized_sampler_dumps_loads_backends(
+    backend_in, backend_out, dtype, tmpdir
+):
+    tmpdir = Path(tmpdir)
+    size = 100
+    sampler_in = PrioritizedSampler(
+        size, alpha=0.7, beta=0.9, dtype=dtype, backend=backend_in
+    )
+    sampler_in.update_priority(torch.arange(70), torch.rand(70) + 0.1)
+    sampler_in.dumps(tmpdir)
+    metadata = json.loads((tmpdir / "sampler_metadata.json").read_text())
+    assert metadata["tree_format"] == ("nodes" if backend_in == "torch" else "leaves")
+
+    sampler_out = PrioritizedSampler(
+        size, alpha=0.1, beta=0.1, dtype=dtype, backend=backend_out
+    )
+    sampler_out.loads(tmpdir)
+    assert sampler_out._alpha == 0.7
+    leaves = torch.arange(size)
+    for tree in ("_sum_tree", "_min_tree"):
+        torch.testing.assert_close(
+            torch.as_tensor(getattr(sampler_out, tree)[leaves]),
+            torch.as_tensor(getattr(sampler_in, tree)[leaves]),
+        )
+        torch.testing.assert_close(
+            torch.as_tensor(getattr(sampler_out, tree).query(0, 50)),
+            torch.as_tensor(getattr(sampler_in, tree).query(0, 50)),
+            check_dtype=False,
+        )
+    # updating the loaded sampler does not modify the checkpoint
+    sampler_out.update_priority(torch.arange(10), 100.0)
+    sampler_check = PrioritizedSampler(size, alpha=0.7, beta=0.9, dtype=dtype)
+    sampler_check.loads(tmpdir)
+    assert sampler_check._sum_tree.query(0, size) == pytest.approx(
+        float(sampler_in._sum_tree.query(0, size))
+    )
+
+
+@pytest.mark.parametrize("rbtype", [ReplayBuffer, TensorDictReplayBuffer])
+@pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+@pytest.mark.parametrize("transform", [None, lambda td: td.apply(lambda x: x * 2)])
+@pytest.mark.parametrize("device", get_default_devices())
+def test_transfer_device(rbtype, storage_type, transform, device):
+    rb = rbtype(
+        storage=storage_type(100),
+        batch_size=8,
+        transform=transform,
+        transfer_device=device,
+        transfer_buffers=3,
+    )
+    rb.extend(
+        TensorDict(
+            {"obs": torch.arange(100), "nested": {"obs": torch.arange(100) - 1}},
+            [100],
+        )
+    )
+    factor = 1 if transform is None else 2
+    data_ptrs = set()
+    for _ in range(10):
+        sample, info = rb.sample(return_info=True)
+        assert sample["obs"].device == torch.device(device)
+        index = torch.as_tensor(info["index"], device=device)
+        assert (sample["obs"] == index * factor).all()
+        assert (sample["nested", "obs"] == (index - 1) * factor).all()
+        data_ptrs.add(sample["obs"].data_ptr())
+    if transform is None or torch.device(device).type == "cuda":
+        # the output buffers are recycled
+        assert len(data_ptrs) == 3
+
+    with pytest.raises(ValueError, match="cannot be used with prefetching"):
+        rbtype(storage=storage_type(100), prefetch=2, transfer_device=device)
+
+
+@pytest.mark.parametrize("rbtype", [ReplayBuffer, TensorDictReplayBuffer])
+@pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+def test_sample_reuse_output(rbtype, storage_type):
+    rb = rbtype(storage=storage_type(100))
+    rb.extend(
+        TensorDict(
+            {"obs": torch.arange(100), "nested": {"obs": torch.arange(100) - 1}},
+            [100],
+        )
+    )
+    data_ptrs = set()
+    for batch_size in (8, 4, 8):
+        sample, info = rb.sample(batch_size, return_info=True, reuse_output=True)
+        assert sample.shape == (batch_size,)
+        index = torch.as_tensor(info["index"])
+        assert (sample["obs"] == index).all()
+        assert (sample["nested", "obs"] == index - 1).all()
+        data_ptrs.add(sample["obs"].data_ptr())
+    # one output per batch-size
+    assert len(data_ptrs) == 2
+
+
+@pytest.mark.parametrize("rbtype", [ReplayBuffer, PrioritizedReplayBuffer])
+def test_sample_reuse_output_list_storage(rbtype):
+    # storages that cannot gather in place ignore reuse_output
+    kwargs = {"alpha": 0.7, "beta": 0.9} if rbtype is PrioritizedReplayBuffer else {}
+    rb = rbtype(storage=ListStorage(100), batch_size=4, **kwargs)
+    rb.extend(list(torch.arange(100)))
+    sample, info = rb.sample(return_info=True, reuse_output=True)
+    assert (sample == torch.as_tensor(info["index"])).all()
+
+
 class TestTransforms:
     def test_append_transform(self):
         rb = ReplayBuffer(collate_fn=lambda x: torch.stack(x, 0), batch_size=1)
@@ -2137,6 +2588,82 @@ def test_samplerwithoutrep(size, samples, drop_last):
         assert not visited
 
 
+@pytest.mark.parametrize("size", [20, 23])
+@pytest.mark.parametrize("chunk_size", [4, 7, 30])
+@pytest.mark.parametrize("drop_last", [True, False])
+def test_samplerwithoutrep_chunked(size, chunk_size, drop_last):
+    torch.manual_seed(0)
+    storage = ListStorage(size)
+    storage.set(range(size), range(size))
+    batch_size = 5
+    sampler = SamplerWithoutReplacement(drop_last=drop_last, chunk_size=chunk_size)
+    for _ in range(3):
+        epoch = []
+        while True:
+            idx, _ = sampler.sample(storage, batch_size)
+            # only the current chunks are permuted
+            assert sampler._sample_list.numel() < chunk_size + batch_size
+            epoch.append(idx)
+            if sampler.ran_out:
+                break
+        epoch = torch.cat(epoch)
+        assert epoch.unique().numel() == epoch.numel()
+        if drop_last:
+            assert epoch.numel() == size // batch_size * batch_size
+        else:
+            assert epoch.numel() == size
+
+
+@pytest.mark.parametrize("chunk_size", [None, 4])
+def test_samplerwithoutrep_state_dict(chunk_size):
+    torch.manual_seed(0)
+    storage = ListStorage(20)
+    storage.set(range(20), range(20))
+    sampler = SamplerWithoutReplacement(chunk_size=chunk_size)
+    sampler.sample(storage, 5)
+    sampler2 = SamplerWithoutReplacement(chunk_size=chunk_size)
+    sampler2.load_state_dict(sampler.state_dict())
+    rest = torch.cat([sampler2.sample(storage, 5)[0] for _ in range(3)])
+    assert rest.unique().numel() == 15
+
+
+def test_samplerwithoutrep_dumps_loads_chunked(tmpdir):
+    torch.manual_seed(0)
+    storage = ListStorage(11)
+    storage.set(range(11), range(11))
+    sampler = SamplerWithoutReplacement(chunk_size=5)
+    sampler._get_sample_list(storage, 11, 5)
+    # the short last chunk comes first
+    sampler._chunk_list = torch.tensor([2, 0, 1])
+    sampler._last_chunk_pos = 0
+    first = torch.cat([sampler.sample(storage, 3)[0] for _ in range(2)])
+    # the sample list is empty between two chunks
+    assert not sampler._sample_list.numel()
+    assert sampler._num_remaining(11) == 5
+    sampler.dumps(tmpdir)
+    sampler2 = SamplerWithoutReplacement(chunk_size=5)
+    sampler2.loads(tmpdir)
+    assert sampler2._num_remaining(11) == 5
+    rest = sampler2.sample(storage, 5)[0]
+    assert sampler2.ran_out
+    assert torch.cat([first, rest]).sort().values.tolist() == list(range(11))
+
+
+@pytest.mark.parametrize("device", get_default_devices())
+def test_samplerwithoutrep_device(device):
+    rb = ReplayBuffer(
+        storage=LazyTensorStorage(100, device=device),
+        sampler=SamplerWithoutReplacement(chunk_size=30),
+        batch_size=10,
+        generator=torch.Generator().manual_seed(0),
+    )
+    rb.extend(torch.arange(100))
+    samples = torch.cat([rb.sample() for _ in range(10)])
+    assert samples.device == torch.device(device)
+    assert rb.sampler._sample_list.device == torch.device(device)
+    assert samples.unique().numel() == 100
+
+
 @pytest.mark.parametrize("size", [10, 15, 20])
 @pytest.mark.parametrize("drop_last", [True, False])
 def test_replay_buffer_iter(size, drop_last):
@@ -2306,6 +2833,214 @@ class TestMaxValueWriter:
         assert (sample.get("obs") == obs[top_rank]).all()
 
 
+class TestPriorityEvictionWriter:
+    @staticmethod
+    def _make_rb(size, storage_type=LazyTensorStorage):
+        return TensorDictReplayBuffer(
+            storage=storage_type(size),
+            sampler=PrioritizedSampler(size, alpha=1.0, beta=1.0),
+            writer=PriorityEvictionWriter(),
+            batch_size=4,
+        )
+
+    @pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+    def test_eviction(self, storage_type):
+        rb = self._make_rb(10, storage_type)
+        index = rb.extend(TensorDict({"obs": torch.arange(6)}, [6]))
+        assert (index == torch.arange(6)).all()
+        rb.update_priority(index, torch.tensor([5.0, 1.0, 6.0, 2.0, 7.0, 8.0]))
+        # the free slots are used first, then the lowest priorities are evicted
+        index = rb.extend(TensorDict({"obs": torch.arange(10, 16)}, [6]))
+        assert (index == torch.tensor([6, 7, 8, 9, 1, 3])).all()
+        assert (
+            rb[:]["obs"] == torch.tensor([0, 14, 2, 15, 4, 5, 10, 11, 12, 13])
+        ).all()
+        assert rb.write_count == 12
+        # new elements get the max priority and are kept
+        rb.update_priority(torch.tensor([0, 2, 4, 5]), 0.5)
+        index = rb.add(TensorDict({"obs": 20}))
+        assert index in (0, 2, 4, 5)
+        assert rb[index]["obs"] == 20
+        sample = rb.sample()
+        assert sample.shape == (4,)
+
+    @pytest.mark.parametrize("backend", ["cpp", "torch"])
+    @pytest.mark.parametrize("batch_size", [1, 3, 300])
+    def test_eviction_descent(self, backend, batch_size):
+        # small batches descend the min-tree, large ones scan all the priorities
+        torch.manual_seed(0)
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(1000),
+            sampler=PrioritizedSampler(1000, alpha=1.0, beta=1.0, backend=backend),
+            writer=PriorityEvictionWriter(),
+        )
+        rb.extend(TensorDict({"obs": torch.arange(1000)}, [1000]))
+        priority = torch.randperm(1000).float() + 1
+        rb.update_priority(torch.arange(1000), priority)
+        index = rb.extend(
+            TensorDict({"obs": -torch.ones(batch_size, dtype=torch.long)}, [batch_size])
+        )
+        assert index.device == torch.device("cpu")
+        expected = priority.topk(batch_size, largest=False).indices
+        assert (index.sort().values == expected.sort().values).all()
+        # the priorities of the other elements are unchanged
+        min_tree = rb._sampler._min_tree
+        kept = torch.ones(1000, dtype=torch.bool)
+        kept[index] = False
+        leaves = torch.as_tensor(min_tree[torch.arange(1000)])
+        torch.testing.assert_close(leaves[kept], priority[kept].to(leaves.dtype))
+        assert (leaves[~kept] == leaves.max()).all()
+
+    def test_large_batch(self):
+        rb = self._make_rb(5)
+        rb.extend(TensorDict({"obs": torch.arange(3)}, [3]))
+        rb.update_priority(torch.arange(3), torch.tensor([3.0, 1.0, 2.0]))
+        index = rb.extend(TensorDict({"obs": torch.arange(10, 20)}, [10]))
+        # only the last elements are written
+        assert (index[:5] == -1).all()
+        assert (index[5:] == torch.tensor([3, 4, 1, 2, 0])).all()
+        assert (rb[:]["obs"].sort().values == torch.arange(15, 20)).all()
+
+    def test_errors(self):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(5), writer=PriorityEvictionWriter()
+        )
+        rb.extend(TensorDict({"obs": torch.arange(5)}, [5]))
+        with pytest.raises(RuntimeError, match="PrioritizedSampler"):
+            rb.extend(TensorDict({"obs": torch.arange(5)}, [5]))
+        with pytest.raises(ValueError, match="more than one dimension"):
+            TensorDictReplayBuffer(
+                storage=LazyTensorStorage(5, ndim=2), writer=PriorityEvictionWriter()
+            )
+
+
+class TestReservoirWriter:
+    def test_fill_and_count(self):
+        rb = ReplayBuffer(storage=LazyTensorStorage(10), writer=ReservoirWriter())
+        index = rb.extend(torch.arange(7))
+        assert (index == torch.arange(7)).all()
+        data = torch.arange(7, 30)
+        index = rb.extend(data)
+        written = index >= 0
+        # the index of the elements overwritten in the same batch is -1
+        assert index[written].numel() == index[written].unique().numel()
+        assert (rb[index[written]] == data[written]).all()
+        assert (rb[:7] == torch.arange(7)).sum() + written.sum() == 10
+        assert len(rb) == 10
+        assert rb.write_count == 30
+        assert rb.add(torch.tensor(30)) in range(-1, 10)
+        assert rb._writer._num_seen == 31
+        rb.empty()
+        assert rb._writer._num_seen == 0
+
+    def test_uniform(self):
+        # every element has the same probability to be in the buffer
+        torch.manual_seed(0)
+        num_trials, size, total = 400, 10, 100
+        counts = torch.zeros(total)
+        for _ in range(num_trials):
+            rb = ReplayBuffer(storage=LazyTensorStorage(size), writer=ReservoirWriter())
+            for data in torch.arange(total).split(13):
+                rb.extend(data)
+            counts += torch.bincount(rb[:], minlength=total)
+        frequency = counts / num_trials
+        assert (frequency - size / total).abs().max() < 0.07
+        # the first and last halves of the stream are equally represented
+        assert (frequency[:50].mean() - frequency[50:].mean()).abs() < 0.01
+
+    def test_serialize(self, tmpdir):
+        rb = ReplayBuffer(storage=LazyTensorStorage(10), writer=ReservoirWriter())
+        rb.extend(torch.arange(25))
+        rb._writer.dumps(tmpdir)
+        writer = ReservoirWriter()
+        writer.loads(tmpdir)
+        assert writer._num_seen == 25
+        writer.load_state_dict(ReservoirWriter().state_dict())
+        assert writer._num_seen == 0
+
+
+class TestStratifiedWriter:
+    @staticmethod
+    def _data(stratum, offset=0):
+        stratum = torch.as_tensor(stratum)
+        return TensorDict(
+            {"task_id": stratum, "obs": torch.arange(stratum.numel()) + offset},
+            [stratum.numel()],
+        )
+
+    def test_round_robin(self):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(9),
+            writer=StratifiedWriter(3, strategy="round_robin"),
+        )
+        index = rb.extend(self._data([0, 1, 0, 0, 0, 2]))
+        # the fourth element of the stratum 0 replaces its oldest element, which
+        # is then not stored
+        assert (index == torch.tensor([-1, 1, 2, 3, 0, 4])).all()
+        assert len(rb) == 5
+        assert (rb[:]["obs"] == torch.tensor([4, 1, 2, 3, 5])).all()
+        index = rb.extend(self._data([1, 1, 1], offset=10))
+        assert (index == torch.tensor([5, 6, 1])).all()
+        assert len(rb) == 7
+        assert rb.add(self._data([2], offset=20)[0]) == 7
+        assert rb.write_count == 10
+        # the buffer can be sampled from as it is filled contiguously
+        assert rb.sample(20)["task_id"].shape == (20,)
+
+    def test_overwritten_in_batch(self):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(4),
+            writer=StratifiedWriter(2, strategy="round_robin"),
+        )
+        index = rb.extend(self._data([0, 0, 0]))
+        assert (index == torch.tensor([-1, 1, 0])).all()
+        assert (rb[index[index >= 0]]["obs"] == torch.tensor([1, 2])).all()
+
+    def test_reservoir(self):
+        torch.manual_seed(0)
+        rb = TensorDictReplayBuffer(
+            storage=LazyMemmapStorage(100), writer=StratifiedWriter(4)
+        )
+        for _ in range(10):
+            rb.extend(self._data(torch.zeros(200, dtype=torch.long)))
+            rb.extend(self._data(torch.ones(20, dtype=torch.long)))
+        rb.extend(self._data(torch.full((5,), 3)))
+        assert len(rb) == 55
+        assert (rb[:]["task_id"].bincount() == torch.tensor([25, 25, 0, 5])).all()
+        # the reservoir of the first stratum spreads over all its data
+        assert (rb[:]["obs"][rb[:]["task_id"] == 0] >= 25).any()
+
+    def test_errors(self):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(10), writer=StratifiedWriter(2)
+        )
+        with pytest.raises(ValueError, match="Expected strata between 0 and 1"):
+            rb.extend(self._data([0, 2]))
+        with pytest.raises(ValueError, match="Unknown strategy"):
+            StratifiedWriter(2, strategy="fifo")
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(2), writer=StratifiedWriter(3)
+        )
+        with pytest.raises(RuntimeError, match="too small"):
+            rb.extend(self._data([0, 1]))
+
+    def test_serialize(self, tmpdir):
+        rb = TensorDictReplayBuffer(
+            storage=LazyTensorStorage(10), writer=StratifiedWriter(2)
+        )
+        rb.extend(self._data([0, 1, 0, 0, 1, 1, 1, 0, 0, 0, 0]))
+        sd = rb._writer.state_dict()
+        rb._writer.dumps(tmpdir)
+        writer_load = StratifiedWriter(2)
+        writer_load.loads(tmpdir)
+        writer_sd = StratifiedWriter(2)
+        writer_sd.load_state_dict(sd)
+        for writer in (writer_load, writer_sd):
+            assert writer._cursor == 9
+            assert (writer._num_seen == torch.tensor([7, 4])).all()
+            assert (writer._rows == sd["_rows"]).all()
+
+
 class TestMultiProc:
     @staticmethod
     def worker(rb, q0, q1):
@@ -2378,6 +3113,86 @@ class TestMultiProc:
         with pytest.raises(RuntimeError, match="it has not been initialized yet"):
             self.exec_multiproc_rb(init=False)
 
+    @pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+    def test_prefetch_workers(self, storage_type):
+        rb = TensorDictReplayBuffer(
+            storage=storage_type(100),
+            batch_size=8,
+            prefetch=3,
+            prefetch_workers=2,
+            transform=RewardScaling(loc=1.0, scale=2.0, in_keys=["obs"]),
+        )
+        rb.extend(TensorDict({"obs": torch.arange(100).float()}, [100]))
+        for _ in range(10):
+            sample = rb.sample()
+            assert sample.shape == (8,)
+            assert (sample["obs"] == sample["index"] * 2 + 1).all()
+        # batches sampled after an extension read the new content of the storage
+        rb.extend(TensorDict({"obs": -torch.ones(100)}, [100]))
+        for _ in range(rb._prefetch_cap):
+            rb.sample()
+        sample = rb.sample()
+        assert (sample["obs"] == -1).all()
+        rb._prefetcher.shutdown()
+
+    @staticmethod
+    def lock_free_worker(rb, worker_id, num_writes, queue):
+        for i in range(num_writes):
+            # every row written has a distinct, nonzero value
+            b = torch.arange(4) + 4 * (worker_id * num_writes + i) + 1
+            rb.extend(
+                TensorDict({"a": b.unsqueeze(-1).expand(4, 64).float(), "b": b}, [4])
+            )
+        queue.put(worker_id)
+
+    @staticmethod
+    def _check_lock_free_rows(data, index, num_written):
+        b = data["b"]
+        # each row is one exact row written by the workers (or the first extension)
+        assert ((b >= -4) & (b != 0) & (b <= num_written)).all()
+        assert (data["a"] == b.unsqueeze(-1)).all()
+        # extensions of 4 rows are aligned with the storage, so the position of a
+        # row in its extension is the position in the storage modulo 4
+        assert (torch.where(b > 0, b - 1, -b - 1) % 4 == index % 4).all()
+
+    def test_lock_free_writer(self):
+        num_workers, num_writes = 3, 200
+        rb = TensorDictReplayBuffer(
+            storage=LazyMemmapStorage(32),
+            writer=TensorDictRoundRobinWriter(lock_free=True),
+            batch_size=8,
+            shared=True,
+        )
+        b = -torch.arange(1, 5)
+        rb.extend(TensorDict({"a": b.unsqueeze(-1).expand(4, 64).float(), "b": b}, [4]))
+        num_written = 4 * num_workers * num_writes
+        queue = mp.Queue()
+        procs = [
+            mp.Process(target=self.lock_free_worker, args=(rb, i, num_writes, queue))
+            for i in range(num_workers)
+        ]
+        for proc in procs:
+            proc.start()
+        try:
+            done = 0
+            while done < num_workers:
+                sample, info = rb.sample(return_info=True)
+                assert (sample["index"] == info["index"]).all()
+                self._check_lock_free_rows(sample, info["index"], num_written)
+                while not queue.empty():
+                    queue.get()
+                    done += 1
+        finally:
+            for proc in procs:
+                proc.join()
+        assert rb.write_count == 4 * (num_workers * num_writes + 1)
+        assert len(rb) == 32
+        data = rb[:]
+        assert (data["index"] == torch.arange(32)).all()
+        self._check_lock_free_rows(data, torch.arange(32), num_written)
+        # the first extension has been overwritten
+        assert (data["b"] > 0).all()
+
 
 class TestSamplers:
     @pytest.mark.parametrize(
@@ -2650,6 +3465,75 @@ class TestSamplers:
         else:
             raise AssertionError
 
+    @pytest.mark.parametrize(
+        "sampler",
+        [
+            SliceSampler,
+            SliceSamplerWithoutReplacement,
+            functools.partial(
+                PrioritizedSliceSampler, max_capacity=50, alpha=0.7, beta=0.9
+            ),
+        ],
+    )
+    @pytest.mark.parametrize("use_traj_key", [True, False])
+    @pytest.mark.parametrize("storage_type", [LazyTensorStorage, LazyMemmapStorage])
+    def test_slice_sampler_incremental_index(self, sampler, use_traj_key, storage_type):
+        torch.manual_seed(0)
+        if use_traj_key:
+            kwargs = {"traj_key": "episode"}
+        else:
+            kwargs = {"end_key": ("next", "done")}
+        rb = ReplayBuffer(
+            storage=storage_type(50),
+            sampler=sampler(
+                slice_len=2, strict_length=False, incremental_index=True, **kwargs
+            ),
+            batch_size=4,
+        )
+        # a sampler that rescans the whole storage at every call
+        reference = SliceSampler(slice_len=2, **kwargs)
+        episode_count = 0
+        for _ in range(30):
+            # extend with up to twice the capacity to cover overwritten episodes
+            # and wraparounds
+            n = int(torch.randint(2, 100, ()))
+            done = torch.rand(n, 1) < 0.2
+            episode = episode_count + done.view(-1).cumsum(0) - done.view(-1).long()
+            episode_count = int(episode[-1]) + int(done[-1])
+            rb.extend(
+                TensorDict({"episode": episode, ("next", "done"): done}, batch_size=[n])
+            )
+            if torch.rand(()) < 0.3:
+                rb.add(
+                    TensorDict(
+                        {
+                            "episode": torch.tensor(episode_count),
+                            ("next", "done"): torch.ones(1, dtype=torch.bool),
+                        }
+                    )
+                )
+                episode_count += 1
+            for val, expected in zip(
+                rb._sampler._get_stop_and_length(rb._storage),
+                reference._get_stop_and_length(rb._storage),
+            ):
+                assert (val == expected).all()
+            rb.sample()
+        rb.empty()
+        rb.extend(
+            TensorDict(
+                {
+                    "episode": torch.tensor([0, 0, 1, 1]),
+                    ("next", "done"): torch.tensor([[False], [True], [False], [True]]),
+                },
+                batch_size=[4],
+            )
+        )
+        start, stop, lengths = rb._sampler._get_stop_and_length(rb._storage)
+        assert (start.squeeze(-1) == torch.tensor([0, 2])).all()
+        assert (stop.squeeze(-1) == torch.tensor([1, 3])).all()
+        assert (lengths == 2).all()
+
     def test_slice_sampler_errors(self):
         device = "cpu"
         batch_size, num_slices = 100, 20
@@ -2820,6 +3704,53 @@ class TestSamplers:
                     curr_eps = curr_eps[curr_eps != 0]
                     assert curr_eps.unique().numel() == 1
 
+    @pytest.mark.parametrize("ndim", [1, 2])
+    @pytest.mark.parametrize("variable_length", [False, True])
+    def test_slice_sampler_slice_index(self, ndim, variable_length):
+        torch.manual_seed(0)
+        storage_length = 50
+        start = torch.stack(
+            [torch.randint(storage_length, (6,))]
+            + [torch.randint(3, (6,))] * (ndim - 1),
+            -1,
+        )
+        if variable_length:
+            seq_length = torch.randint(1, 8, (6,))
+        else:
+            seq_length = 7
+        offsets, index = samplers._slice_index(start, seq_length, storage_length)
+        lengths = torch.as_tensor(seq_length).expand(6)
+        expected = []
+        for _start, _seq_len in zip(start, lengths):
+            steps = torch.zeros(int(_seq_len), ndim, dtype=start.dtype)
+            steps[:, 0] = torch.arange(int(_seq_len))
+            expected.append(_start + steps)
+        expected = torch.cat(expected)
+        expected[:, 0] %= storage_length
+        assert (index == expected).all()
+        assert (offsets == lengths.cumsum(0) - lengths).all()
+
+    @pytest.mark.parametrize("span", [(4, 4), (4, False), (False, 4)])
+    def test_slice_sampler_span_long_trajectories(self, span):
+        # slices within long trajectories do not need to be clipped
+        torch.manual_seed(0)
+        data = TensorDict(
+            {"obs": torch.arange(400), "eps": torch.arange(400) // 100},
+            [400],
+        )
+        rb = TensorDictReplayBuffer(
+            sampler=SliceSampler(slice_len=10, traj_key="eps", span=span),
+            batch_size=40,
+            storage=LazyTensorStorage(400),
+        )
+        rb.extend(data)
+        for _ in range(10):
+            sample = split_trajectories(rb.sample())
+            assert (sample["next", "truncated"].squeeze(-1).sum(-1) == 1).all()
+            for i in range(sample.shape[0]):
+                curr_eps = sample[i]["eps"][sample[i]["obs"] != 0]
+                assert curr_eps.unique().numel() <= 1
+
     def test_slice_sampler_strictlength(self):
         torch.manual_seed(0)
 
@@ -3805,6 +4736,178 @@ class TestEnsemble:
         assert isinstance(rb._writer[0], RoundRobinWriter)
 
 
+class TestShardedReplayBuffer:
+    @staticmethod
+    def _make_rb(num_shards=3, rb_type=TensorDictReplayBuffer, **kwargs):
+        return ShardedReplayBuffer(
+            *[rb_type(storage=LazyTensorStorage(100)) for _ in range(num_shards)],
+            **kwargs,
+        )
+
+    def test_round_robin(self):
+        rb = self._make_rb(batch_size=16)
+        for i in range(6):
+            data = TensorDict({"obs": torch.arange(10) + 10 * i}, [10])
+            index = rb.extend(data)
+            assert (index[:, 0] == i % 3).all()
+            assert (rb[i % 3][index[:, 1]]["obs"] == data["obs"]).all()
+        assert len(rb) == 60
+        assert rb.write_count == 60
+        sample, info = rb.sample(return_info=True)
+        assert sample.shape == (16,)
+        for shard_id, local_index, obs in zip(
+            info["index"][:, 0], info["index"][:, 1], sample["obs"]
+        ):
+            assert rb[shard_id][local_index]["obs"] == obs
+        assert (sample["shard_id"] == info["index"][:, 0]).all()
+
+    def test_hash_routing(self):
+        rb = self._make_rb(num_shards=4, routing="hash", hash_key="traj")
+        data = TensorDict(
+            {"obs": torch.randn(40, 3), "traj": torch.arange(40).flip(0) // 5}, [40]
+        )
+        index = rb.extend(data)
+        assert (index[:, 0] == data["traj"] % 4).all()
+        for (shard_id, local_index), obs in zip(index, data["obs"]):
+            assert (rb[shard_id][local_index]["obs"] == obs).all()
+        index = rb.add(TensorDict({"obs": torch.randn(3), "traj": 6}))
+        assert index[0] == 2
+        sample = rb.sample(64)
+        assert (sample["shard_id"] == sample["traj"] % 4).all()
+
+    def test_priority_routing(self):
+        rb = ShardedReplayBuffer(
+            *[
+                TensorDictPrioritizedReplayBuffer(
+                    alpha=1.0, beta=1.0, storage=LazyTensorStorage(100)
+                )
+                for _ in range(2)
+            ],
+            batch_size=8,
+        )
+        for _ in range(2):
+            rb.extend(TensorDict({"obs": torch.randn(10)}, [10]))
+        rb.update_priority(torch.tensor([[0, 3], [1, 7]]), torch.tensor([5.0, 7.0]))
+        assert rb[0]._sampler._sum_tree[3] == 5.0
+        assert rb[1]._sampler._sum_tree[7] == 7.0
+        # the batch is split across shards proportionally to their priority
+        rb.update_priority(
+            torch.stack([torch.ones(10, dtype=torch.long), torch.arange(10)], -1),
+            1e-6,
+        )
+        sample = rb.sample(64)
+        assert (sample["shard_id"] == 0).float().mean() > 0.9
+        sample["td_error"] = torch.full((64,), 2.0)
+        rb.update_tensordict_priority(sample)
+        assert rb[0]._sampler._sum_tree[sample["index"][0]] == 2.0
+
+    def test_concurrent_extend(self):
+        rb = self._make_rb(num_shards=4, num_threads=4)
+        data = TensorDict({"obs": torch.arange(10)}, [10])
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: rb.extend(data.clone()), range(20)))
+        assert len(rb) == 200
+        assert all(len(shard) == 50 for shard in rb.shards)
+
+    def test_state_dict_dumps(self, tmpdir):
+        rb = self._make_rb(batch_size=4)
+        rb.extend(TensorDict({"obs": torch.arange(10)}, [10]))
+        rb.extend(TensorDict({"obs": torch.arange(5)}, [5]))
+        rb.extend(TensorDict({"obs": torch.arange(3)}, [3]))
+        rb.extend(TensorDict({"obs": torch.arange(2)}, [2]))
+        rb_sd = self._make_rb()
+        rb_sd.load_state_dict(rb.state_dict())
+        rb.dumps(tmpdir)
+        rb_load = self._make_rb()
+        rb_load.loads(tmpdir)
+        for other in (rb_sd, rb_load):
+            assert [len(shard) for shard in other.shards] == [12, 5, 3]
+            assert other._batch_size == 4
+            # the next extension goes to the second shard
+            assert (
+                other.extend(TensorDict({"obs": torch.arange(2)}, [2]))[:, 0] == 1
+            ).all()
+        with pytest.raises(RuntimeError, match="with 3 shards"):
+            self._make_rb(num_shards=2).loads(tmpdir)
+
+
+class TestReplayBufferServer:
+    @staticmethod
+    def client_worker(client, queue):
+        index = client.extend(TensorDict({"obs": torch.ones(50, 3)}, [50]))
+        queue.put(index)
+
+    def test_server(self):
+        server = ReplayBufferServer(
+            template=TensorDict({"obs": torch.zeros(3)}),
+            num_clients=2,
+            batch_size=16,
+            max_extend_size=32,
+            storage=functools.partial(LazyTensorStorage, 200),
+            sampler=functools.partial(PrioritizedSampler, 200, 1.0, 1.0),
+        )
+        try:
+            client = server.clients[0]
+            # batches larger than the shared buffers are written in chunks
+            index = client.extend(
+                TensorDict({"obs": torch.arange(150.0).expand(3, 150).T}, [150])
+            )
+            assert (index == torch.arange(150)).all()
+            queue = mp.Queue()
+            proc = mp.Process(
+                target=self.client_worker, args=(server.clients[1], queue)
+            )
+            proc.start()
+            assert (queue.get(timeout=60) == torch.arange(150, 200)).all()
+            proc.join()
+            assert len(client) == 200
+            assert client.write_count == 200
+
+            sample = client.sample()
+            assert sample.shape == (16,)
+            expected = torch.where(sample["index"] < 150, sample["index"], 1)
+            assert (sample["obs"] == expected.float().unsqueeze(-1)).all()
+            assert (sample["_weight"] > 0).all()
+            # the output is a view on the shared buffer that is overwritten
+            sample = client.sample(8, reuse_output=True)
+            assert sample.is_shared()
+
+            # only element 3 has a non-negligible priority
+            client.update_priority(torch.arange(200), 1e-8)
+            client.update_priority(torch.tensor([3]), torch.tensor([1.0]))
+            assert (client.sample()["index"] == 3).all()
+            with pytest.raises(ValueError, match="maximum batch-size"):
+                client.sample(17)
+            with pytest.raises(RuntimeError, match="Unknown command"):
+                client._call("unknown")
+            # the server keeps serving after an error
+            assert len(client) == 200
+        finally:
+            server.shutdown()
+        with pytest.raises(RuntimeError, match="server is not running"):
+            len(client)
+
+    def test_server_error(self):
+        with pytest.raises(RuntimeError, match="could not be created"):
+            ReplayBufferServer(
+                template=TensorDict({"obs": torch.zeros(3)}),
+                batch_size=16,
+                storage=functools.partial(LazyTensorStorage, -1),
+                sampler=1,
+            )
+        # the constructor does not wait forever for a server that died
+        with pytest.raises(RuntimeError, match="exited with code 1"):
+            ReplayBufferServer(
+                template=TensorDict({"obs": torch.zeros(3)}),
+                batch_size=16,
+                replay_buffer_cls=_exit_process,
+            )
+
+
+def _exit_process(**kwargs):
+    os._exit(1)
+
+
 def _rbtype(datatype):
     if datatype in ("pytree", "tensorclass"):
         return [
@@ -4123,6 +5226,192 @@ class TestCheckpointers:
             assert rb._writer._cursor == rb_test._writer._cursor
 
 
+class TestIncrementalCheckpointer:
+    @pytest.mark.parametrize("storage_type", [LazyMemmapStorage, LazyTensorStorage])
+    @pytest.mark.parametrize("background", [False, True])
+    def test_incremental(self, storage_type, background, tmpdir):
+        tmpdir = Path(tmpdir)
+        checkpointer = IncrementalStorageCheckpointer(background=background)
+        rb = TensorDictReplayBuffer(storage=storage_type(100))
+        rb.storage.checkpointer = checkpointer
+        rb_test = TensorDictReplayBuffer(storage=storage_type(100))
+        rb_test.storage.checkpointer = IncrementalStorageCheckpointer()
+        for i in range(12):
+            rb.extend(TensorDict({"obs": torch.full((15, 2), i)}, [15]))
+            rb.dumps(tmpdir)
+            checkpointer.wait()
+            rb_test.loads(tmpdir)
+            assert_allclose_td(rb_test[:], rb[:])
+            assert rb._writer._cursor == rb_test._writer._cursor
+        manifest = json.loads((tmpdir / "storage" / "manifest.json").read_text())
+        assert manifest["version"] == 11
+        assert manifest["deltas"] == [f"delta_{i:06d}" for i in range(1, 12)]
+        delta = TensorDict.load_memmap(tmpdir / "storage" / "delta_000011")
+        # only the last batch is saved, wrapping around the storage
+        assert delta.shape == (15,)
+        assert (delta["index"] == torch.arange(165, 180) % 100).all()
+        assert (delta["data", "obs"] == 11).all()
+
+        # writing more rows than the capacity triggers a full dump
+        rb.extend(TensorDict({"obs": torch.full((100, 2), 12)}, [100]))
+        rb.dumps(tmpdir)
+        manifest = json.loads((tmpdir / "storage" / "manifest.json").read_text())
+        assert manifest["version"] == 12
+        assert manifest["base"] == "base_000012"
+        assert manifest["deltas"] == []
+        assert not (tmpdir / "storage" / "delta_000011").exists()
+        assert not (tmpdir / "storage" / "base_000000").exists()
+
+        rb.extend(TensorDict({"obs": torch.full((10, 2), 13)}, [10]))
+        rb.dumps(tmpdir)
+        checkpointer.compact(tmpdir / "storage")
+        manifest = json.loads((tmpdir / "storage" / "manifest.json").read_text())
+        assert manifest["deltas"] == []
+        assert not (tmpdir / "storage" / "delta_000013").exists()
+        rb_test.loads(tmpdir)
+        assert_allclose_td(rb_test[:], rb[:])
+
+    @pytest.mark.parametrize("storage_type", [LazyMemmapStorage, LazyTensorStorage])
+    def test_incremental_inplace(self, storage_type, tmpdir):
+        tmpdir = Path(tmpdir)
+        rb = TensorDictReplayBuffer(storage=storage_type(100))
+        rb.storage.checkpointer = IncrementalStorageCheckpointer()
+        rb_test = TensorDictReplayBuffer(storage=storage_type(100))
+        rb_test.storage.checkpointer = IncrementalStorageCheckpointer()
+        rb.extend(TensorDict({"obs": torch.zeros(50)}, [50]))
+        rb.dumps(tmpdir)
+        # rows modified outside of the writer are saved too
+        rb[3] = TensorDict(obs=7.0)
+        rb[torch.tensor([10, 11])] = TensorDict(obs=torch.full((2,), 8.0), batch_size=2)
+        rb.extend(TensorDict({"obs": torch.ones(5)}, [5]))
+        rb.dumps(tmpdir)
+        delta = TensorDict.load_memmap(tmpdir / "storage" / "delta_000001")
+        assert (delta["index"] == torch.tensor([3, 10, 11, 50, 51, 52, 53, 54])).all()
+        rb_test.loads(tmpdir)
+        assert_allclose_td(rb_test[:], rb[:])
+        assert rb_test[3]["obs"] == 7
+
+    def test_incremental_interrupted(self, tmpdir, monkeypatch):
+        tmpdir = Path(tmpdir)
+        rb = TensorDictReplayBuffer(storage=LazyMemmapStorage(100))
+        rb.storage.checkpointer = IncrementalStorageCheckpointer()
+        rb.extend(TensorDict({"obs": torch.zeros(50)}, [50]))
+        rb.dumps(tmpdir)
+        rb.extend(TensorDict({"obs": torch.ones(10)}, [10]))
+        rb.dumps(tmpdir)
+        expected = rb[:].clone()
+
+        def dumps(self, storage, path):
+            raise KeyboardInterrupt
+
+        # a full dump interrupted while writing the new base
+        rb.empty()
+        rb.extend(TensorDict({"obs": torch.full((20,), 2.0)}, [20]))
+        monkeypatch.setattr(TensorStorageCheckpointer, "dumps", dumps)
+        with pytest.raises(KeyboardInterrupt):
+            rb.dumps(tmpdir)
+        monkeypatch.undo()
+        # the previous version is still complete
+        rb_test = TensorDictReplayBuffer(storage=LazyMemmapStorage(100))
+        rb_test.storage.checkpointer = IncrementalStorageCheckpointer()
+        rb_test.loads(tmpdir)
+        assert_allclose_td(rb_test[:], expected)
+        rb.dumps(tmpdir)
+        rb_test.loads(tmpdir)
+        assert_allclose_td(rb_test[:], rb[:])
+        assert sorted(path.name for path in (tmpdir / "storage").iterdir()) == [
+            "base_000002",
+            "manifest.json",
+        ]
+
+
+class TestAsyncDumpsLoads:
+    @staticmethod
+    def _make_rb(storage_type=LazyMemmapStorage):
+        return TensorDictReplayBuffer(
+            storage=storage_type(100),
+            sampler=PrioritizedSampler(100, alpha=0.7, beta=0.9),
+            batch_size=16,
+        )
+
+    @pytest.mark.parametrize("storage_type", [LazyMemmapStorage, LazyTensorStorage])
+    def test_dumps_async(self, storage_type, tmpdir):
+        rb = self._make_rb(storage_type)
+        rb.extend(TensorDict({"obs": torch.arange(50)}, [50]))
+        rb.update_priority(torch.arange(50), torch.arange(50) + 1.0)
+        future = rb.dumps_async(tmpdir)
+        # waits for the dump to complete before writing
+        rb.extend(TensorDict({"obs": torch.arange(50, 60)}, [10]))
+        assert future.done()
+        assert future.result() is None
+
+        rb_load = self._make_rb(storage_type)
+        rb_load.loads(tmpdir)
+        assert len(rb_load) == 50
+        assert (rb_load[:]["obs"] == torch.arange(50)).all()
+        torch.testing.assert_close(
+            rb_load._sampler._sum_tree.query(0, 50), rb._sampler._sum_tree.query(0, 50)
+        )
+
+    def test_dumps_async_error(self, tmpdir):
+        rb = self._make_rb()
+        future = rb.dumps_async(tmpdir)
+        with pytest.raises(RuntimeError, match="non-initialized storage"):
+            future.result()
+        # the error is raised by the next call that waits for the dump...
+        with pytest.raises(RuntimeError, match="non-initialized storage"):
+            rb.extend(TensorDict({"obs": torch.arange(50)}, [50]))
+        # ...and the buffer can then be used
+        rb.extend(TensorDict({"obs": torch.arange(50)}, [50]))
+        assert len(rb) == 50
+
+    def test_lazy_loads_error(self, tmpdir):
+        tmpdir = Path(tmpdir)
+        rb = self._make_rb()
+        rb.extend(TensorDict({"obs": torch.arange(50)}, [50]))
+        rb.dumps(tmpdir)
+        shutil.rmtree(tmpdir / "sampler")
+        rb_load = self._make_rb()
+        rb_load.loads(tmpdir, lazy=True)
+        # the error of the background load is not hidden by a sampling error
+        with pytest.raises(Exception) as err:
+            rb_load.sample()
+        assert "p_sum" not in str(err.value)
+
+    def test_lazy_loads(self, tmpdir):
+        tmpdir = Path(tmpdir)
+        rb = self._make_rb()
+        rb.extend(TensorDict({"obs": torch.arange(50)}, [50]))
+        rb.update_priority(torch.arange(50), torch.arange(50) + 1.0)
+        rb.dumps(tmpdir)
+
+        # by default, the storage is copied and the checkpoint is left untouched
+        rb_copy = self._make_rb()
+        rb_copy.loads(tmpdir, lazy=True).result()
+        rb_copy.extend(TensorDict({"obs": torch.full((60,), 100)}, [60]))
+        rb_check = self._make_rb()
+        rb_check.loads(tmpdir)
+        assert (rb_check[:]["obs"] == torch.arange(50)).all()
+
+        rb_load = self._make_rb()
+        with pytest.warns(UserWarning, match="overwrite this checkpoint"):
+            future = rb_load.loads(tmpdir, lazy=True, in_place=True)
+        # the storage is mapped, not copied
+        assert len(rb_load) == 50
+        obs = rb_load.storage._storage["obs"]
+        assert isinstance(obs, MemoryMappedTensor)
+        assert Path(obs.filename).parent == tmpdir / "storage"
+        sample = rb_load.sample()
+        assert sample.shape == (16,)
+        assert future.result() is None
+        torch.testing.assert_close(
+            rb_load._sampler._sum_tree.query(0, 50), rb._sampler._sum_tree.query(0, 50)
+        )
+        rb_load.extend(TensorDict({"obs": torch.arange(10)}, [10]))
+        assert len(rb_load) == 60
+        assert rb_load._writer._cursor == 60
+
+
 @pytest.mark.skipif(not _has_ray, reason="ray required for this test.")
 class TestRayRB:
     @pytest.fixture(autouse=True, scope="module")
@@ -4464,6 +5753,100 @@ class TestCompressedListStorage:
         ), f"Compression ratio {compression_ratio} is too low"
 
 
+class TestCompressedListStorageCodecs:
+    @staticmethod
+    def make_storage(codec, **kwargs):
+        try:
+            return CompressedListStorage(max_size=20, codec=codec, **kwargs)
+        except ImportError as err:
+            pytest.skip(str(err))
+
+    @pytest.mark.parametrize("codec", ["zstd", "lz4", "zlib", "raw"])
+    @pytest.mark.parametrize("num_threads", [0, 4])
+    def test_batched_set_get(self, codec, num_threads):
+        storage = self.make_storage(codec, num_threads=num_threads)
+        data = TensorDict(
+            {
+                "obs": torch.randint(0, 4, (10, 3, 8, 8), dtype=torch.uint8),
+                "reward": torch.randn(10),
+                "hidden": torch.randn(10, 2).bfloat16(),
+            },
+            batch_size=[10],
+        )
+        storage.set(torch.arange(10), data)
+        assert len(storage) == 10
+        index = torch.tensor([3, 1, 9, 1])
+        result = storage.get(index)
+        assert isinstance(result, list)
+        assert (torch.stack(result) == data[index]).all()
+        assert (storage.get(2) == data[2]).all()
+
+        # identical items are decompressed in a contiguous tensordict
+        storage.stack_reads = True
+        result = storage.get(index)
+        assert isinstance(result, TensorDict)
+        assert (result == data[index]).all()
+
+        rb = ReplayBuffer(storage=storage, batch_size=5)
+        assert rb.sample().batch_size == (5,)
+
+    def test_heterogeneous_batch(self):
+        storage = self.make_storage("raw", num_threads=2, stack_reads=True)
+        tensors = [torch.randn(2), torch.randn(3), torch.randn(2)]
+        storage.set(range(3), tensors)
+        result = storage.get([0, 1, 2])
+        assert isinstance(result, list)
+        for original, retrieved in zip(tensors, result):
+            assert (original == retrieved).all()
+        result = storage.get([2, 0])
+        assert isinstance(result, torch.Tensor)
+        assert (result == torch.stack([tensors[2], tensors[0]])).all()
+
+    def test_register_codec(self):
+        calls = []
+
+        def compress(data, level):
+            calls.append("compress")
+            return bytes(data)[::-1]
+
+        def decompress(data):
+            calls.append("decompress")
+            return bytes(data)[::-1]
+
+        CompressedListStorage.register_codec("reversed", compress, decompress)
+        storage = self.make_storage("reversed")
+        data = torch.randn(4, 5)
+        storage.set(range(4), data)
+        assert (torch.stack(storage.get([0, 3])) == data[[0, 3]]).all()
+        assert calls.count("compress") == 4
+        assert calls.count("decompress") == 2
+
+        with pytest.raises(ValueError, match="Unknown codec"):
+            CompressedListStorage(max_size=20, codec="unknown")
+        # local functions cannot be sent to another process
+        with pytest.raises(RuntimeError, match="cannot be pickled"):
+            pickle.dumps(storage)
+
+    def test_register_codec_pickle(self):
+        CompressedListStorage.register_codec(
+            "reversed_module", _reversed_codec, _reversed_codec
+        )
+        storage = self.make_storage("reversed_module")
+        data = torch.randn(4, 5)
+        storage.set(range(4), data)
+        state = pickle.dumps(storage)
+        # the codec is not registered in a new process
+        del _CODECS["reversed_module"]
+        storage2 = pickle.loads(state)
+        assert (torch.stack(storage2.get([0, 3])) == data[[0, 3]]).all()
+        storage2.set(4, data[0])
+        assert (storage2.get(4) == data[0]).all()
+
+
+def _reversed_codec(data, level=None):
+    return bytes(data)[::-1]
+
+
 if __name__ == "__main__":
     args, unknown = argparse.ArgumentParser().parse_known_args()
     pytest.main([__file__, "--capture", "no", "--exitfirst"] + unknown)
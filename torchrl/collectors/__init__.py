@@ -12,11 +12,14 @@ from .collectors import (
     MultiSyncDataCollector,
     SyncDataCollector,
 )
+from .inference_server import InferenceClient, InferenceServer
 from .weight_update import (
+    DeltaWeightUpdater,
     MultiProcessedWeightUpdater,
     RayWeightUpdater,
     RemoteModuleWeightUpdater,
     VanillaWeightUpdater,
+    VersionedWeightUpdater,
     WeightUpdaterBase,
 )
 
@@ -27,8 +30,12 @@ __all__ = [
     "RayWeightUpdater",
     "RemoteModuleWeightUpdater",
     "MultiProcessedWeightUpdater",
+    "DeltaWeightUpdater",
+    "VersionedWeightUpdater",
     "aSyncDataCollector",
     "DataCollectorBase",
+    "InferenceClient",
+    "InferenceServer",
     "MultiaSyncDataCollector",
     "MultiSyncDataCollector",
     "SyncDataCollector",
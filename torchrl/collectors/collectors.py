@@ -18,6 +18,7 @@ import typing
 import warnings
 from collections import defaultdict, OrderedDict
 from collections.abc import Callable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from multiprocessing import connection, queues
 from multiprocessing.managers import SyncManager
@@ -50,10 +51,15 @@ from torchrl._utils import (
     RL_WARNINGS,
     VERBOSE,
 )
+from torchrl.collectors.inference_server import InferenceServer
 from torchrl.collectors.utils import split_trajectories
 from torchrl.collectors.weight_update import (
+    _DeltaWeightSubscriber,
+    _WeightSubscriber,
+    DeltaWeightUpdater,
     MultiProcessedWeightUpdater,
     VanillaWeightUpdater,
+    VersionedWeightUpdater,
     WeightUpdaterBase,
 )
 from torchrl.data import ReplayBuffer
@@ -571,6 +577,15 @@ class SyncDataCollector(DataCollectorBase):
             or its subclass, responsible for updating the policy weights on remote inference workers.
             This is typically not used in :class:`~torchrl.collectors.SyncDataCollector` as it operates in a single-process environment.
             Consider using a constructor if the updater needs to be serialized.
+        pipelined (bool, optional): if ``True``, the batch of environments is split in two
+            halves and the policy is run on one half while the other half is being stepped
+            in a background thread. With a :class:`~torchrl.envs.ParallelEnv`, the workers
+            step one half of the environments during the inference of the other half, instead
+            of idling. The halves are stepped with :ref:`partial steps <ref_partial_steps>`
+            of the same (possibly transformed) batched environment, and the output of the
+            collector is unchanged. Each half sees a policy with a batch-size that is half
+            the number of environments.
+            Defaults to ``False``.
 
     Examples:
         >>> from torchrl.envs.libs.gym import GymEnv
@@ -665,11 +680,13 @@ class SyncDataCollector(DataCollectorBase):
         weight_updater: WeightUpdaterBase
         | Callable[[], WeightUpdaterBase]
         | None = None,
+        pipelined: bool = False,
         **kwargs,
     ):
         from torchrl.envs.batched_envs import BatchedEnvBase
 
         self.closed = True
+        self._pipeline_executor = None
         if create_env_kwargs is None:
             create_env_kwargs = {}
         if not isinstance(create_env_fn, EnvBase):
@@ -930,6 +947,9 @@ class SyncDataCollector(DataCollectorBase):
         self._make_shuttle()
         self._maybe_make_final_rollout(make_rollout=self._use_buffers)
         self._set_truncated_keys()
+        self.pipelined = pipelined
+        if pipelined:
+            self._make_pipeline()
 
         if split_trajs is None:
             split_trajs = False
@@ -951,6 +971,36 @@ class SyncDataCollector(DataCollectorBase):
 
         self.weight_updater = weight_updater
 
+    def _make_pipeline(self):
+        from torchrl.envs.batched_envs import BatchedEnvBase
+
+        base_env = self.env
+        while isinstance(base_env, TransformedEnv):
+            base_env = base_env.base_env
+        if not isinstance(base_env, BatchedEnvBase):
+            raise ValueError(
+                "pipelined=True requires a batched environment (eg, ParallelEnv), "
+                f"possibly transformed, got {type(base_env).__name__}."
+            )
+        if not self.env.batch_size or self.env.batch_size[0] < 2:
+            raise ValueError(
+                "pipelined=True requires an environment with at least 2 sub-environments, "
+                f"got batch_size={self.env.batch_size}."
+            )
+        if self.replay_buffer is not None and not self.extend_buffer:
+            raise ValueError(
+                "pipelined=True is not compatible with a replay buffer filled at each "
+                "step. Set extend_buffer=True instead."
+            )
+        split = self.env.batch_size[0] // 2
+        self._pipeline_halves = (slice(0, split), slice(split, None))
+        masks = []
+        for half in self._pipeline_halves:
+            mask = torch.zeros(self.env.batch_size, dtype=torch.bool)
+            mask[half] = True
+            masks.append(mask.to(self.env.device) if self.env.device else mask)
+        self._pipeline_masks = masks
+
     @property
     def _traj_pool(self):
         pool = getattr(self, "_traj_pool_val", None)
@@ -1419,7 +1469,9 @@ class SyncDataCollector(DataCollectorBase):
             tensordict_out = tensordict_out.exclude(*excluded_keys, inplace=True)
         return tensordict_out
 
-    def _update_traj_ids(self, env_output) -> None:
+    def _update_traj_ids(self, env_output, shuttle=None) -> None:
+        if shuttle is None:
+            shuttle = self._shuttle
         # we can't use the reset keys because they're gone
         traj_sop = _aggregate_end_of_traj(
             env_output.get("next"), done_keys=self.env.done_keys
@@ -1427,7 +1479,7 @@ class SyncDataCollector(DataCollectorBase):
         if traj_sop.any():
             device = self.storing_device
 
-            traj_ids = self._shuttle.get(("collector", "traj_ids"))
+            traj_ids = shuttle.get(("collector", "traj_ids"))
             if device is not None:
                 traj_ids = traj_ids.to(device)
                 traj_sop = traj_sop.to(device)
@@ -1439,7 +1491,38 @@ class SyncDataCollector(DataCollectorBase):
                 traj_sop.sum(), device=traj_sop.device
             )
             traj_ids = traj_ids.masked_scatter(traj_sop, new_traj)
-            self._shuttle.set(("collector", "traj_ids"), traj_ids)
+            shuttle.set(("collector", "traj_ids"), traj_ids)
+
+    def _run_policy(self, shuttle: TensorDictBase) -> None:
+        # Runs the policy and writes its outputs in the shuttle
+        if self._cast_to_policy_device:
+            if self.policy_device is not None:
+                # This is unsafe if the shuttle is in pin_memory -- otherwise cuda will be happy with non_blocking
+                non_blocking = (
+                    not self.no_cuda_sync or self.policy_device.type == "cuda"
+                )
+                policy_input = shuttle.to(
+                    self.policy_device,
+                    non_blocking=non_blocking,
+                )
+                if not self.no_cuda_sync:
+                    self._sync_policy()
+            elif self.policy_device is None:
+                # we know the tensordict has a device otherwise we would not be here
+                # we can pass this, clear_device_ must have been called earlier
+                # policy_input = shuttle.clear_device_()
+                policy_input = shuttle
+        else:
+            policy_input = shuttle
+        # we still do the assignment for security
+        if self.compiled_policy:
+            cudagraph_mark_step_begin()
+        policy_output = self.policy(policy_input)
+        if self.compiled_policy:
+            policy_output = policy_output.clone()
+        if shuttle is not policy_output:
+            # ad-hoc update shuttle
+            shuttle.update(policy_output, keys_to_update=self._policy_output_keys)
 
     @torch.no_grad()
     def rollout(self) -> TensorDictBase:
@@ -1457,6 +1540,11 @@ class SyncDataCollector(DataCollectorBase):
             self._final_rollout.fill_(("collector", "traj_ids"), -1)
         else:
             pass
+        if self.pipelined and not (
+            self.init_random_frames is not None
+            and self._frames < self.init_random_frames
+        ):
+            return self._rollout_pipelined()
         tensordicts = []
         with set_exploration_type(self.exploration_type):
             for t in range(self.frames_per_batch):
@@ -1481,37 +1569,7 @@ class SyncDataCollector(DataCollectorBase):
                             nested_keys=True,
                         )
                 else:
-                    if self._cast_to_policy_device:
-                        if self.policy_device is not None:
-                            # This is unsafe if the shuttle is in pin_memory -- otherwise cuda will be happy with non_blocking
-                            non_blocking = (
-                                not self.no_cuda_sync
-                                or self.policy_device.type == "cuda"
-                            )
-                            policy_input = self._shuttle.to(
-                                self.policy_device,
-                                non_blocking=non_blocking,
-                            )
-                            if not self.no_cuda_sync:
-                                self._sync_policy()
-                        elif self.policy_device is None:
-                            # we know the tensordict has a device otherwise we would not be here
-                            # we can pass this, clear_device_ must have been called earlier
-                            # policy_input = self._shuttle.clear_device_()
-                            policy_input = self._shuttle
-                    else:
-                        policy_input = self._shuttle
-                    # we still do the assignment for security
-                    if self.compiled_policy:
-                        cudagraph_mark_step_begin()
-                    policy_output = self.policy(policy_input)
-                    if self.compiled_policy:
-                        policy_output = policy_output.clone()
-                    if self._shuttle is not policy_output:
-                        # ad-hoc update shuttle
-                        self._shuttle.update(
-                            policy_output, keys_to_update=self._policy_output_keys
-                        )
+                    self._run_policy(self._shuttle)
 
                 if self._cast_to_env_device:
                     if self.env_device is not None:
@@ -1616,6 +1674,104 @@ class SyncDataCollector(DataCollectorBase):
 
         return self._maybe_set_truncated(result)
 
+    def _rollout_pipelined(self) -> TensorDictBase:
+        # The env batch is split in two halves: the policy runs on one half while
+        # the other half is stepped in a background thread, then the halves swap.
+        # Both halves are stepped through partial steps of the same env, and only
+        # one of them is being stepped at any time.
+        halves = self._pipeline_halves
+        shuttles = [self._shuttle[half] for half in halves]
+        tensordicts = ([], [])
+        executor = self._pipeline_executor
+        if executor is None:
+            executor = self._pipeline_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="collector-pipeline"
+            )
+        with set_exploration_type(self.exploration_type):
+            for shuttle in shuttles:
+                self._run_policy(shuttle)
+            # the input of the env is written in place, one half at a time
+            env_input = torch.cat(shuttles, 0)
+            if self.env_device is not None:
+                env_input = env_input.to(self.env_device)
+
+            def submit(i):
+                env_input[halves[i]].update_(shuttles[i])
+                step_input = env_input.exclude("next")
+                step_input.set("_step", self._pipeline_masks[i])
+                return executor.submit(self._pipeline_step, step_input)
+
+            def complete(i, future):
+                env_output, env_next_output = future.result()
+                shuttle = shuttles[i]
+                next_data = env_output.get("next")[halves[i]]
+                if self._shuttle_has_no_device:
+                    next_data.clear_device_()
+                shuttle.set("next", next_data)
+                if self.storing_device is not None:
+                    non_blocking = (
+                        not self.no_cuda_sync or self.storing_device.type == "cuda"
+                    )
+                    tensordicts[i].append(
+                        shuttle.to(self.storing_device, non_blocking=non_blocking)
+                    )
+                    if not self.no_cuda_sync:
+                        self._sync_storage()
+                else:
+                    tensordicts[i].append(shuttle)
+                collector_data = shuttle.get("collector").copy()
+                next_shuttle = env_next_output[halves[i]]
+                next_shuttle.pop("_step", None)
+                if self._shuttle_has_no_device:
+                    next_shuttle.clear_device_()
+                next_shuttle.set("collector", collector_data)
+                self._update_traj_ids(shuttle, next_shuttle)
+                shuttles[i] = next_shuttle
+
+            future = submit(0)
+            for t in range(self.frames_per_batch):
+                last = t == self.frames_per_batch - 1
+                if t:
+                    self._run_policy(shuttles[1])
+                complete(0, future)
+                future = submit(1)
+                if not last:
+                    self._run_policy(shuttles[0])
+                complete(1, future)
+                if (
+                    self.interruptor is not None
+                    and self.interruptor.collection_stopped()
+                ):
+                    break
+                if not last:
+                    future = submit(0)
+
+        self._shuttle = torch.cat(shuttles, 0)
+        if self._use_buffers:
+            result = self._final_rollout
+            num_steps = len(tensordicts[0])
+            with result.unlock_():
+                for half, half_tensordicts in zip(halves, tensordicts):
+                    torch.stack(
+                        half_tensordicts,
+                        result.ndim - 1,
+                        out=result[half][..., :num_steps],
+                    )
+        else:
+            result = torch.cat(
+                [
+                    TensorDict.maybe_dense_stack(half_tensordicts, dim=-1)
+                    for half_tensordicts in tensordicts
+                ],
+                0,
+            )
+            result.refine_names(..., "time")
+        return self._maybe_set_truncated(result)
+
+    @torch.no_grad()
+    def _pipeline_step(self, env_input):
+        return self.env.step_and_maybe_reset(env_input)
+
     def _maybe_set_truncated(self, final_rollout):
         last_step = (slice(None),) * (final_rollout.ndim - 1) + (-1,)
         for truncated_key in self._truncated_keys:
@@ -1670,6 +1826,9 @@ class SyncDataCollector(DataCollectorBase):
             del self._shuttle
             if self._use_buffers:
                 del self._final_rollout
+            if self._pipeline_executor is not None:
+                self._pipeline_executor.shutdown()
+                self._pipeline_executor = None
             if close_env and not self.env.is_closed:
                 self.env.close()
             del self.env
@@ -1944,6 +2103,23 @@ class _MultiDataCollector(DataCollectorBase):
             If not provided, a :class:`~torchrl.collectors.MultiProcessedWeightUpdater` will be used by default,
             which handles weight synchronization across multiple processes.
             Consider using a constructor if the updater needs to be serialized.
+        inference_server (bool or Dict[str, Any], optional): if ``True``, the policy is
+            executed by a single :class:`~torchrl.collectors.InferenceServer`
+            process that batches the requests of all the workers, and the workers only
+            step their environments. If a dictionary of kwargs is passed, it will be used
+            to build the server (e.g., ``{"max_batch_size": 64, "timeout": 1e-3}``).
+            The server runs the policy on the policy device of the first worker and
+            sees the weight updates of that device.
+            Defaults to ``False``.
+        num_slots (int, optional): (:class:`~torchrl.collectors.MultiaSyncDataCollector` exclusively).
+            The number of pre-allocated shared-memory buffers of each worker. With
+            ``num_slots > 1``, the workers write their batches in turn in a ring of
+            buffers and keep on collecting as long as a slot is free, i.e., they can
+            run up to ``num_slots`` batches ahead of the main process.
+            The number of batches waiting in each ring can be retrieved with
+            :meth:`queue_occupancy`. Not compatible with a replay buffer or
+            ``use_buffers=False``.
+            Defaults to ``1``.
 
     """
 
@@ -1989,8 +2165,11 @@ class _MultiDataCollector(DataCollectorBase):
         weight_updater: WeightUpdaterBase
         | Callable[[], WeightUpdaterBase]
         | None = None,
+        inference_server: bool | dict[str, Any] = False,
+        num_slots: int = 1,
     ):
         self.closed = True
+        self._inference_server = None
         if isinstance(create_env_fn, Sequence):
             self.num_workers = len(create_env_fn)
         else:
@@ -2060,6 +2239,19 @@ class _MultiDataCollector(DataCollectorBase):
         self._use_buffers = use_buffers
         self.replay_buffer = replay_buffer
         self._check_replay_buffer_init()
+        if num_slots < 1:
+            raise ValueError(f"num_slots must be a positive integer, got {num_slots}.")
+        if num_slots > 1:
+            if not isinstance(self, MultiaSyncDataCollector):
+                raise ValueError(
+                    "num_slots > 1 is only supported by MultiaSyncDataCollector."
+                )
+            if replay_buffer is not None or use_buffers is False:
+                raise ValueError(
+                    "num_slots > 1 requires the data to be written in shared buffers, "
+                    "which is incompatible with a replay buffer or use_buffers=False."
+                )
+        self.num_slots = num_slots
         if replay_buffer_chunk is not None:
             if extend_buffer is None:
                 replay_buffer_chunk = extend_buffer
@@ -2087,6 +2279,14 @@ class _MultiDataCollector(DataCollectorBase):
 
         if not isinstance(policy_factory, Sequence):
             policy_factory = [policy_factory] * self.num_workers
+        if inference_server and any(policy_factory):
+            raise ValueError("inference_server is not compatible with policy_factory.")
+        if inference_server and isinstance(
+            weight_updater, (DeltaWeightUpdater, VersionedWeightUpdater)
+        ):
+            raise ValueError(
+                f"inference_server is not compatible with a {type(weight_updater).__name__}."
+            )
         if any(policy_factory) and policy is not None:
             raise TypeError("policy_factory and policy are mutually exclusive")
         elif not any(policy_factory):
@@ -2127,6 +2327,9 @@ class _MultiDataCollector(DataCollectorBase):
 
         self.policy = policy
         self.policy_factory = policy_factory
+        if inference_server is True:
+            inference_server = {}
+        self.inference_server_kwargs = inference_server or None
 
         remainder = 0
         if total_frames is None or total_frames < 0:
@@ -2285,6 +2488,17 @@ class _MultiDataCollector(DataCollectorBase):
     def _queue_len(self) -> int:
         raise NotImplementedError
 
+    def queue_occupancy(self) -> torch.Tensor:
+        """Returns the number of batches collected by each worker and not yet read by the main process.
+
+        With ``num_slots > 1``, this is the number of occupied slots in the ring
+        of each worker, between ``0`` and ``num_slots``. A ring that is always full
+        indicates that the consumer is the bottleneck, an empty one that the
+        workers are.
+        """
+        written, read = self._ring_counts.unbind(-1)
+        return written - read
+
     def _run_processes(self) -> None:
         if self.num_threads is None:
             total_workers = self._total_workers_from_env(self.create_env_fn)
@@ -2297,6 +2511,10 @@ class _MultiDataCollector(DataCollectorBase):
         self.procs = []
         self.pipes = []
         self._traj_pool = _TrajectoryPool(lock=True)
+        # Number of batches written by each worker and read by the main process
+        self._ring_counts = torch.zeros(
+            self.num_workers, 2, dtype=torch.long
+        ).share_memory_()
         # Create a policy on the right device
         policy_factory = self.policy_factory
         if any(policy_factory):
@@ -2305,6 +2523,10 @@ class _MultiDataCollector(DataCollectorBase):
                 for _policy_factory in policy_factory
             ]
 
+        inference_clients = None
+        if self.inference_server_kwargs is not None:
+            inference_clients = self._make_inference_server().clients
+
         for i, (env_fun, env_fun_kwargs) in enumerate(
             zip(self.create_env_fn, self.create_env_kwargs)
         ):
@@ -2363,7 +2585,26 @@ class _MultiDataCollector(DataCollectorBase):
                     "postproc": self.postprocs
                     if self.replay_buffer is not None
                     else None,
+                    "num_slots": self.num_slots,
+                    "ring_counts": self._ring_counts[i],
+                    "weight_subscriber": self.weight_updater.subscriber(i)
+                    if isinstance(
+                        self.weight_updater,
+                        (DeltaWeightUpdater, VersionedWeightUpdater),
+                    )
+                    else None,
                 }
+                if inference_clients is not None:
+                    # The workers only step their envs, the policy lives in the server
+                    kwargs.update(
+                        {
+                            "policy": inference_clients[i],
+                            "policy_device": None,
+                            "trust_policy": True,
+                            "compile_policy": False,
+                            "cudagraph_policy": False,
+                        }
+                    )
                 proc = _ProcessNoWarn(
                     target=_main_async_collector,
                     num_threads=self.num_sub_threads,
@@ -2394,6 +2635,26 @@ also that the state dict is synchronised across processes if needed."""
         self.queue_out = queue_out
         self.closed = False
 
+    def _make_inference_server(self) -> InferenceServer:
+        policy = self.policy
+        policy_device = self.policy_device[0]
+        policy_weights = self._policy_weights_dict.get(policy_device)
+        if policy is not None and policy_weights is not None:
+            cm = policy_weights.to_module(policy)
+        else:
+            cm = contextlib.nullcontext()
+        kwargs = {
+            "policy_device": policy_device,
+            "exploration_type": self.exploration_type,
+        }
+        kwargs.update(self.inference_server_kwargs)
+        with cm:
+            # The server shares the weights of the first policy device
+            self._inference_server = InferenceServer(
+                policy, num_clients=self.num_workers, **kwargs
+            )
+        return self._inference_server
+
     _running_free = False
 
     def start(self):
@@ -2572,6 +2833,9 @@ also that the state dict is synchronised across processes if needed."""
             for proc in self.procs:
                 if proc.is_alive():
                     proc.terminate()
+            if self._inference_server is not None:
+                self._inference_server.shutdown()
+                self._inference_server = None
 
     def async_shutdown(self, timeout: float | None = None):
         return self.shutdown(timeout=timeout)
@@ -2912,10 +3176,6 @@ class MultiSyncDataCollector(_MultiDataCollector):
                 use_buffers = self._use_buffers
                 if self.replay_buffer is not None:
                     idx = new_data
-                    workers_frames[idx] = workers_frames[
-                        idx
-                    ] + self.frames_per_batch_worker(worker_idx=idx)
-                    continue
                 elif j == 0 or not use_buffers:
                     try:
                         data, idx = new_data
@@ -2930,6 +3190,12 @@ class MultiSyncDataCollector(_MultiDataCollector):
                             raise
                 else:
                     idx = new_data
+                self._ring_counts[idx, 1] = j + 1
+                if self.replay_buffer is not None:
+                    workers_frames[idx] = workers_frames[
+                        idx
+                    ] + self.frames_per_batch_worker(worker_idx=idx)
+                    continue
 
                 if preempt:
                     # mask buffers if cat, and create a mask if stack
@@ -3228,13 +3494,15 @@ class MultiaSyncDataCollector(_MultiDataCollector):
     def _get_from_queue(self, timeout=None) -> tuple[int, int, TensorDictBase]:
         new_data, j = self.queue_out.get(timeout=timeout)
         use_buffers = self._use_buffers
+        # the workers write their batches in turn in their ring of buffers
+        slot = j % self.num_slots
         if self.replay_buffer is not None:
             idx = new_data
-        elif j == 0 or not use_buffers:
+        elif j < self.num_slots or not use_buffers:
             try:
                 data, idx = new_data
-                self.out_tensordicts[idx] = data
-                if use_buffers is None and j > 0:
+                self.out_tensordicts[idx, slot] = data
+                if use_buffers is None and j >= self.num_slots:
                     use_buffers = self._use_buffers = False
             except TypeError:
                 if use_buffers is None:
@@ -3244,14 +3512,18 @@ class MultiaSyncDataCollector(_MultiDataCollector):
                     raise
         else:
             idx = new_data
-        out = self.out_tensordicts[idx]
-        if not self.replay_buffer and (j == 0 or use_buffers):
+        out = self.out_tensordicts[idx, slot]
+        if not self.replay_buffer and (j < self.num_slots or use_buffers):
             # we clone the data to make sure that we'll be working with a fixed copy
             out = out.clone()
+        # the slot can now be overwritten by the worker
+        self._ring_counts[idx, 1] = j + 1
         return idx, j, out
 
     @property
     def _queue_len(self) -> int:
+        if self.num_slots > 1:
+            return self.num_workers * self.num_slots
         return 1
 
     def iterator(self) -> Iterator[TensorDictBase]:
@@ -3583,6 +3855,9 @@ def _main_async_collector(
     policy_factory: Callable | None = None,
     collector_class: type | Callable[[], DataCollectorBase] | None = None,
     postproc: Callable[[TensorDictBase], TensorDictBase] | None = None,
+    num_slots: int = 1,
+    ring_counts: torch.Tensor | None = None,
+    weight_subscriber: _WeightSubscriber | _DeltaWeightSubscriber | None = None,
 ) -> None:
     if collector_class is None:
         collector_class = SyncDataCollector
@@ -3590,6 +3865,14 @@ def _main_async_collector(
     # init variables that will be cleared when closing
     collected_tensordict = data = next_data = data_in = inner_collector = dc_iter = None
 
+    local_weights = None
+    if weight_subscriber is not None:
+        # The worker holds its own copy of the weights, which is only updated
+        # between batches.
+        local_weights = weight_subscriber.init_weights()
+        if isinstance(policy, nn.Module):
+            local_weights.to_module(policy)
+
     inner_collector = collector_class(
         create_env_fn,
         create_env_kwargs=create_env_kwargs,
@@ -3619,6 +3902,21 @@ def _main_async_collector(
         no_cuda_sync=no_cuda_sync,
     )
     use_buffers = inner_collector._use_buffers
+    if ring_counts is None:
+        ring_counts = torch.zeros(2, dtype=torch.long)
+    ring = None
+    if num_slots > 1:
+        if not use_buffers:
+            raise RuntimeError(
+                "num_slots > 1 requires the collector to use buffers, but the "
+                "inner collector does not."
+            )
+        # The batches are collected in turn in a ring of pre-allocated buffers
+        ring = [inner_collector._final_rollout]
+        ring += [ring[0].clone() for _ in range(num_slots - 1)]
+    # in ring mode, the worker collects ahead once it has received a first "continue",
+    # using the last collection message received
+    collecting = None
     if verbose:
         torchrl_logger.info("Sync data collector created")
     dc_iter = iter(inner_collector)
@@ -3630,7 +3928,18 @@ def _main_async_collector(
     run_free = False
     while True:
         _timeout = _TIMEOUT if not has_timed_out else 1e-3
-        if not run_free and pipe_child.poll(_timeout):
+        if ring is not None and collecting:
+            ring_full = j - int(ring_counts[1]) >= num_slots
+            if pipe_child.poll(_MIN_TIMEOUT if ring_full else 0):
+                data_in, msg = pipe_child.recv()
+                if verbose:
+                    torchrl_logger.info(f"worker {idx} received {msg}")
+            elif ring_full:
+                # wait for the main process to read a batch
+                continue
+            else:
+                data_in, msg = None, collecting
+        elif not run_free and pipe_child.poll(_timeout):
             counter = 0
             data_in, msg = pipe_child.recv()
             if verbose:
@@ -3658,6 +3967,8 @@ def _main_async_collector(
                 counter += _timeout
                 if verbose:
                     torchrl_logger.info(f"worker {idx} has counter {counter}")
+                if weight_subscriber is not None:
+                    weight_subscriber.pull(local_weights)
                 if counter >= (_MAX_IDLE_COUNT * _TIMEOUT):
                     raise RuntimeError(
                         f"This process waited for {counter} seconds "
@@ -3701,8 +4012,22 @@ def _main_async_collector(
                 inner_collector.init_random_frames = float("inf")
             else:
                 inner_collector.init_random_frames = -1
+            if ring is not None:
+                collecting = msg
+                if j - int(ring_counts[1]) >= num_slots:
+                    continue
+                inner_collector._final_rollout = ring[j % num_slots]
+            if weight_subscriber is not None:
+                # pick up the latest published weights
+                weight_subscriber.pull(local_weights)
             next_data = next(dc_iter)
-            if pipe_child.poll(_MIN_TIMEOUT):
+            if weight_subscriber is not None:
+                while weight_subscriber.is_stale():
+                    # the weights were updated too many times during the collection
+                    weight_subscriber.pull(local_weights)
+                    next_data = next(dc_iter)
+                _set_policy_version(next_data, weight_subscriber.current_version)
+            if ring is None and pipe_child.poll(_MIN_TIMEOUT):
                 # in this case, main send a message to the worker while it was busy collecting trajectories.
                 # In that case, we skip the collected trajectory and get the message from main. This is faster than
                 # sending the trajectory in the queue until timeout when it's never going to be received.
@@ -3716,6 +4041,8 @@ def _main_async_collector(
                 if run_free:
                     continue
 
+                # the batch is counted before it can be read by the main process
+                ring_counts[0] = j + 1
                 try:
                     queue_out.put((idx, j), timeout=_TIMEOUT)
                     if verbose:
@@ -3724,12 +4051,13 @@ def _main_async_collector(
                     has_timed_out = False
                     continue
                 except queue.Full:
+                    ring_counts[0] = j
                     if verbose:
                         torchrl_logger.info(f"worker {idx} has timed out")
                     has_timed_out = True
                     continue
 
-            if j == 0 or not use_buffers:
+            if j < num_slots or not use_buffers:
                 collected_tensordict = next_data
                 if (
                     storing_device is not None
@@ -3770,11 +4098,15 @@ def _main_async_collector(
                         collected_tensordict.apply(cast_tensor, filter_empty=True)
                 data = (collected_tensordict, idx)
             else:
-                if next_data is not collected_tensordict:
+                if next_data is not (
+                    collected_tensordict if ring is None else ring[j % num_slots]
+                ):
                     raise RuntimeError(
                         "SyncDataCollector should return the same tensordict modified in-place."
                     )
                 data = idx  # flag the worker that has sent its data
+            # the batch is counted before it can be read by the main process
+            ring_counts[0] = j + 1
             try:
                 queue_out.put((data, j), timeout=_TIMEOUT)
                 if verbose:
@@ -3783,6 +4115,7 @@ def _main_async_collector(
                 has_timed_out = False
                 continue
             except queue.Full:
+                ring_counts[0] = j
                 if verbose:
                     torchrl_logger.info(f"worker {idx} has timed out")
                 has_timed_out = True
@@ -3838,6 +4171,18 @@ def _main_async_collector(
             raise Exception(f"Unrecognized message {msg}")
 
 
+def _set_policy_version(tensordict: TensorDictBase, version: int) -> None:
+    key = ("collector", "policy_version")
+    policy_version = tensordict.get(key, None)
+    if policy_version is not None:
+        # written in place as the tensordict may be a shared buffer
+        policy_version.fill_(version)
+        return
+    traj_ids = tensordict.get(("collector", "traj_ids"))
+    with tensordict.unlock_():
+        tensordict.set(key, torch.full_like(traj_ids, version))
+
+
 def _make_meta_params(param):
     is_param = isinstance(param, Parameter)
 
@@ -0,0 +1,319 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from __future__ import annotations
+
+import contextlib
+import time
+import traceback
+from multiprocessing.connection import Connection, wait
+from typing import Callable
+
+import torch
+from tensordict import TensorDictBase
+from tensordict.nn import TensorDictModuleBase
+from torch import multiprocessing as mp
+
+from torchrl._utils import _ProcessNoWarn
+from torchrl.data.utils import DEVICE_TYPING
+from torchrl.envs.utils import ExplorationType, set_exploration_type
+
+
+class InferenceClient(TensorDictModuleBase):
+    """A policy stub that delegates the inference to an :class:`InferenceServer`.
+
+    Clients are created by the server and sent to the collector workers, where they
+    are used as policies. At the first call, the client allocates a shared-memory
+    tensordict for the policy inputs and receives a shared-memory tensordict for the
+    policy outputs from the server. Each following call copies the inputs in the
+    shared buffer, sends a request through a pipe and waits for the server to write
+    the outputs.
+
+    A client must not be used by more than one thread at a time.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        in_keys: list | None = None,
+        out_keys: list | None = None,
+    ):
+        super().__init__()
+        self._connection = connection
+        self.in_keys = in_keys if in_keys is not None else []
+        self.out_keys = out_keys if out_keys is not None else []
+        self._input = None
+        self._output = None
+
+    def _call(self, cmd: str, arg=None):
+        try:
+            self._connection.send((cmd, arg))
+            status, result = self._connection.recv()
+        except (EOFError, OSError) as err:
+            raise RuntimeError("The inference server is not running.") from err
+        if status == "error":
+            raise RuntimeError(
+                f"The inference server failed with the following error:\n{result}"
+            )
+        return result
+
+    def _select_inputs(self, tensordict: TensorDictBase) -> TensorDictBase:
+        if self.in_keys:
+            return tensordict.select(*self.in_keys)
+        return tensordict.exclude("collector", "next")
+
+    def forward(self, tensordict: TensorDictBase) -> TensorDictBase:
+        policy_input = self._select_inputs(tensordict)
+        if self._input is None or self._input.shape != policy_input.shape:
+            # The buffers are (re-)allocated whenever the batch-size changes
+            self._input = policy_input.to("cpu").clone().share_memory_()
+            self._output = self._call("register", self._input)
+        else:
+            self._input.update_(policy_input)
+            self._call("infer")
+        policy_output = self._output.clone()
+        if tensordict.device is not None:
+            policy_output = policy_output.to(tensordict.device)
+        return tensordict.update(policy_output)
+
+
+def _flat(tensordict: TensorDictBase) -> TensorDictBase:
+    if tensordict.batch_dims == 1:
+        return tensordict
+    return tensordict.reshape(-1)
+
+
+def _main_inference_server(
+    policy: Callable[[TensorDictBase], TensorDictBase],
+    control: Connection,
+    connections: list[Connection],
+    max_batch_size: int | None,
+    timeout: float,
+    policy_device: DEVICE_TYPING | None,
+    exploration_type: ExplorationType | None,
+) -> None:
+    # The inputs and outputs registered by each client
+    inputs = {}
+    outputs = {}
+    out_keys = getattr(policy, "out_keys", None)
+    connections = [control, *connections]
+    if exploration_type is not None:
+        exploration_ctx = set_exploration_type(exploration_type)
+    else:
+        exploration_ctx = contextlib.nullcontext()
+
+    def run_policy(policy_input):
+        if policy_device is not None:
+            policy_input = policy_input.to(policy_device)
+        return policy(policy_input).to("cpu")
+
+    def register(conn, policy_input):
+        policy_output = run_policy(policy_input.clone())
+        if out_keys:
+            policy_output = policy_output.select(*out_keys)
+        else:
+            policy_output = policy_output.exclude(*policy_input.keys(True, True))
+        inputs[conn] = policy_input
+        outputs[conn] = policy_output.clone().share_memory_()
+        return outputs[conn]
+
+    def infer(batch):
+        policy_input = torch.cat([_flat(inputs[conn]) for conn in batch])
+        policy_output = run_policy(policy_input)
+        start = 0
+        for conn in batch:
+            output = outputs[conn]
+            stop = start + output.numel()
+            output.update_(
+                policy_output[start:stop].reshape(output.shape),
+                keys_to_update=list(output.keys(True, True)),
+            )
+            start = stop
+
+    closing = False
+
+    def recv(ready, batch):
+        # Collects the requests of the ready clients and returns the number of
+        # elements added to the batch
+        nonlocal closing
+        numel = 0
+        for conn in ready:
+            try:
+                cmd, arg = conn.recv()
+            except EOFError:
+                # the worker (or the main process) has exited
+                connections.remove(conn)
+                inputs.pop(conn, None)
+                outputs.pop(conn, None)
+                closing = closing or conn is control
+                continue
+            if conn is control:
+                closing = closing or cmd == "close"
+                continue
+            try:
+                if cmd == "register":
+                    conn.send(("ok", register(conn, arg)))
+                elif cmd == "infer":
+                    batch.append(conn)
+                    numel += inputs[conn].numel()
+                else:
+                    raise RuntimeError(f"Unknown command {cmd}.")
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+        return numel
+
+    control.send(("ok", None))
+    with torch.no_grad(), exploration_ctx:
+        while not closing:
+            batch = []
+            numel = recv(wait(connections), batch)
+            # Wait for more requests until the batch is full, every client has
+            # sent a request or the timeout is reached. The control connection is
+            # left out: it would keep the wait going until the timeout.
+            deadline = time.monotonic() + timeout
+            while not closing and (max_batch_size is None or numel < max_batch_size):
+                pending = [
+                    conn
+                    for conn in connections
+                    if conn is not control and conn not in batch
+                ]
+                remaining = deadline - time.monotonic()
+                if not pending or remaining <= 0:
+                    break
+                ready = wait(pending, remaining)
+                if not ready:
+                    break
+                numel += recv(ready, batch)
+            if not batch:
+                continue
+            try:
+                infer(batch)
+                result = ("ok", None)
+            except Exception:
+                result = ("error", traceback.format_exc())
+            for conn in batch:
+                conn.send(result)
+    if control in connections:
+        control.send(("ok", None))
+
+
+class InferenceServer:
+    """A process running the inference of a policy for several collector workers.
+
+    With a :class:`~torchrl.collectors.MultiSyncDataCollector` or a
+    :class:`~torchrl.collectors.MultiaSyncDataCollector`, each worker usually holds
+    a copy of the policy and runs the inference on the batch of its own environments.
+    With many workers, this means many copies of the model and small, inefficient
+    forward passes. Instead, the inference server holds the only copy of the policy
+    and the workers are given an :class:`InferenceClient` in place of the policy:
+    the workers only step their environments and send their observations to the
+    server through shared-memory buffers.
+
+    The server batches the requests dynamically: once a request is received, it
+    waits for the requests of the other workers for at most ``timeout`` seconds or
+    until ``max_batch_size`` elements are gathered, then runs the policy on the
+    concatenated inputs and writes the actions in the output buffers of the workers.
+
+    Args:
+        policy (Callable[[TensorDictBase], TensorDictBase]): the policy. Its weights
+            are shared with the server process, hence in-place updates of the
+            weights (as done by :meth:`~torchrl.collectors.DataCollectorBase.update_policy_weights_`)
+            are seen by the server.
+
+    Keyword Args:
+        num_clients (int, optional): the number of clients to create. Defaults to ``1``.
+        max_batch_size (int, optional): the maximum number of elements gathered before
+            the policy is run. Defaults to ``None`` (all the pending requests).
+        timeout (float, optional): the maximum time (in seconds) to wait for more
+            requests once a request has been received. Defaults to ``1e-3``.
+        policy_device (torch.device, optional): the device where the inference is
+            executed. The inputs are cast to this device before the policy is called.
+            Defaults to ``None`` (no casting).
+        exploration_type (ExplorationType, optional): the exploration type used
+            during inference. Defaults to ``None`` (the default exploration type).
+        num_threads (int, optional): the number of threads of the server process.
+
+    .. note:: The policy inputs of all the clients must have the same entries
+        (with the same shapes and dtypes beyond the batch-size).
+
+    Examples:
+        >>> from torchrl.collectors import MultiSyncDataCollector
+        >>> from torchrl.envs import GymEnv
+        >>> from tensordict.nn import TensorDictModule
+        >>> from torch import nn
+        >>> if __name__ == "__main__":
+        ...     policy = TensorDictModule(nn.Linear(3, 1), in_keys=["observation"], out_keys=["action"])
+        ...     collector = MultiSyncDataCollector(
+        ...         [lambda: GymEnv("Pendulum-v1")] * 4,
+        ...         policy,
+        ...         frames_per_batch=200,
+        ...         total_frames=2000,
+        ...         inference_server={"max_batch_size": 4},
+        ...     )
+        ...     for data in collector:
+        ...         ...
+        ...     collector.shutdown()
+
+    """
+
+    _TIMEOUT = 10.0
+
+    def __init__(
+        self,
+        policy: Callable[[TensorDictBase], TensorDictBase],
+        *,
+        num_clients: int = 1,
+        max_batch_size: int | None = None,
+        timeout: float = 1e-3,
+        policy_device: DEVICE_TYPING | None = None,
+        exploration_type: ExplorationType | None = None,
+        num_threads: int | None = None,
+    ) -> None:
+        pipes = [mp.Pipe() for _ in range(num_clients)]
+        self._control, server_control = mp.Pipe()
+        self._process = _ProcessNoWarn(
+            target=_main_inference_server,
+            num_threads=num_threads,
+            kwargs={
+                "policy": policy,
+                "control": server_control,
+                "connections": [server_end for _, server_end in pipes],
+                "max_batch_size": max_batch_size,
+                "timeout": timeout,
+                "policy_device": policy_device,
+                "exploration_type": exploration_type,
+            },
+            daemon=True,
+        )
+        self._process.start()
+        server_control.close()
+        in_keys = getattr(policy, "in_keys", None)
+        out_keys = getattr(policy, "out_keys", None)
+        self.clients = [
+            InferenceClient(client_end, in_keys=in_keys, out_keys=out_keys)
+            for client_end, _ in pipes
+        ]
+        if not self._control.poll(self._TIMEOUT * 10):
+            self._process.terminate()
+            raise RuntimeError("The inference server could not be started.")
+        self._control.recv()
+
+    def shutdown(self) -> None:
+        """Stops the server process."""
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._control.send(("close", None))
+            if self._control.poll(self._TIMEOUT):
+                self._control.recv()
+            self._process.join(timeout=self._TIMEOUT)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
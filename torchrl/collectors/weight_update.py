@@ -5,6 +5,8 @@
 from __future__ import annotations
 
 import abc
+import queue
+import time
 import weakref
 from collections.abc import Callable
 from typing import Any, TypeVar
@@ -12,6 +14,7 @@ from typing import Any, TypeVar
 import torch
 from tensordict import TensorDict, TensorDictBase
 from tensordict.nn import TensorDictModuleBase
+from torch import multiprocessing as mp
 from torchrl._utils import logger as torchrl_logger
 
 Policy = TypeVar("Policy", bound=TensorDictModuleBase)
@@ -453,6 +456,542 @@ class MultiProcessedWeightUpdater(WeightUpdaterBase):
         return server_weights
 
 
+class DeltaWeightUpdater(WeightUpdaterBase):
+    """A weight updater that only sends what changed since the last update to the workers.
+
+    :class:`~torchrl.collectors.MultiProcessedWeightUpdater` copies the full set of
+    weights in the memory shared with every worker at each update. Instead, each
+    worker of a collector using this updater holds its own copy of the weights,
+    and the updater broadcasts the difference between the new weights and the
+    weights held by the workers, encoded according to ``mode``:
+
+    - ``"changed"``: only the tensors that have changed are sent;
+    - ``"delta"``: the difference with the weights of the workers is cast to
+      ``delta_dtype`` (e.g., ``torch.bfloat16``) and added to their weights;
+    - ``"topk"``: only the ``topk`` fraction of the entries of the difference with the
+      largest magnitude is sent, as (index, value) pairs.
+
+    Each update is encoded once and put in a queue read by every worker, such that
+    only the encoded payload crosses the process boundary. The workers decode and
+    apply the updates in order between two batches, and check that no version was
+    skipped. Since the server keeps track of the weights the workers hold, the
+    quantization and sparsification errors are not lost: they are sent with the
+    next updates. Every ``full_sync_interval`` updates, the full weights are sent.
+
+    The last sent version can be read with :attr:`version` and the version of the
+    weights of each worker with :attr:`subscriber_versions`. The number of bytes of
+    the payload of the last update (resp. since the creation of the updater) is
+    stored in :attr:`last_bytes_sent` (resp. :attr:`total_bytes_sent`).
+
+    Keyword Args:
+        get_server_weights (Callable[[], TensorDictBase] | None): A callable that retrieves the
+            latest policy weights from the server or another centralized source.
+            If not provided, the weights getter of the collector is used.
+        mode (str, optional): one of ``"changed"``, ``"delta"`` or ``"topk"``.
+            Defaults to ``"changed"``.
+        delta_dtype (torch.dtype, optional): the dtype of the differences sent in
+            ``"delta"`` and ``"topk"`` modes. Defaults to ``None`` (the dtype of the weights).
+        topk (float, optional): the fraction of the entries of each tensor sent in
+            ``"topk"`` mode. Defaults to ``0.01``.
+        full_sync_interval (int, optional): the number of updates after which the full
+            weights are sent. Defaults to ``None`` (never).
+
+    .. note:: This updater is registered in a :class:`~torchrl.collectors.MultiSyncDataCollector`
+        or a :class:`~torchrl.collectors.MultiaSyncDataCollector`, which creates the
+        subscribers of its workers. It is not compatible with ``policy_factory`` or
+        an inference server, and updates all the workers at once.
+
+    Examples:
+        >>> from torchrl.collectors import DeltaWeightUpdater, MultiSyncDataCollector
+        >>> collector = MultiSyncDataCollector(
+        ...     [make_env] * 4,
+        ...     policy,
+        ...     frames_per_batch=200,
+        ...     weight_updater=DeltaWeightUpdater(
+        ...         mode="delta", delta_dtype=torch.bfloat16, full_sync_interval=100
+        ...     ),
+        ... )
+        >>> for data in collector:
+        ...     # train the policy
+        ...     collector.update_policy_weights_()
+        ...     print(collector.weight_updater.last_bytes_sent)
+
+    .. seealso:: :class:`~torchrl.collectors.MultiProcessedWeightUpdater` and
+        :class:`~torchrl.collectors.VersionedWeightUpdater`.
+
+    """
+
+    _MODES = ("changed", "delta", "topk")
+
+    def __init__(
+        self,
+        *,
+        get_server_weights: Callable[[], TensorDictBase] | None = None,
+        mode: str = "changed",
+        delta_dtype: torch.dtype | None = None,
+        topk: float = 0.01,
+        full_sync_interval: int | None = None,
+    ):
+        if mode not in self._MODES:
+            raise ValueError(f"mode must be one of {self._MODES}, got {mode!r}.")
+        if not 0 < topk <= 1:
+            raise ValueError(f"topk must be in (0, 1], got {topk}.")
+        self.weights_getter = get_server_weights
+        self.mode = mode
+        self.delta_dtype = delta_dtype
+        self.topk = topk
+        self.full_sync_interval = full_sync_interval
+        self.last_bytes_sent = 0
+        self.total_bytes_sent = 0
+        self._weights = None
+        self._reference = None
+
+    def register_collector(self, collector):  # noqa
+        super().register_collector(collector)
+        policy_weights = getattr(collector, "_policy_weights_dict", None)
+        if not policy_weights:
+            raise RuntimeError(
+                f"{type(self).__name__} can only be registered in a multiprocessed "
+                "collector with a policy (policy_factory is not supported)."
+            )
+        if self.weights_getter is None:
+            self.weights_getter = getattr(collector, "_get_weights_fn", None)
+        # The weights of the collector policy are the default server weights
+        self._weights = next(iter(policy_weights.values()))
+        self._init_subscribers(self._weights, collector.num_workers)
+
+    def _init_subscribers(self, weights: TensorDictBase, num_workers: int) -> None:
+        # The weights held by the workers, as they will be once they have applied
+        # all the updates that have been sent
+        self._reference = weights.clone()
+        self._initial_weights = weights.clone().share_memory_()
+        self._version = 0
+        self._subscriber_versions = torch.zeros(
+            num_workers, dtype=torch.long
+        ).share_memory_()
+        self._updates = [mp.Queue() for _ in range(num_workers)]
+
+    def _check_registered(self):
+        if self._reference is None:
+            raise RuntimeError(
+                f"{type(self).__name__} must be registered in a collector first."
+            )
+
+    @property
+    def version(self) -> int:
+        """The last version of the weights sent to the workers."""
+        self._check_registered()
+        return self._version
+
+    @property
+    def subscriber_versions(self) -> torch.Tensor:
+        """The version of the weights held by each worker."""
+        self._check_registered()
+        return self._subscriber_versions.clone()
+
+    def subscriber(self, worker_id: int) -> _DeltaWeightSubscriber:
+        """Returns the subscriber of a worker, to be sent to the worker process."""
+        self._check_registered()
+        return _DeltaWeightSubscriber(
+            initial_weights=self._initial_weights,
+            updates=self._updates[worker_id],
+            subscriber_versions=self._subscriber_versions,
+            worker_id=worker_id,
+        )
+
+    def _get_server_weights(self) -> TensorDictBase | None:
+        if self.weights_getter is not None:
+            weights = self.weights_getter()
+            if weights is not None:
+                return weights.data
+        return self._weights
+
+    def _sync_weights_with_worker(
+        self,
+        *,
+        worker_id: int | torch.device | None = None,
+        server_weights: TensorDictBase | dict | None,
+    ) -> None:
+        if worker_id is not None:
+            raise ValueError(
+                f"{type(self).__name__} sends the updates to all the workers at once, "
+                f"worker_ids cannot be passed."
+            )
+        if server_weights is None:
+            return
+        self._check_registered()
+        if not isinstance(server_weights, TensorDictBase):
+            server_weights = TensorDict(server_weights)
+        version = self._version + 1
+        full_sync = (
+            self.full_sync_interval is not None
+            and version % self.full_sync_interval == 0
+        )
+        payload = {}
+        for key, reference in self._reference.items(True, True):
+            src = server_weights.get(key).to(reference.device)
+            if full_sync:
+                update = ("copy", src.clone())
+            else:
+                update = self._encode(reference, src)
+                if update is None:
+                    continue
+            # the workers will apply the same update
+            _apply_update(reference, update)
+            payload[key] = update
+        self._version = version
+        for updates in self._updates:
+            updates.put((version, payload))
+        self.last_bytes_sent = sum(
+            _nbytes(tensor) for update in payload.values() for tensor in update[1:]
+        )
+        self.total_bytes_sent += self.last_bytes_sent
+
+    def _encode(self, reference: torch.Tensor, src: torch.Tensor) -> tuple | None:
+        # Encodes the difference between the weights held by the workers and the
+        # new weights, or returns None if there is nothing to send
+        if not reference.is_floating_point() or self.mode == "changed":
+            if torch.equal(reference, src):
+                return
+            return ("copy", src.clone())
+        delta = src - reference
+        dtype = self.delta_dtype if self.delta_dtype is not None else reference.dtype
+        if self.mode == "delta":
+            if not delta.any():
+                return
+            return ("add", delta.to(dtype))
+        delta = delta.view(-1)
+        k = max(1, int(self.topk * delta.numel()))
+        index = delta.abs().topk(k, sorted=False).indices
+        values = delta[index]
+        nonzero = values != 0
+        if not nonzero.all():
+            index = index[nonzero]
+            values = values[nonzero]
+        if not index.numel():
+            return
+        if delta.numel() <= torch.iinfo(torch.int32).max:
+            index = index.to(torch.int32)
+        return ("index_add", index, values.to(dtype))
+
+
+def _apply_update(dest: torch.Tensor, update: tuple) -> None:
+    # Decodes an update of a DeltaWeightUpdater in dest
+    kind, *tensors = update
+    if kind == "copy":
+        dest.copy_(tensors[0])
+    elif kind == "add":
+        dest.add_(tensors[0].to(dest.dtype))
+    else:
+        index, values = tensors
+        dest.view(-1).index_add_(0, index.long(), values.to(dest.dtype))
+
+
+def _nbytes(tensor: torch.Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+class _DeltaWeightSubscriber:
+    """The worker end of a :class:`DeltaWeightUpdater`."""
+
+    def __init__(
+        self,
+        *,
+        initial_weights: TensorDictBase,
+        updates: mp.Queue,
+        subscriber_versions: torch.Tensor,
+        worker_id: int,
+    ):
+        self.initial_weights = initial_weights
+        self.updates = updates
+        self.subscriber_versions = subscriber_versions
+        self.worker_id = worker_id
+
+    def init_weights(self) -> TensorDictBase:
+        """Returns a copy of the weights the updates are applied to."""
+        return self.initial_weights.clone()
+
+    @property
+    def current_version(self) -> int:
+        """The version of the weights held by the worker."""
+        return int(self.subscriber_versions[self.worker_id])
+
+    def pull(self, weights: TensorDictBase) -> bool:
+        """Applies the updates received since the last call to ``weights``.
+
+        Returns ``True`` if the weights have been updated.
+        """
+        updated = False
+        while True:
+            try:
+                version, payload = self.updates.get_nowait()
+            except queue.Empty:
+                return updated
+            if version != self.current_version + 1:
+                raise RuntimeError(
+                    f"Worker {self.worker_id} received version {version} of the "
+                    f"weights while holding version {self.current_version}."
+                )
+            for key, update in payload.items():
+                _apply_update(weights.get(key), update)
+            self.subscriber_versions[self.worker_id] = version
+            updated = True
+
+    def is_stale(self) -> bool:
+        """Whether the data collected with the current weights must be dropped."""
+        return False
+
+
+class VersionedWeightUpdater(WeightUpdaterBase):
+    """A publish/subscribe weight updater with versioned, non-blocking weight publication.
+
+    With :class:`~torchrl.collectors.MultiProcessedWeightUpdater`, the weights of the
+    workers are updated in place while they may be collecting data, and the
+    collected data does not tell which weights produced it. Instead, this updater
+    publishes the weights in a double-buffered shared-memory slot along with a
+    version counter:
+
+    - the learner writes the new weights in the buffer that is not currently
+      published, then publishes it by incrementing the version. Publishing never
+      waits for the workers;
+    - each worker holds its own copy of the weights and copies the latest
+      published version between batches. The read is validated against the
+      version of the buffer, and retried if the buffer was overwritten during the
+      copy (as with a seqlock);
+    - each collected batch carries a ``("collector", "policy_version")`` entry with
+      the version of the weights that produced it.
+
+    The version of the weights of each worker can be read with
+    :attr:`subscriber_versions` and the last published version with
+    :attr:`version`.
+
+    Keyword Args:
+        get_server_weights (Callable[[], TensorDictBase] | None): A callable that retrieves the
+            latest policy weights from the server or another centralized source.
+            If not provided, the weights getter of the collector is used, or the
+            weights of the collector policy.
+        max_staleness (int, optional): the maximum number of versions a batch can be
+            behind the last published version when it is sent by a worker.
+            Defaults to ``None`` (no limit).
+        staleness_policy (str, optional): what to do when ``max_staleness`` is exceeded.
+            With ``"drop"``, the workers discard the batches collected with weights
+            that are too old and collect new ones with the latest weights (the number
+            of dropped batches can be read with :attr:`num_dropped`). With
+            ``"throttle"``, the publication of a new version waits until every worker
+            has picked up a version that is at most ``max_staleness`` versions older.
+            Defaults to ``"drop"``.
+
+    .. note:: This updater is registered in a :class:`~torchrl.collectors.MultiSyncDataCollector`
+        or a :class:`~torchrl.collectors.MultiaSyncDataCollector`, which creates the
+        subscribers of its workers. It is not compatible with ``policy_factory`` or
+        an inference server.
+
+    Examples:
+        >>> from torchrl.collectors import MultiaSyncDataCollector, VersionedWeightUpdater
+        >>> collector = MultiaSyncDataCollector(
+        ...     [make_env] * 4,
+        ...     policy,
+        ...     frames_per_batch=200,
+        ...     weight_updater=VersionedWeightUpdater(max_staleness=2),
+        ... )
+        >>> for data in collector:
+        ...     print(data["collector", "policy_version"].unique())
+        ...     # train the policy
+        ...     collector.update_policy_weights_()
+
+    """
+
+    _STALENESS_POLICIES = ("drop", "throttle")
+    _THROTTLE_TIMEOUT = 60.0
+
+    def __init__(
+        self,
+        *,
+        get_server_weights: Callable[[], TensorDictBase] | None = None,
+        max_staleness: int | None = None,
+        staleness_policy: str = "drop",
+    ):
+        if staleness_policy not in self._STALENESS_POLICIES:
+            raise ValueError(
+                f"staleness_policy must be one of {self._STALENESS_POLICIES}, "
+                f"got {staleness_policy!r}."
+            )
+        if max_staleness is not None and max_staleness < 0:
+            raise ValueError(
+                f"max_staleness must be a non-negative integer, got {max_staleness}."
+            )
+        self.weights_getter = get_server_weights
+        self.max_staleness = max_staleness
+        self.staleness_policy = staleness_policy
+        self._weights = None
+        self._buffers = None
+
+    def register_collector(self, collector):  # noqa
+        super().register_collector(collector)
+        policy_weights = getattr(collector, "_policy_weights_dict", None)
+        if not policy_weights:
+            raise RuntimeError(
+                f"{type(self).__name__} can only be registered in a multiprocessed "
+                "collector with a policy (policy_factory is not supported)."
+            )
+        if self.weights_getter is None:
+            self.weights_getter = getattr(collector, "_get_weights_fn", None)
+        # The weights of the collector policy are the default server weights
+        self._weights = next(iter(policy_weights.values()))
+        # Both buffers initially hold the weights of version 0
+        self._buffers = self._weights.expand(2).clone().share_memory_()
+        self._buffer_versions = torch.zeros(2, dtype=torch.long).share_memory_()
+        self._version = torch.zeros((), dtype=torch.long).share_memory_()
+        self._subscriber_versions = torch.zeros(
+            collector.num_workers, dtype=torch.long
+        ).share_memory_()
+        self._num_dropped = torch.zeros(
+            collector.num_workers, dtype=torch.long
+        ).share_memory_()
+
+    def _check_registered(self):
+        if self._buffers is None:
+            raise RuntimeError(
+                f"{type(self).__name__} must be registered in a collector first."
+            )
+
+    @property
+    def version(self) -> int:
+        """The last published version of the weights."""
+        self._check_registered()
+        return int(self._version)
+
+    @property
+    def subscriber_versions(self) -> torch.Tensor:
+        """The version of the weights held by each worker."""
+        self._check_registered()
+        return self._subscriber_versions.clone()
+
+    @property
+    def num_dropped(self) -> torch.Tensor:
+        """The number of batches dropped by each worker because of their staleness."""
+        self._check_registered()
+        return self._num_dropped.clone()
+
+    def subscriber(self, worker_id: int) -> _WeightSubscriber:
+        """Returns the subscriber of a worker, to be sent to the worker process."""
+        self._check_registered()
+        return _WeightSubscriber(
+            buffers=self._buffers,
+            buffer_versions=self._buffer_versions,
+            version=self._version,
+            subscriber_versions=self._subscriber_versions,
+            num_dropped=self._num_dropped,
+            worker_id=worker_id,
+            max_staleness=self.max_staleness
+            if self.staleness_policy == "drop"
+            else None,
+        )
+
+    def _get_server_weights(self) -> TensorDictBase | None:
+        if self.weights_getter is not None:
+            weights = self.weights_getter()
+            if weights is not None:
+                return weights.data
+        return self._weights
+
+    def _sync_weights_with_worker(
+        self,
+        *,
+        worker_id: int | torch.device | None = None,
+        server_weights: TensorDictBase | dict | None,
+    ) -> None:
+        # The weights are published once for all the workers
+        if server_weights is None:
+            return
+        self._check_registered()
+        if not isinstance(server_weights, TensorDictBase):
+            server_weights = TensorDict(server_weights)
+        version = int(self._version) + 1
+        if self.staleness_policy == "throttle" and self.max_staleness is not None:
+            self._wait_for_subscribers(version - self.max_staleness)
+        # Write in the buffer that is not published, then publish it
+        slot = version % 2
+        self._buffer_versions[slot] = -1
+        self._buffers[slot].update_(server_weights)
+        self._buffer_versions[slot] = version
+        self._version.fill_(version)
+
+    def _wait_for_subscribers(self, min_version: int) -> None:
+        deadline = time.monotonic() + self._THROTTLE_TIMEOUT
+        while (self._subscriber_versions < min_version).any():
+            if time.monotonic() > deadline:
+                raise RuntimeError(
+                    f"The workers did not pick up version {min_version} of the weights "
+                    f"within {self._THROTTLE_TIMEOUT} seconds "
+                    f"(current versions: {self._subscriber_versions.tolist()})."
+                )
+            time.sleep(1e-3)
+
+
+class _WeightSubscriber:
+    """The worker end of a :class:`VersionedWeightUpdater`."""
+
+    def __init__(
+        self,
+        *,
+        buffers: TensorDictBase,
+        buffer_versions: torch.Tensor,
+        version: torch.Tensor,
+        subscriber_versions: torch.Tensor,
+        num_dropped: torch.Tensor,
+        worker_id: int,
+        max_staleness: int | None,
+    ):
+        self.buffers = buffers
+        self.buffer_versions = buffer_versions
+        self.version = version
+        self.subscriber_versions = subscriber_versions
+        self.num_dropped = num_dropped
+        self.worker_id = worker_id
+        self.max_staleness = max_staleness
+
+    def init_weights(self) -> TensorDictBase:
+        """Returns a copy of the weights of the worker before any update."""
+        # No new version can be published before the workers are instantiated,
+        # hence the first buffer holds the current weights.
+        return self.buffers[0].clone()
+
+    @property
+    def current_version(self) -> int:
+        """The version of the weights held by the worker."""
+        return int(self.subscriber_versions[self.worker_id])
+
+    def pull(self, weights: TensorDictBase) -> bool:
+        """Copies the latest published weights in ``weights`` if they are newer than the current ones.
+
+        Returns ``True`` if the weights have been updated.
+        """
+        while True:
+            version = int(self.version)
+            if version == self.current_version:
+                return False
+            slot = version % 2
+            if int(self.buffer_versions[slot]) != version:
+                # a newer version is being written in that buffer
+                continue
+            weights.update_(self.buffers[slot])
+            # the copy is only valid if the buffer was not overwritten meanwhile
+            if int(self.buffer_versions[slot]) == version:
+                break
+        self.subscriber_versions[self.worker_id] = version
+        return True
+
+    def is_stale(self) -> bool:
+        """Whether the data collected with the current weights must be dropped."""
+        if self.max_staleness is None:
+            return False
+        if int(self.version) - self.current_version > self.max_staleness:
+            self.num_dropped[self.worker_id] += 1
+            return True
+        return False
+
+
 class RemoteModuleWeightUpdater(WeightUpdaterBase):
     """A weight updater for remote nn.Modules that requires explicit weight passing.
 
@@ -5,6 +5,7 @@
 
 #pragma once
 
+#include <ATen/Parallel.h>
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <torch/extension.h>
@@ -23,6 +24,10 @@ namespace py = pybind11;
 
 namespace torchrl {
 
+// Minimum number of elements processed by a single thread in the batched
+// (torch::Tensor) code paths. Smaller batches run on the calling thread.
+constexpr int64_t kSegmentTreeGrainSize = 1024;
+
 // SegmentTree is a tree data structure to maintain statistics of intervals.
 // https://en.wikipedia.org/wiki/Segment_tree
 // Here is the implementaion of non-recursive SegmentTree for single point
@@ -74,7 +79,8 @@ class SegmentTree {
     const int64_t n = index_contiguous.numel();
     torch::Tensor value =
         torch::empty_like(index_contiguous, utils::TorchDataType<T>::value);
-    BatchAtImpl(n, index_contiguous.data_ptr<int64_t>(), value.data_ptr<T>());
+    ParallelBatchAtImpl(n, index_contiguous.data_ptr<int64_t>(),
+                        value.data_ptr<T>());
     return value;
   }
 
@@ -119,7 +125,8 @@ class SegmentTree {
     assert(index.dtype() == torch::kInt64);
     const torch::Tensor index_contiguous = index.contiguous();
     const int64_t n = index_contiguous.numel();
-    BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(), value);
+    ParallelBatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(), &value,
+                            /*broadcast=*/true);
   }
 
   void Update(const torch::Tensor& index, const torch::Tensor& value) {
@@ -129,13 +136,9 @@ class SegmentTree {
     const torch::Tensor index_contiguous = index.contiguous();
     const torch::Tensor value_contiguous = value.contiguous();
     const int64_t n = index_contiguous.numel();
-    if (value_contiguous.numel() == 1) {
-      BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(),
-                      *(value_contiguous.data_ptr<T>()));
-    } else {
-      BatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(),
-                      value_contiguous.data_ptr<T>());
-    }
+    ParallelBatchUpdateImpl(n, index_contiguous.data_ptr<int64_t>(),
+                            value_contiguous.data_ptr<T>(),
+                            /*broadcast=*/value_contiguous.numel() == 1);
   }
 
   // Reduce the range of [l, r) by Operator.
@@ -186,8 +189,11 @@ class SegmentTree {
     torch::Tensor ret =
         torch::empty_like(l_contiguous, utils::TorchDataType<T>::value);
     const int64_t n = l_contiguous.numel();
-    BatchQueryImpl(n, l_contiguous.data_ptr<int64_t>(),
-                   r_contiguous.data_ptr<int64_t>(), ret.data_ptr<T>());
+    at::parallel_for(0, n, kSegmentTreeGrainSize, [&](int64_t b, int64_t e) {
+      BatchQueryImpl(e - b, l_contiguous.data_ptr<int64_t>() + b,
+                     r_contiguous.data_ptr<int64_t>() + b,
+                     ret.data_ptr<T>() + b);
+    });
     return ret;
   }
 
@@ -198,21 +204,99 @@ class SegmentTree {
     return ret;
   }
 
+  // Set all the leaves at once and rebuild the tree bottom-up.
+  // Time complexity: O(N)
   void LoadValues(const py::array_t<T>& values) {
     assert(values.size() == size_);
-    std::memcpy(values_.data() + capacity_, values.data(), size_ * sizeof(T));
+    LoadValuesImpl(values.data());
+  }
+
+  void LoadValues(const torch::Tensor& values) {
+    assert(values.dtype() == utils::TorchDataType<T>::value);
+    assert(values.numel() == size_);
+    const torch::Tensor values_contiguous = values.contiguous();
+    LoadValuesImpl(values_contiguous.data_ptr<T>());
+  }
+
+ protected:
+  void LoadValuesImpl(const T* values) {
+    std::memcpy(values_.data() + capacity_, values, size_ * sizeof(T));
     for (int64_t i = capacity_ - 1; i > 0; --i) {
       values_[i] = op_(values_[(i << 1)], values_[(i << 1) | 1]);
     }
   }
 
- protected:
   void BatchAtImpl(int64_t n, const int64_t* index, T* value) const {
     for (int64_t i = 0; i < n; ++i) {
       value[i] = values_[index[i] | capacity_];
     }
   }
 
+  void ParallelBatchAtImpl(int64_t n, const int64_t* index, T* value) const {
+    at::parallel_for(0, n, kSegmentTreeGrainSize, [&](int64_t b, int64_t e) {
+      BatchAtImpl(e - b, index + b, value + b);
+    });
+  }
+
+  // Multithreaded batched update. The tree is split into num_subtrees
+  // disjoint subtrees (a power of two no greater than the number of threads):
+  // each thread writes the leaves falling in its subtrees and refreshes their
+  // ancestors up to the subtree root, then the num_subtrees - 1 nodes above
+  // the subtree roots are refreshed level by level. Leaves of a subtree are
+  // written in the input order, so duplicated indices keep the last value as
+  // the sequential update does.
+  // Time complexity: O(NlogN / num_subtrees + num_subtrees).
+  void ParallelBatchUpdateImpl(int64_t n, const int64_t* index, const T* value,
+                               bool broadcast) {
+    int64_t num_subtrees = 1;
+    if (n >= kSegmentTreeGrainSize) {
+      const int64_t num_threads = at::get_num_threads();
+      while (num_subtrees * 2 <= num_threads && num_subtrees * 2 <= capacity_) {
+        num_subtrees <<= 1;
+      }
+    }
+    if (num_subtrees == 1) {
+      if (broadcast) {
+        BatchUpdateImpl(n, index, value[0]);
+      } else {
+        BatchUpdateImpl(n, index, value);
+      }
+      return;
+    }
+
+    // Bucket the positions of the updates by subtree, preserving their order.
+    int64_t shift = 0;
+    while ((capacity_ >> shift) > num_subtrees) {
+      ++shift;
+    }
+    std::vector<int64_t> offsets(num_subtrees + 1, 0);
+    for (int64_t i = 0; i < n; ++i) {
+      ++offsets[(((index[i] | capacity_) >> shift) ^ num_subtrees) + 1];
+    }
+    for (int64_t j = 0; j < num_subtrees; ++j) {
+      offsets[j + 1] += offsets[j];
+    }
+    std::vector<int64_t> order(n);
+    std::vector<int64_t> cursor(offsets.begin(), offsets.end() - 1);
+    for (int64_t i = 0; i < n; ++i) {
+      order[cursor[((index[i] | capacity_) >> shift) ^ num_subtrees]++] = i;
+    }
+
+    at::parallel_for(0, num_subtrees, 1, [&](int64_t b, int64_t e) {
+      for (int64_t j = offsets[b]; j < offsets[e]; ++j) {
+        const int64_t i = order[j];
+        int64_t node = index[i] | capacity_;
+        values_[node] = broadcast ? value[0] : value[i];
+        for (; node >= 2 * num_subtrees; node >>= 1) {
+          values_[node >> 1] = op_(values_[node], values_[node ^ 1]);
+        }
+      }
+    });
+    for (int64_t node = num_subtrees - 1; node > 0; --node) {
+      values_[node] = op_(values_[node << 1], values_[(node << 1) | 1]);
+    }
+  }
+
   void BatchUpdateImpl(int64_t n, const int64_t* index, const T& value) {
     for (int64_t i = 0; i < n; ++i) {
       Update(index[i], value);
@@ -280,8 +364,10 @@ class SumSegmentTree final : public SegmentTree<T, std::plus<T>> {
     const torch::Tensor value_contiguous = value.contiguous();
     torch::Tensor index = torch::empty_like(value_contiguous, torch::kInt64);
     const int64_t n = value_contiguous.numel();
-    BatchScanLowerBoundImpl(n, value_contiguous.data_ptr<T>(),
-                            index.data_ptr<int64_t>());
+    at::parallel_for(0, n, kSegmentTreeGrainSize, [&](int64_t b, int64_t e) {
+      BatchScanLowerBoundImpl(e - b, value_contiguous.data_ptr<T>() + b,
+                              index.data_ptr<int64_t>() + b);
+    });
     return index;
   }
 
@@ -321,13 +407,17 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
            py::overload_cast<int64_t>(&SumSegmentTree<T>::At, py::const_))
       .def("__getitem__", py::overload_cast<const py::array_t<int64_t>&>(
                               &SumSegmentTree<T>::At, py::const_))
-      .def("__getitem__", py::overload_cast<const torch::Tensor&>(
-                              &SumSegmentTree<T>::At, py::const_))
+      .def("__getitem__",
+           py::overload_cast<const torch::Tensor&>(&SumSegmentTree<T>::At,
+                                                   py::const_),
+           py::call_guard<py::gil_scoped_release>())
       .def("at", py::overload_cast<int64_t>(&SumSegmentTree<T>::At, py::const_))
       .def("at", py::overload_cast<const py::array_t<int64_t>&>(
                      &SumSegmentTree<T>::At, py::const_))
-      .def("at", py::overload_cast<const torch::Tensor&>(&SumSegmentTree<T>::At,
-                                                         py::const_))
+      .def("at",
+           py::overload_cast<const torch::Tensor&>(&SumSegmentTree<T>::At,
+                                                   py::const_),
+           py::call_guard<py::gil_scoped_release>())
       .def("__setitem__",
            py::overload_cast<int64_t, const T&>(&SumSegmentTree<T>::Update))
       .def("__setitem__",
@@ -337,11 +427,14 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
           "__setitem__",
           py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
               &SumSegmentTree<T>::Update))
-      .def("__setitem__", py::overload_cast<const torch::Tensor&, const T&>(
-                              &SumSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const torch::Tensor&, const T&>(
+               &SumSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("__setitem__",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &SumSegmentTree<T>::Update))
+               &SumSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("update",
            py::overload_cast<int64_t, const T&>(&SumSegmentTree<T>::Update))
       .def("update", py::overload_cast<const py::array_t<int64_t>&, const T&>(
@@ -350,11 +443,14 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
           "update",
           py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
               &SumSegmentTree<T>::Update))
-      .def("update", py::overload_cast<const torch::Tensor&, const T&>(
-                         &SumSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<const torch::Tensor&, const T&>(
+               &SumSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("update",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &SumSegmentTree<T>::Update))
+               &SumSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("query", py::overload_cast<int64_t, int64_t>(
                         &SumSegmentTree<T>::Query, py::const_))
       .def("query", py::overload_cast<const py::array_t<int64_t>&,
@@ -362,7 +458,8 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
                         &SumSegmentTree<T>::Query, py::const_))
       .def("query",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &SumSegmentTree<T>::Query, py::const_))
+               &SumSegmentTree<T>::Query, py::const_),
+           py::call_guard<py::gil_scoped_release>())
       .def("scan_lower_bound",
            py::overload_cast<const T&>(&SumSegmentTree<T>::ScanLowerBound,
                                        py::const_))
@@ -371,7 +468,14 @@ void DefineSumSegmentTree(const std::string& type, py::module& m) {
                &SumSegmentTree<T>::ScanLowerBound, py::const_))
       .def("scan_lower_bound",
            py::overload_cast<const torch::Tensor&>(
-               &SumSegmentTree<T>::ScanLowerBound, py::const_))
+               &SumSegmentTree<T>::ScanLowerBound, py::const_),
+           py::call_guard<py::gil_scoped_release>())
+      .def("load_leaves", py::overload_cast<const py::array_t<T>&>(
+                              &SumSegmentTree<T>::LoadValues))
+      .def("load_leaves",
+           py::overload_cast<const torch::Tensor&>(
+               &SumSegmentTree<T>::LoadValues),
+           py::call_guard<py::gil_scoped_release>())
       .def(py::pickle(
           [](const SumSegmentTree<T>& s) {
             return py::make_tuple(s.DumpValues());
@@ -400,13 +504,17 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
            py::overload_cast<int64_t>(&MinSegmentTree<T>::At, py::const_))
       .def("__getitem__", py::overload_cast<const py::array_t<int64_t>&>(
                               &MinSegmentTree<T>::At, py::const_))
-      .def("__getitem__", py::overload_cast<const torch::Tensor&>(
-                              &MinSegmentTree<T>::At, py::const_))
+      .def("__getitem__",
+           py::overload_cast<const torch::Tensor&>(&MinSegmentTree<T>::At,
+                                                   py::const_),
+           py::call_guard<py::gil_scoped_release>())
       .def("at", py::overload_cast<int64_t>(&MinSegmentTree<T>::At, py::const_))
       .def("at", py::overload_cast<const py::array_t<int64_t>&>(
                      &MinSegmentTree<T>::At, py::const_))
-      .def("at", py::overload_cast<const torch::Tensor&>(&MinSegmentTree<T>::At,
-                                                         py::const_))
+      .def("at",
+           py::overload_cast<const torch::Tensor&>(&MinSegmentTree<T>::At,
+                                                   py::const_),
+           py::call_guard<py::gil_scoped_release>())
       .def("__setitem__",
            py::overload_cast<int64_t, const T&>(&MinSegmentTree<T>::Update))
       .def("__setitem__",
@@ -416,11 +524,14 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
           "__setitem__",
           py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
               &MinSegmentTree<T>::Update))
-      .def("__setitem__", py::overload_cast<const torch::Tensor&, const T&>(
-                              &MinSegmentTree<T>::Update))
+      .def("__setitem__",
+           py::overload_cast<const torch::Tensor&, const T&>(
+               &MinSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("__setitem__",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &MinSegmentTree<T>::Update))
+               &MinSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("update",
            py::overload_cast<int64_t, const T&>(&MinSegmentTree<T>::Update))
       .def("update", py::overload_cast<const py::array_t<int64_t>&, const T&>(
@@ -429,11 +540,14 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
           "update",
           py::overload_cast<const py::array_t<int64_t>&, const py::array_t<T>&>(
               &MinSegmentTree<T>::Update))
-      .def("update", py::overload_cast<const torch::Tensor&, const T&>(
-                         &MinSegmentTree<T>::Update))
+      .def("update",
+           py::overload_cast<const torch::Tensor&, const T&>(
+               &MinSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("update",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &MinSegmentTree<T>::Update))
+               &MinSegmentTree<T>::Update),
+           py::call_guard<py::gil_scoped_release>())
       .def("query", py::overload_cast<int64_t, int64_t>(
                         &MinSegmentTree<T>::Query, py::const_))
       .def("query", py::overload_cast<const py::array_t<int64_t>&,
@@ -441,7 +555,14 @@ void DefineMinSegmentTree(const std::string& type, py::module& m) {
                         &MinSegmentTree<T>::Query, py::const_))
       .def("query",
            py::overload_cast<const torch::Tensor&, const torch::Tensor&>(
-               &MinSegmentTree<T>::Query, py::const_))
+               &MinSegmentTree<T>::Query, py::const_),
+           py::call_guard<py::gil_scoped_release>())
+      .def("load_leaves", py::overload_cast<const py::array_t<T>&>(
+                              &MinSegmentTree<T>::LoadValues))
+      .def("load_leaves",
+           py::overload_cast<const torch::Tensor&>(
+               &MinSegmentTree<T>::LoadValues),
+           py::call_guard<py::gil_scoped_release>())
       .def(py::pickle(
           [](const MinSegmentTree<T>& s) {
             return py::make_tuple(s.DumpValues());
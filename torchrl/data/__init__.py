@@ -36,10 +36,12 @@ from .replay_buffers import (
     CompressedListStorageCheckpointer,
     Flat2TED,
     FlatStorageCheckpointer,
+    FrameStackStorage,
     H5Combine,
     H5Split,
     H5StorageCheckpointer,
     ImmutableDatasetWriter,
+    IncrementalStorageCheckpointer,
     LazyMemmapStorage,
     LazyStackStorage,
     LazyTensorStorage,
@@ -50,20 +52,26 @@ from .replay_buffers import (
     PrioritizedReplayBuffer,
     PrioritizedSampler,
     PrioritizedSliceSampler,
+    PriorityEvictionWriter,
     RandomSampler,
     RayReplayBuffer,
     RemoteTensorDictReplayBuffer,
     ReplayBuffer,
+    ReplayBufferClient,
     ReplayBufferEnsemble,
+    ReplayBufferServer,
+    ReservoirWriter,
     RoundRobinWriter,
     SamplerEnsemble,
     SamplerWithoutReplacement,
+    ShardedReplayBuffer,
     SliceSampler,
     SliceSamplerWithoutReplacement,
     Storage,
     StorageCheckpointerBase,
     StorageEnsemble,
     StorageEnsembleCheckpointer,
+    StratifiedWriter,
     TED2Flat,
     TED2Nested,
     TensorDictMaxValueWriter,
@@ -72,6 +80,7 @@ from .replay_buffers import (
     TensorDictRoundRobinWriter,
     TensorStorage,
     TensorStorageCheckpointer,
+    TieredMemmapStorage,
     Writer,
     WriterEnsemble,
 )
@@ -129,12 +138,14 @@ __all__ = [
     "DiscreteTensorSpec",
     "Flat2TED",
     "FlatStorageCheckpointer",
+    "FrameStackStorage",
     "H5Combine",
     "H5Split",
     "H5StorageCheckpointer",
     "HashToInt",
     "History",
     "ImmutableDatasetWriter",
+    "IncrementalStorageCheckpointer",
     "LazyMemmapStorage",
     "LazyStackStorage",
     "LazyStackedCompositeSpec",
@@ -158,6 +169,7 @@ __all__ = [
     "PrioritizedReplayBuffer",
     "PrioritizedSampler",
     "PrioritizedSliceSampler",
+    "PriorityEvictionWriter",
     "PromptData",
     "PromptTensorDictTokenizer",
     "QueryModule",
@@ -166,12 +178,16 @@ __all__ = [
     "RayReplayBuffer",
     "RemoteTensorDictReplayBuffer",
     "ReplayBuffer",
+    "ReplayBufferClient",
     "ReplayBufferEnsemble",
+    "ReplayBufferServer",
+    "ReservoirWriter",
     "RewardData",
     "RolloutFromModel",
     "RoundRobinWriter",
     "SamplerEnsemble",
     "SamplerWithoutReplacement",
+    "ShardedReplayBuffer",
     "SipHash",
     "SliceSampler",
     "SliceSamplerWithoutReplacement",
@@ -181,6 +197,7 @@ __all__ = [
     "StorageCheckpointerBase",
     "StorageEnsemble",
     "StorageEnsembleCheckpointer",
+    "StratifiedWriter",
     "TED2Flat",
     "TED2Nested",
     "TensorDictMap",
@@ -192,6 +209,7 @@ __all__ = [
     "TensorMap",
     "TensorSpec",
     "TensorStorage",
+    "TieredMemmapStorage",
     "TensorStorageCheckpointer",
     "TokenizedDatasetLoader",
     "TopKRewardSelector",
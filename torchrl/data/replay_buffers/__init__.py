@@ -7,6 +7,7 @@ from .checkpointers import (
     CompressedListStorageCheckpointer,
     FlatStorageCheckpointer,
     H5StorageCheckpointer,
+    IncrementalStorageCheckpointer,
     ListStorageCheckpointer,
     NestedStorageCheckpointer,
     StorageCheckpointerBase,
@@ -19,6 +20,7 @@ from .replay_buffers import (
     RemoteTensorDictReplayBuffer,
     ReplayBuffer,
     ReplayBufferEnsemble,
+    ShardedReplayBuffer,
     TensorDictPrioritizedReplayBuffer,
     TensorDictReplayBuffer,
 )
@@ -32,8 +34,10 @@ from .samplers import (
     SliceSampler,
     SliceSamplerWithoutReplacement,
 )
+from .server import ReplayBufferClient, ReplayBufferServer
 from .storages import (
     CompressedListStorage,
+    FrameStackStorage,
     LazyMemmapStorage,
     LazyStackStorage,
     LazyTensorStorage,
@@ -41,11 +45,15 @@ from .storages import (
     Storage,
     StorageEnsemble,
     TensorStorage,
+    TieredMemmapStorage,
 )
 from .utils import Flat2TED, H5Combine, H5Split, Nested2TED, TED2Flat, TED2Nested
 from .writers import (
     ImmutableDatasetWriter,
+    PriorityEvictionWriter,
+    ReservoirWriter,
     RoundRobinWriter,
+    StratifiedWriter,
     TensorDictMaxValueWriter,
     TensorDictRoundRobinWriter,
     Writer,
@@ -57,6 +65,7 @@ __all__ = [
     "CompressedListStorageCheckpointer",
     "FlatStorageCheckpointer",
     "H5StorageCheckpointer",
+    "IncrementalStorageCheckpointer",
     "ListStorageCheckpointer",
     "NestedStorageCheckpointer",
     "StorageCheckpointerBase",
@@ -66,7 +75,10 @@ __all__ = [
     "PrioritizedReplayBuffer",
     "RemoteTensorDictReplayBuffer",
     "ReplayBuffer",
+    "ReplayBufferClient",
     "ReplayBufferEnsemble",
+    "ReplayBufferServer",
+    "ShardedReplayBuffer",
     "TensorDictPrioritizedReplayBuffer",
     "TensorDictReplayBuffer",
     "PrioritizedSampler",
@@ -77,6 +89,7 @@ __all__ = [
     "SamplerWithoutReplacement",
     "SliceSampler",
     "SliceSamplerWithoutReplacement",
+    "FrameStackStorage",
     "LazyMemmapStorage",
     "LazyStackStorage",
     "LazyTensorStorage",
@@ -84,6 +97,7 @@ __all__ = [
     "Storage",
     "StorageEnsemble",
     "TensorStorage",
+    "TieredMemmapStorage",
     "Flat2TED",
     "H5Combine",
     "H5Split",
@@ -91,7 +105,10 @@ __all__ = [
     "TED2Flat",
     "TED2Nested",
     "ImmutableDatasetWriter",
+    "PriorityEvictionWriter",
+    "ReservoirWriter",
     "RoundRobinWriter",
+    "StratifiedWriter",
     "TensorDictMaxValueWriter",
     "TensorDictRoundRobinWriter",
     "Writer",
@@ -6,8 +6,12 @@ from __future__ import annotations
 
 import abc
 import json
+import os
+import shutil
 import tempfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
 from pathlib import Path
 
 import numpy as np
@@ -408,6 +412,255 @@ class TensorStorageCheckpointer(StorageCheckpointerBase):
         storage._len = _len
 
 
+class IncrementalStorageCheckpointer(TensorStorageCheckpointer):
+    """An append-only checkpointer for large TensorDict-based storages.
+
+    :class:`~torchrl.data.TensorStorageCheckpointer` rewrites the whole storage
+    at every call to :meth:`dumps`. This checkpointer writes a full copy of the
+    storage once (the ``base``) and, on later calls with the same path, only the
+    rows that were modified since the previous dump (a ``delta``). The dirty rows
+    are the rows written through :meth:`~torchrl.data.replay_buffers.TensorStorage.set`
+    in this process (e.g., by the writer or through ``rb[index] = data``) and the
+    rows deduced from the cursor and write count of the
+    :class:`~torchrl.data.replay_buffers.RoundRobinWriter` of the replay buffer
+    the storage is attached to, which also account for the writes made by other
+    processes. The layout on disk is versioned:
+
+    .. code-block::
+
+        path/
+        ├── manifest.json
+        ├── base_000000/
+        ├── delta_000001/
+        └── delta_000002/
+
+    The ``manifest.json`` file is replaced atomically once a version is
+    complete, such that an interrupted dump leaves the previous version readable:
+    a full dump is written in a new ``base`` directory and the previous base and
+    deltas are only deleted once the manifest points to it.
+    The deltas can be merged in the base with :meth:`compact`.
+
+    A full dump is written whenever the dirty rows cannot be deduced: first dump
+    at a given path, storage emptied, every row modified, writers other than
+    :class:`~torchrl.data.replay_buffers.RoundRobinWriter` or pytree-based
+    storages.
+
+    Keyword Args:
+        background (bool, optional): if ``True``, the dirty rows are copied
+            (a copy-on-write snapshot of the storage) and written on disk by a
+            background thread, such that :meth:`dumps` returns as soon as the copy
+            is done. Use :meth:`wait` to block until the pending dump is
+            complete. Full dumps are always synchronous. Defaults to ``False``.
+        max_deltas (int, optional): if provided, the checkpoint is compacted
+            once it holds more than ``max_deltas`` deltas. Defaults to ``None``
+            (never compact automatically).
+
+    Examples:
+        >>> import tempfile
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import (
+        ...     IncrementalStorageCheckpointer,
+        ...     LazyMemmapStorage,
+        ...     TensorDictReplayBuffer,
+        ... )
+        >>> rb = TensorDictReplayBuffer(storage=LazyMemmapStorage(1000))
+        >>> rb.storage.checkpointer = IncrementalStorageCheckpointer()
+        >>> with tempfile.TemporaryDirectory() as tmpdir:
+        ...     rb.extend(TensorDict({"obs": torch.randn(100, 3)}, [100]))
+        ...     rb.dumps(tmpdir)  # writes the base
+        ...     rb.extend(TensorDict({"obs": torch.randn(10, 3)}, [10]))
+        ...     rb.dumps(tmpdir)  # only writes the 10 new rows
+        ...     rb_load = TensorDictReplayBuffer(storage=LazyMemmapStorage(1000))
+        ...     rb_load.storage.checkpointer = IncrementalStorageCheckpointer()
+        ...     rb_load.loads(tmpdir)
+        ...     assert (rb_load[:]["obs"] == rb[:]["obs"]).all()
+
+    """
+
+    _MANIFEST = "manifest.json"
+    _BASE = "base"
+
+    def __init__(self, *, background: bool = False, max_deltas: int | None = None):
+        self.background = background
+        self.max_deltas = max_deltas
+        self._last_path = None
+        self._last_write_count = None
+        self._executor = None
+        self._future = None
+
+    def __getstate__(self):
+        self.wait()
+        state = copy(self.__dict__)
+        state["_executor"] = None
+        state["_future"] = None
+        return state
+
+    def wait(self) -> None:
+        """Blocks until the pending background dump, if any, is complete."""
+        future = self._future
+        if future is not None:
+            self._future = None
+            try:
+                future.result()
+            except BaseException:
+                # the rows of the failed delta are saved with a full dump
+                self._last_path = None
+                raise
+
+    @staticmethod
+    def _writer(storage):
+        from torchrl.data.replay_buffers.writers import RoundRobinWriter
+
+        for entity in storage._attached_entities_iter():
+            writer = getattr(entity, "_writer", None)
+            if isinstance(writer, RoundRobinWriter):
+                return writer
+        return None
+
+    def _dirty_rows(self, storage, path: Path, write_count: int | None):
+        # Returns the rows modified since the last dump at this path, or None
+        # if a full dump is needed.
+        if not is_tensor_collection(storage._storage):
+            return None
+        max_size_along0 = storage._storage.shape[0]
+        dirty_rows = storage._dirty_rows
+        # the rows modified from now on are saved with the next dump
+        storage._dirty_rows = torch.zeros(max_size_along0, dtype=torch.bool)
+        if (
+            dirty_rows is None
+            or write_count is None
+            or self._last_write_count is None
+            or self._last_path != path
+            or not (path / self._MANIFEST).exists()
+        ):
+            return None
+        num_rows = write_count - self._last_write_count
+        if num_rows < 0 or num_rows >= max_size_along0:
+            return None
+        # rows written by the writers of other processes
+        cursor = self._writer(storage)._cursor
+        dirty_rows[
+            torch.arange(cursor - num_rows, cursor, dtype=torch.long) % max_size_along0
+        ] = True
+        if dirty_rows.all():
+            return None
+        return dirty_rows.nonzero().squeeze(-1)
+
+    @classmethod
+    def _read_manifest(cls, path: Path) -> dict:
+        with open(path / cls._MANIFEST) as file:
+            return json.load(file)
+
+    @classmethod
+    def _write_manifest(cls, path: Path, manifest: dict) -> None:
+        tmp_file = path / (cls._MANIFEST + ".tmp")
+        with open(tmp_file, "w") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_file, path / cls._MANIFEST)
+
+    def dumps(self, storage, path):
+        path = Path(path).absolute()
+        path.mkdir(exist_ok=True)
+        self.wait()
+        if not storage.initialized:
+            raise RuntimeError("Cannot save a non-initialized storage.")
+        writer = self._writer(storage)
+        write_count = writer._write_count if writer is not None else None
+        rows = self._dirty_rows(storage, path, write_count)
+        # the next dump at this path is a full one until this one is complete
+        self._last_path = None
+        if rows is None:
+            self._dump_base(storage, path)
+        elif rows.numel():
+            # The rows are gathered in a new tensordict: further writes in the
+            # storage won't affect the snapshot.
+            delta = TensorDict(
+                {"index": rows, "data": storage._storage[rows]}, batch_size=rows.shape
+            )
+            _len = storage._len
+            if self.background:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                self._future = self._executor.submit(
+                    self._dump_delta, delta, _len, path
+                )
+            else:
+                self._dump_delta(delta, _len, path)
+        self._last_path = path
+        self._last_write_count = write_count
+
+    def _dump_base(self, storage, path: Path) -> None:
+        if (path / self._MANIFEST).exists():
+            manifest = self._read_manifest(path)
+            version = manifest["version"] + 1
+            stale = [manifest["base"], *manifest["deltas"]]
+        else:
+            version = 0
+            stale = []
+        # the new base is written next to the current version, which remains
+        # readable until the manifest is replaced
+        base_dir = f"{self._BASE}_{version:06d}"
+        shutil.rmtree(path / base_dir, ignore_errors=True)
+        super().dumps(storage, path / base_dir)
+        self._write_manifest(
+            path,
+            {"version": version, "len": storage._len, "base": base_dir, "deltas": []},
+        )
+        for stale_dir in stale:
+            shutil.rmtree(path / stale_dir, ignore_errors=True)
+
+    def _dump_delta(self, delta, _len: int, path: Path) -> None:
+        manifest = self._read_manifest(path)
+        version = manifest["version"] + 1
+        delta_dir = f"delta_{version:06d}"
+        delta.memmap(path / delta_dir)
+        manifest["version"] = version
+        manifest["len"] = _len
+        manifest["deltas"].append(delta_dir)
+        self._write_manifest(path, manifest)
+        if self.max_deltas is not None and len(manifest["deltas"]) > self.max_deltas:
+            self._compact(path)
+
+    def compact(self, path) -> None:
+        """Merges the deltas saved at ``path`` in the base checkpoint."""
+        self.wait()
+        self._compact(Path(path).absolute())
+
+    def _compact(self, path: Path) -> None:
+        manifest = self._read_manifest(path)
+        if not manifest["deltas"]:
+            return
+        base_dir = path / manifest["base"]
+        base = TensorDict.load_memmap(base_dir)
+        for delta_dir in manifest["deltas"]:
+            delta = TensorDict.load_memmap(path / delta_dir)
+            base[delta["index"]] = delta["data"]
+        with open(base_dir / "storage_metadata.json") as file:
+            metadata = json.load(file)
+        metadata["len"] = manifest["len"]
+        with open(base_dir / "storage_metadata.json", "w") as file:
+            json.dump(metadata, file)
+        deltas = manifest["deltas"]
+        manifest["deltas"] = []
+        self._write_manifest(path, manifest)
+        for delta_dir in deltas:
+            shutil.rmtree(path / delta_dir, ignore_errors=True)
+
+    def loads(self, storage, path):
+        path = Path(path).absolute()
+        self.wait()
+        manifest = self._read_manifest(path)
+        super().loads(storage, path / manifest["base"])
+        for delta_dir in manifest["deltas"]:
+            delta = TensorDict.load_memmap(path / delta_dir)
+            storage._storage[delta["index"]] = delta["data"]
+        storage._len = manifest["len"]
+        # the next dump at this path will be a full one
+        self._last_path = None
+        self._last_write_count = None
+
+
 class FlatStorageCheckpointer(TensorStorageCheckpointer):
     """Saves the storage in a compact form, saving space on the TED format.
 
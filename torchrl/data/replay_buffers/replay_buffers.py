@@ -8,11 +8,14 @@ import collections
 import contextlib
 import json
 import multiprocessing
+import queue
 import textwrap
 import threading
+import traceback
 import warnings
 from collections.abc import Callable, Sequence
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
 from pathlib import Path
 from typing import Any
 
@@ -36,7 +39,7 @@ from tensordict import (
     unravel_key,
 )
 from tensordict.nn.utils import _set_dispatch_td_nn_modules
-from tensordict.utils import expand_as_right, expand_right
+from tensordict.utils import _zip_strict, expand_as_right, expand_right
 from torch import Tensor
 from torch.utils._pytree import tree_map
 
@@ -50,15 +53,20 @@ from torchrl.data.replay_buffers.samplers import (
 from torchrl.data.replay_buffers.storages import (
     _get_default_collate,
     _stack_anything,
+    LazyMemmapStorage,
     ListStorage,
     Storage,
     StorageEnsemble,
+    TensorStorage,
 )
 from torchrl.data.replay_buffers.utils import (
+    _empty_batch,
     _is_int,
+    _pin_memory,
     _reduce,
     _to_numpy,
     _to_torch,
+    _TransferStage,
     INT_CLASSES,
     pin_memory_output,
 )
@@ -96,6 +104,46 @@ class ReplayBuffer:
             samples.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading. Defaults to None (no prefetching).
+        prefetch_workers (int, optional): if provided, prefetched batches are
+            gathered, collated and transformed by this number of worker
+            processes rather than by threads. Indices are still sampled in the
+            main process. Workers write the batches into a ring of
+            ``prefetch + 1`` pre-allocated shared-memory tensordicts, such
+            that at most ``prefetch`` batches are in flight. ``prefetch`` defaults
+            to ``prefetch_workers`` if not provided. Each worker is seeded
+            with the initial seed of ``generator`` (or of the default generator)
+            plus its rank, and batches are dispatched to workers in a round-robin
+            fashion, making random transforms reproducible.
+            The storage must be a :class:`~torchrl.data.replay_buffers.TensorStorage`
+            (e.g., :class:`~torchrl.data.replay_buffers.LazyMemmapStorage`) and
+            the sampled batches must be tensordicts of fixed shape.
+            Workers are started with the ``"spawn"`` method at the first
+            call to :meth:`sample`, and the transform is copied at that time.
+            Defaults to ``None`` (thread-based prefetching).
+
+            .. warning:: the tensordicts returned by :meth:`sample` point to
+                the shared buffers and are overwritten once the next batch is
+                sampled. Clone them if they need to be kept longer.
+
+        transfer_device (torch.device, optional): if provided, sampled batches
+            are written in a rotating set of pre-allocated buffers on this device.
+            With a CUDA device, the samples are gathered directly from the storage
+            into pinned host buffers and copied to the device with non-blocking
+            copies issued on a side stream. The current stream waits on these
+            copies, so the transfer overlaps with the work queued on the previous
+            batch without blocking the host.
+            With ``"cpu"``, the samples are gathered in the host buffers, such that
+            no new tensor is allocated per batch when the buffer has no transform.
+            Direct gathering requires a
+            :class:`~torchrl.data.replay_buffers.TensorStorage` on CPU with a
+            single batch dimension; other storages go through a copy.
+            Incompatible with ``prefetch``. Defaults to ``None`` (no output stage).
+
+            .. warning:: the buffers are reused every ``transfer_buffers`` batches.
+                Batches must be consumed or cloned before then.
+
+        transfer_buffers (int, optional): the number of rotating buffers used
+            with ``transfer_device``. Defaults to ``2``.
         transform (Transform or Callable[[Any], Any], optional): Transform to be executed when
             :meth:`sample` is called.
             To chain transforms use the :class:`~torchrl.envs.Compose` class.
@@ -149,6 +197,8 @@ class ReplayBuffer:
 
             .. warning:: As of now, the generator has no effect on the transforms.
         shared (bool, optional): whether the buffer will be shared using multiprocessing or not.
+            Writing and sampling are serialized by a lock shared across processes,
+            unless the writer is lock-free (see :class:`~torchrl.data.replay_buffers.RoundRobinWriter`).
             Defaults to ``False``.
         compilable (bool, optional): whether the writer is compilable.
             If ``True``, the writer cannot be shared between multiple processes.
@@ -243,6 +293,9 @@ class ReplayBuffer:
         generator: torch.Generator | None = None,
         shared: bool = False,
         compilable: bool | None = None,
+        prefetch_workers: int | None = None,
+        transfer_device: DEVICE_TYPING | None = None,
+        transfer_buffers: int = 2,
     ) -> None:
         self._storage = self._maybe_make_storage(storage, compilable=compilable)
         self._storage.attach(self)
@@ -253,19 +306,37 @@ class ReplayBuffer:
         self._get_collate_fn(collate_fn)
         self._pin_memory = pin_memory
 
+        if prefetch_workers and not prefetch:
+            prefetch = prefetch_workers
         self._prefetch = bool(prefetch)
         self._prefetch_cap = prefetch or 0
         self._prefetch_queue = collections.deque()
-        if self._prefetch_cap:
+        self._prefetch_workers = prefetch_workers or 0
+        self._prefetcher = None
+        self._output_cache = {}
+        if self._prefetch_cap and not self._prefetch_workers:
             self._prefetch_executor = ThreadPoolExecutor(max_workers=self._prefetch_cap)
 
-        if shared and prefetch:
+        if shared and prefetch and not prefetch_workers:
             raise ValueError("Cannot share prefetched replay buffers.")
+        if transfer_device is not None:
+            if prefetch:
+                raise ValueError(
+                    "transfer_device cannot be used with prefetching as the "
+                    "transfer buffers are not thread-safe."
+                )
+            self._transfer_stage = _TransferStage(
+                transfer_device, num_buffers=transfer_buffers
+            )
+        else:
+            self._transfer_stage = None
         self.shared = shared
         self.share(self.shared)
 
         self._replay_lock = threading.RLock()
         self._futures_lock = threading.RLock()
+        self._io_executor = None
+        self._pending_io = None
 
         self._transform = self._maybe_make_transform(transform, transform_factory)
 
@@ -387,7 +458,8 @@ class ReplayBuffer:
 
     def share(self, shared: bool = True):
         self.shared = shared
-        if self.shared:
+        # lock-free writers synchronize with the readers on a per-row basis
+        if self.shared and not getattr(self._writer, "lock_free", False):
             self._write_lock = multiprocessing.Lock()
         else:
             self._write_lock = contextlib.nullcontext()
@@ -573,6 +645,7 @@ class ReplayBuffer:
         return
 
     def state_dict(self) -> dict[str, Any]:
+        self._wait_pending_io()
         return {
             "_storage": self._storage.state_dict(),
             "_sampler": self._sampler.state_dict(),
@@ -585,6 +658,7 @@ class ReplayBuffer:
         }
 
     def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._wait_pending_io()
         self._storage.load_state_dict(state_dict["_storage"])
         self._sampler.load_state_dict(state_dict["_sampler"])
         self._writer.load_state_dict(state_dict["_writer"])
@@ -634,6 +708,10 @@ class ReplayBuffer:
             ...     assert len(rb) == len(rb_load)
 
         """
+        self._wait_pending_io()
+        self._dumps(path)
+
+    def _dumps(self, path):
         path = Path(path).absolute()
         path.mkdir(exist_ok=True)
         self._storage.dumps(path / "storage")
@@ -653,7 +731,33 @@ class ReplayBuffer:
         with open(path / "buffer_metadata.json", "w") as file:
             json.dump({"batch_size": self._batch_size}, file)
 
-    def loads(self, path):
+    def dumps_async(self, path) -> Future:
+        """Saves the replay buffer on disk at the specified path in a background thread.
+
+        The background thread holds the lock of the buffer while saving it:
+        calls to :meth:`add`, :meth:`extend`, :meth:`sample` or
+        :meth:`update_priority` made in the meantime wait for the dump to complete,
+        such that the saved state is consistent. With an
+        :class:`~torchrl.data.IncrementalStorageCheckpointer`, only the rows written
+        since the last dump are saved and the buffer is locked for a shorter time.
+
+        Args:
+            path (Path or str): path where to save the replay buffer.
+
+        Returns:
+            a :class:`~concurrent.futures.Future` that completes when the buffer
+            is saved, and raises the exception encountered while saving it, if any.
+            This exception is also raised by the next call that waits for the dump.
+
+        See :meth:`dumps` for more info.
+
+        """
+        self._wait_pending_io()
+        return self._submit_io(self._dumps, path)
+
+    def loads(
+        self, path, *, lazy: bool = False, in_place: bool = False
+    ) -> Future | None:
         """Loads a replay buffer state at the given path.
 
         The buffer should have matching components and be saved using :meth:`dumps`.
@@ -661,11 +765,48 @@ class ReplayBuffer:
         Args:
             path (Path or str): path where the replay buffer was saved.
 
+        Keyword Args:
+            lazy (bool, optional): if ``True``, only the storage is loaded before
+                this method returns and the state of the sampler, writer and
+                transforms (e.g., the priorities) is loaded in a background thread.
+                Calls to :meth:`add`, :meth:`extend`, :meth:`sample` or
+                :meth:`update_priority` wait for it to be loaded. Defaults to ``False``.
+            in_place (bool, optional): if ``True``, the files of a non-initialized
+                :class:`~torchrl.data.LazyMemmapStorage` are used as is instead of
+                being copied (see :meth:`~torchrl.data.LazyMemmapStorage.loads`):
+                with ``lazy=True``, the buffer can then be sampled as soon as its
+                sampler state is loaded, regardless of the size of the storage.
+                The data written in the buffer afterwards overwrites the saved
+                checkpoint. Defaults to ``False``.
+
+        Returns:
+            if ``lazy=True``, a :class:`~concurrent.futures.Future` that completes
+            when the buffer is fully loaded. The exception encountered while
+            loading the buffer, if any, is also raised by the next call that
+            waits for it.
+
         See :meth:`dumps` for more info.
 
         """
+        self._wait_pending_io()
         path = Path(path).absolute()
-        self._storage.loads(path / "storage")
+        with open(path / "buffer_metadata.json") as file:
+            metadata = json.load(file)
+        if in_place and isinstance(self._storage, LazyMemmapStorage):
+            warnings.warn(
+                f"The storage is mapped on the files saved at {path}: the data "
+                "written in the buffer will overwrite this checkpoint.",
+                category=UserWarning,
+            )
+            self._storage.loads(path / "storage", in_place=True)
+        else:
+            self._storage.loads(path / "storage")
+        self._batch_size = metadata["batch_size"]
+        if lazy:
+            return self._submit_io(self._loads_state, path)
+        self._loads_state(path)
+
+    def _loads_state(self, path: Path):
         self._sampler.loads(path / "sampler")
         self._writer.loads(path / "writer")
         if (path / "rng_state").exists():
@@ -676,9 +817,24 @@ class ReplayBuffer:
         # fall back on state_dict for transforms
         if (path / "transform.t").exists():
             self._transform.load_state_dict(torch.load(path / "transform.t"))
-        with open(path / "buffer_metadata.json") as file:
-            metadata = json.load(file)
-        self._batch_size = metadata["batch_size"]
+
+    def _submit_io(self, fn: Callable, path) -> Future:
+        def locked_fn():
+            with self._replay_lock, self._write_lock:
+                return fn(path)
+
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_io = future = self._io_executor.submit(locked_fn)
+        return future
+
+    def _wait_pending_io(self) -> None:
+        # Waits for the background dump or load to complete. The error raised
+        # in the background, if any, is raised by the first call that waits.
+        future = self._pending_io
+        if future is not None:
+            self._pending_io = None
+            future.result()
 
     def save(self, *args, **kwargs):
         """Alias for :meth:`dumps`."""
@@ -748,12 +904,16 @@ class ReplayBuffer:
         return self._add(data)
 
     def _add(self, data):
+        if self._pending_io is not None:
+            self._wait_pending_io()
         with self._replay_lock, self._write_lock:
             index = self._writer.add(data)
             self._sampler.add(index)
         return index
 
     def _extend(self, data: Sequence, *, update_priority: bool = True) -> torch.Tensor:
+        if self._pending_io is not None:
+            self._wait_pending_io()
         is_comp = is_compiling()
         nc = contextlib.nullcontext()
         with self._replay_lock if not is_comp else nc, self._write_lock if not is_comp else nc:
@@ -814,17 +974,29 @@ class ReplayBuffer:
         if self.dim_extend > 0 and priority.ndim > 1:
             priority = self._transpose(priority).flatten()
             # priority = priority.flatten()
+        if self._pending_io is not None:
+            self._wait_pending_io()
         with self._replay_lock, self._write_lock:
             self._sampler.update_priority(index, priority, storage=self.storage)
 
     @pin_memory_output
-    def _sample(self, batch_size: int) -> tuple[Any, dict]:
+    def _sample(self, batch_size: int, reuse_output: bool = False) -> tuple[Any, dict]:
         is_comp = is_compiling()
         nc = contextlib.nullcontext()
+        transfer_stage = self._transfer_stage
         with self._replay_lock if not is_comp else nc, self._write_lock if not is_comp else nc:
             index, info = self._sampler.sample(self._storage, batch_size)
             info["index"] = index
-            data = self._storage.get(index)
+            if transfer_stage is not None:
+                slot = transfer_stage.acquire()
+                data = transfer_stage.gather(slot, self._storage, index)
+            else:
+                out = self._get_output(index) if reuse_output else None
+                if out is not None:
+                    data = self._storage.get(index, out=out)
+                else:
+                    # storages that cannot gather in place do not accept ``out``
+                    data = self._storage.get(index)
         if not isinstance(index, INT_CLASSES):
             data = self._collate_fn(data)
         if self._transform is not None and len(self._transform):
@@ -833,6 +1005,8 @@ class ReplayBuffer:
                 is_td
             ):
                 data = self._transform(data)
+        if transfer_stage is not None:
+            data = transfer_stage.transfer(slot, data)
 
         return data, info
 
@@ -842,11 +1016,18 @@ class ReplayBuffer:
         Args:
             empty_write_count (bool, optional): Whether to empty the write_count attribute. Defaults to `True`.
         """
+        self._wait_pending_io()
         self._writer._empty(empty_write_count=empty_write_count)
         self._sampler._empty()
         self._storage._empty()
 
-    def sample(self, batch_size: int | None = None, return_info: bool = False) -> Any:
+    def sample(
+        self,
+        batch_size: int | None = None,
+        return_info: bool = False,
+        *,
+        reuse_output: bool = False,
+    ) -> Any:
         """Samples a batch of data from the replay buffer.
 
         Uses Sampler to sample indices, and retrieves them from Storage.
@@ -858,10 +1039,23 @@ class ReplayBuffer:
             return_info (bool): whether to return info. If True, the result
                 is a tuple (data, info). If False, the result is the data.
 
+        Keyword Args:
+            reuse_output (bool, optional): if ``True``, the samples are gathered
+                in an output cached by the buffer for each batch-size (see
+                :meth:`~torchrl.data.replay_buffers.TensorStorage.get`).
+                Without transform, no tensor is allocated when sampling. The
+                content of the batch is overwritten by the next call to :meth:`sample`
+                with the same batch-size: the batch must be consumed or cloned before then.
+                Only storages with a single dimension and tensor or tensordict
+                content support this; other storages allocate a new batch.
+                Incompatible with prefetching. Defaults to ``False``.
+
         Returns:
             A batch of data selected in the replay buffer.
             A tuple containing this batch and info if return_info flag is set to True.
         """
+        if self._pending_io is not None:
+            self._wait_pending_io()
         if (
             batch_size is not None
             and self._batch_size is not None
@@ -883,8 +1077,12 @@ class ReplayBuffer:
                 "Refer to the ReplayBuffer documentation "
                 "for a proper usage of the batch-size arguments."
             )
+        if reuse_output and self._prefetch:
+            raise ValueError("reuse_output cannot be used with prefetching.")
         if not self._prefetch:
-            result = self._sample(batch_size)
+            result = self._sample(batch_size, reuse_output=reuse_output)
+        elif self._prefetch_workers:
+            result = self._sample_from_workers(batch_size)
         else:
             with self._futures_lock:
                 while (
@@ -904,6 +1102,84 @@ class ReplayBuffer:
             return out, info
         return result[0]
 
+    def _get_output(self, index: torch.Tensor | tuple[torch.Tensor, ...]) -> Any:
+        # Returns the cached output of the batches of the size of index, if
+        # the storage supports gathering in place.
+        storage = self._storage
+        if isinstance(index, tuple) and len(index) == 1:
+            index = index[0]
+        source = getattr(storage, "_storage", None)
+        if (
+            not isinstance(storage, TensorStorage)
+            or storage.ndim != 1
+            or not isinstance(index, torch.Tensor)
+            or index.ndim != 1
+            or not isinstance(source, (torch.Tensor, TensorDict))
+        ):
+            return None
+        batch_size = index.numel()
+        source_id, out = self._output_cache.get(batch_size, (None, None))
+        if source_id != id(source):
+            out = _empty_batch(source, batch_size)
+            self._output_cache[batch_size] = (id(source), out)
+        return out
+
+    def _sample_from_workers(self, batch_size: int) -> tuple[Any, dict]:
+        with self._futures_lock:
+            result = None
+            if self._prefetcher is None:
+                # The first batch is gathered locally and is used as a template
+                # for the shared buffers the workers write into.
+                result = self._sample(batch_size)
+                self._prefetcher = self._make_prefetcher(result[0])
+            while (
+                len(self._prefetch_queue)
+                < min(self._sampler._remaining_batches, self._prefetch_cap)
+                and not self._sampler.ran_out
+            ) or not len(self._prefetch_queue):
+                with self._replay_lock, self._write_lock:
+                    index, info = self._sampler.sample(self._storage, batch_size)
+                info["index"] = index
+                slot = self._prefetcher.submit(index)
+                self._prefetch_queue.append((slot, info))
+            if result is not None:
+                return result
+            slot, info = self._prefetch_queue.popleft()
+            data = self._prefetcher.get(slot)
+        if self._pin_memory:
+            data = _pin_memory(data)
+        return data, info
+
+    def _make_prefetcher(self, template: Any) -> _ProcessPrefetcher:
+        if not is_tensor_collection(template):
+            raise RuntimeError(
+                "Prefetching with worker processes requires the sampled data to "
+                f"be a tensordict, got {type(template)} instead."
+            )
+        if not isinstance(self._storage, TensorStorage) or self._storage._compilable:
+            raise RuntimeError(
+                "Prefetching with worker processes requires a non-compilable "
+                f"TensorStorage, got {type(self._storage)} instead."
+            )
+        rng = self._rng if self._rng is not None else torch.default_generator
+        # The workers only read from the storage: we temporarily detach it from
+        # the buffers it is attached to such that these are not sent to the workers.
+        storage = self._storage
+        attached_entities = storage._attached_entities_list
+        storage._attached_entities_list = []
+        try:
+            return _ProcessPrefetcher(
+                storage=storage,
+                collate_fn=self._collate_fn,
+                transform=self._transform,
+                template=template,
+                num_workers=self._prefetch_workers,
+                num_buffers=self._prefetch_cap + 1,
+                seed=rng.initial_seed(),
+            )
+        finally:
+            storage._attached_entities_list = attached_entities
+
     def mark_update(self, index: int | torch.Tensor) -> None:
         self._sampler.mark_update(index, storage=self._storage)
 
@@ -1009,6 +1285,15 @@ class ReplayBuffer:
                 device=self._rng.device,
             )
             state["_rng"] = rng_state
+        state["_output_cache"] = {}
+        if state.get("_prefetcher") is not None:
+            # worker processes and in-flight batches stay with the original buffer
+            state["_prefetcher"] = None
+            state["_prefetch_queue"] = collections.deque()
+        if state.get("_pending_io") is not None:
+            self._wait_pending_io()
+            state["_pending_io"] = None
+        state["_io_executor"] = None
         _replay_lock = state.pop("_replay_lock", None)
         _futures_lock = state.pop("_futures_lock", None)
         if _replay_lock is not None:
@@ -1225,6 +1510,17 @@ class TensorDictReplayBuffer(ReplayBuffer):
             samples.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading. Defaults to None (no prefetching).
+        prefetch_workers (int, optional): if provided, prefetched batches are
+            gathered and transformed by this number of worker processes.
+            See :class:`~torchrl.data.replay_buffers.ReplayBuffer` for more
+            information. Defaults to ``None`` (thread-based prefetching).
+        transfer_device (torch.device, optional): if provided, sampled batches
+            are written in a rotating set of pre-allocated (pinned) buffers and
+            transferred to this device with non-blocking copies.
+            See :class:`~torchrl.data.replay_buffers.ReplayBuffer` for more
+            information. Defaults to ``None``.
+        transfer_buffers (int, optional): the number of rotating buffers used
+            with ``transfer_device``. Defaults to ``2``.
         transform (Transform or Callable[[Any], Any], optional): Transform to be executed when
             :meth:`sample` is called.
             To chain transforms use the :class:`~torchrl.envs.Compose` class.
@@ -1283,6 +1579,8 @@ class TensorDictReplayBuffer(ReplayBuffer):
 
             .. warning:: As of now, the generator has no effect on the transforms.
         shared (bool, optional): whether the buffer will be shared using multiprocessing or not.
+            Writing and sampling are serialized by a lock shared across processes,
+            unless the writer is lock-free (see :class:`~torchrl.data.replay_buffers.RoundRobinWriter`).
             Defaults to ``False``.
         compilable (bool, optional): whether the writer is compilable.
             If ``True``, the writer cannot be shared between multiple processes.
@@ -1503,6 +1801,8 @@ class TensorDictReplayBuffer(ReplayBuffer):
         batch_size: int | None = None,
         return_info: bool = False,
         include_info: bool | None = None,
+        *,
+        reuse_output: bool = False,
     ) -> TensorDictBase:
         """Samples a batch of data from the replay buffer.
 
@@ -1515,6 +1815,12 @@ class TensorDictReplayBuffer(ReplayBuffer):
             return_info (bool): whether to return info. If True, the result
                 is a tuple (data, info). If False, the result is the data.
 
+        Keyword Args:
+            reuse_output (bool, optional): if ``True``, the samples are gathered
+                in an output cached for each batch-size. See
+                :meth:`~torchrl.data.replay_buffers.ReplayBuffer.sample`.
+                Defaults to ``False``.
+
         Returns:
             A tensordict containing a batch of data selected in the replay buffer.
             A tuple containing this tensordict and info if return_info flag is set to True.
@@ -1527,7 +1833,9 @@ class TensorDictReplayBuffer(ReplayBuffer):
                 "output tensordict."
             )
 
-        data, info = super().sample(batch_size, return_info=True)
+        data, info = super().sample(
+            batch_size, return_info=True, reuse_output=reuse_output
+        )
         is_tc = is_tensor_collection(data)
         if is_tc and not is_tensorclass(data) and include_info in (True, None):
             is_locked = data.is_locked
@@ -1558,18 +1866,30 @@ class TensorDictReplayBuffer(ReplayBuffer):
         return data
 
     @pin_memory_output
-    def _sample(self, batch_size: int) -> tuple[Any, dict]:
+    def _sample(self, batch_size: int, reuse_output: bool = False) -> tuple[Any, dict]:
         is_comp = is_compiling()
         nc = contextlib.nullcontext()
+        transfer_stage = self._transfer_stage
         with self._replay_lock if not is_comp else nc, self._write_lock if not is_comp else nc:
             index, info = self._sampler.sample(self._storage, batch_size)
             info["index"] = index
-            data = self._storage.get(index)
+            if transfer_stage is not None:
+                slot = transfer_stage.acquire()
+                data = transfer_stage.gather(slot, self._storage, index)
+            else:
+                out = self._get_output(index) if reuse_output else None
+                if out is not None:
+                    data = self._storage.get(index, out=out)
+                else:
+                    # storages that cannot gather in place do not accept ``out``
+                    data = self._storage.get(index)
         if not isinstance(index, INT_CLASSES):
             data = self._collate_fn(data)
         if self._transform is not None and len(self._transform):
             with data.unlock_(), _set_dispatch_td_nn_modules(True):
                 data = self._transform(data)
+        if transfer_stage is not None:
+            data = transfer_stage.transfer(slot, data)
         return data, info
 
 
@@ -1599,6 +1919,17 @@ class TensorDictPrioritizedReplayBuffer(TensorDictReplayBuffer):
             samples.
         prefetch (int, optional): number of next batches to be prefetched
             using multithreading. Defaults to None (no prefetching).
+        prefetch_workers (int, optional): if provided, prefetched batches are
+            gathered and transformed by this number of worker processes.
+            See :class:`~torchrl.data.replay_buffers.ReplayBuffer` for more
+            information. Defaults to ``None`` (thread-based prefetching).
+        transfer_device (torch.device, optional): if provided, sampled batches
+            are written in a rotating set of pre-allocated (pinned) buffers and
+            transferred to this device with non-blocking copies.
+            See :class:`~torchrl.data.replay_buffers.ReplayBuffer` for more
+            information. Defaults to ``None``.
+        transfer_buffers (int, optional): the number of rotating buffers used
+            with ``transfer_device``. Defaults to ``2``.
         transform (Transform or Callable[[Any], Any], optional): Transform to be executed when
             :meth:`sample` is called.
             To chain transforms use the :class:`~torchrl.envs.Compose` class.
@@ -1660,6 +1991,8 @@ class TensorDictPrioritizedReplayBuffer(TensorDictReplayBuffer):
 
             .. warning:: As of now, the generator has no effect on the transforms.
         shared (bool, optional): whether the buffer will be shared using multiprocessing or not.
+            Writing and sampling are serialized by a lock shared across processes,
+            unless the writer is lock-free (see :class:`~torchrl.data.replay_buffers.RoundRobinWriter`).
             Defaults to ``False``.
         compilable (bool, optional): whether the writer is compilable.
             If ``True``, the writer cannot be shared between multiple processes.
@@ -1740,6 +2073,9 @@ class TensorDictPrioritizedReplayBuffer(TensorDictReplayBuffer):
         generator: torch.Generator | None = None,
         shared: bool = False,
         compilable: bool = False,
+        prefetch_workers: int | None = None,
+        transfer_device: DEVICE_TYPING | None = None,
+        transfer_buffers: int = 2,
     ) -> None:
         storage = self._maybe_make_storage(storage, compilable=compilable)
         sampler = PrioritizedSampler(
@@ -1758,6 +2094,9 @@ class TensorDictPrioritizedReplayBuffer(TensorDictReplayBuffer):
             generator=generator,
             shared=shared,
             compilable=compilable,
+            prefetch_workers=prefetch_workers,
+            transfer_device=transfer_device,
+            transfer_buffers=transfer_buffers,
         )
 
 
@@ -1893,6 +2232,8 @@ class ReplayBufferEnsemble(ReplayBuffer):
             .. warning:: As of now, the generator has no effect on the transforms.
 
         shared (bool, optional): whether the buffer will be shared using multiprocessing or not.
+            Writing and sampling are serialized by a lock shared across processes,
+            unless the writer is lock-free (see :class:`~torchrl.data.replay_buffers.RoundRobinWriter`).
             Defaults to ``False``.
 
     Examples:
@@ -2165,3 +2506,508 @@ class ReplayBufferEnsemble(ReplayBuffer):
         writers = textwrap.indent(f"writers={self._writer}", " " * 4)
         samplers = textwrap.indent(f"samplers={self._sampler}", " " * 4)
         return f"ReplayBufferEnsemble(\n{storages}, \n{samplers}, \n{writers}, \nbatch_size={self._batch_size}, \ntransform={self._transform}, \ncollate_fn={self._collate_fn_val})"
+
+
+class ShardedReplayBuffer:
+    """A replay buffer sharded across several independent replay buffers.
+
+    Contrary to :class:`~torchrl.data.ReplayBufferEnsemble`, which mixes
+    heterogeneous buffers, this class spreads a single logical buffer over
+    ``N`` shards to scale writes: each shard has its own storage, writer,
+    sampler and locks, such that concurrent extensions routed to different
+    shards do not contend on a single writer lock.
+
+    Incoming batches are routed to the shards either as a whole in a round-robin
+    fashion, or element-wise by hashing an integer entry of the data (e.g., the
+    trajectory ids, such that each trajectory lives in a single shard).
+    When sampling, the batch is split across the shards proportionally to their
+    size (or to their total priority for prioritized shards), each shard is
+    sampled in parallel and the samples are concatenated. All the shard-level
+    work is executed on a pool of threads.
+
+    Indices are returned as a ``[B, 1 + D]`` integer tensor where the first column
+    is the shard id and the other columns the index within the shard's storage.
+    These indices can be passed to :meth:`update_priority`, which routes each
+    priority to the shard owning the element. Tensordict samples also contain
+    a ``"shard_id"`` entry next to the ``"index"`` of each element within its shard,
+    such that :meth:`update_tensordict_priority` can be used.
+
+    Args:
+        *rbs (ReplayBuffer instances): the shards. They must have the same kind of
+            content and a collate function that returns tensors or tensor collections.
+
+    Keyword Args:
+        batch_size (int, optional): the default batch-size to use during sampling.
+        routing (str, optional): how incoming batches are assigned to shards. One
+            of ``"round_robin"`` (each call to :meth:`extend` writes its whole
+            batch in the next shard) or ``"hash"`` (each element is written in
+            the shard ``data[hash_key] % num_shards``). Defaults to ``"round_robin"``.
+        hash_key (NestedKey, optional): the integer entry used for ``"hash"``
+            routing. Data must be a tensor collection in this case.
+            Defaults to ``("collector", "traj_ids")``.
+        num_threads (int, optional): the number of threads used to extend and
+            sample the shards. Defaults to the number of shards.
+        generator (torch.Generator, optional): a generator used to split the
+            batches across the shards. Defaults to ``None`` (global default generator).
+
+    .. note:: The importance sampling weights returned by prioritized shards are
+      normalized within each shard.
+
+    Examples:
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import LazyTensorStorage, ShardedReplayBuffer, TensorDictReplayBuffer
+        >>> rb = ShardedReplayBuffer(
+        ...     *[TensorDictReplayBuffer(storage=LazyTensorStorage(100)) for _ in range(4)],
+        ...     batch_size=32,
+        ...     routing="hash",
+        ...     hash_key="traj",
+        ... )
+        >>> data = TensorDict({"obs": torch.randn(40, 3), "traj": torch.arange(40) // 10}, [40])
+        >>> index = rb.extend(data)
+        >>> index[:, 0].unique()  # the shard of each trajectory
+        tensor([0, 1, 2, 3])
+        >>> sample = rb.sample()
+        >>> assert (sample["shard_id"] == sample["traj"] % 4).all()
+
+    """
+
+    ROUTINGS = ("round_robin", "hash")
+
+    def __init__(
+        self,
+        *rbs: ReplayBuffer,
+        batch_size: int | None = None,
+        routing: str = "round_robin",
+        hash_key: NestedKey = ("collector", "traj_ids"),
+        num_threads: int | None = None,
+        generator: torch.Generator | None = None,
+    ) -> None:
+        if not rbs:
+            raise ValueError("At least one shard must be passed.")
+        if routing not in self.ROUTINGS:
+            raise ValueError(
+                f"Unknown routing {routing}, expected one of {self.ROUTINGS}."
+            )
+        self._rbs = list(rbs)
+        self._batch_size = batch_size
+        self.routing = routing
+        self.hash_key = hash_key
+        self.num_threads = num_threads if num_threads is not None else len(rbs)
+        self._rng = generator
+        self._next_shard = 0
+        self._routing_lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._rbs)
+
+    @property
+    def shards(self) -> list[ReplayBuffer]:
+        """The replay buffers the data is sharded across."""
+        return self._rbs
+
+    def __getitem__(self, index: int) -> ReplayBuffer:
+        return self._rbs[index]
+
+    def __len__(self) -> int:
+        return sum(len(rb) for rb in self._rbs)
+
+    @property
+    def write_count(self) -> int:
+        """The total number of items written so far in the shards."""
+        return sum(rb.write_count for rb in self._rbs)
+
+    def _map(self, fn, *iterables) -> list:
+        # runs the shard-level work on the thread pool
+        if self.num_threads <= 1:
+            return list(map(fn, *iterables))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        return list(self._executor.map(fn, *iterables))
+
+    @staticmethod
+    def _global_index(shard_id: int, index: torch.Tensor) -> torch.Tensor:
+        index = torch.as_tensor(index).to("cpu", torch.long)
+        if index.ndim < 2:
+            index = index.reshape(-1, 1)
+        return torch.cat([torch.full_like(index[:, :1], shard_id), index], -1)
+
+    def _route(self, data: TensorDictBase) -> torch.Tensor:
+        if not is_tensor_collection(data):
+            raise TypeError(
+                f"Hash routing requires tensor collections, got {type(data)}."
+            )
+        key = data.get(self.hash_key)
+        key = key.reshape(*data.shape[:1], -1)[:, 0]
+        return key.to("cpu", torch.long) % self.num_shards
+
+    def add(self, data: Any) -> torch.Tensor:
+        """Adds a single element to the buffer and returns its ``[1 + D]`` index."""
+        if self.routing == "hash":
+            shard_id = int(self._route(data.unsqueeze(0)))
+        else:
+            with self._routing_lock:
+                shard_id = self._next_shard
+                self._next_shard = (shard_id + 1) % self.num_shards
+        index = self._rbs[shard_id].add(data)
+        return self._global_index(shard_id, index)[0]
+
+    def extend(self, data: Any) -> torch.Tensor:
+        """Extends the buffer with a batch of data and returns the ``[B, 1 + D]`` indices."""
+        if self.routing == "round_robin":
+            with self._routing_lock:
+                shard_id = self._next_shard
+                self._next_shard = (shard_id + 1) % self.num_shards
+            return self._global_index(shard_id, self._rbs[shard_id].extend(data))
+        shard_ids = self._route(data)
+        shards = shard_ids.unique().tolist()
+        positions = [
+            (shard_ids == shard_id).nonzero().squeeze(-1) for shard_id in shards
+        ]
+
+        def extend_shard(shard_id, position):
+            return self._rbs[shard_id].extend(data[position])
+
+        indices = self._map(extend_shard, shards, positions)
+        indices = [
+            self._global_index(shard_id, index)
+            for shard_id, index in zip(shards, indices)
+        ]
+        result = indices[0].new_empty((shard_ids.numel(), indices[0].shape[-1]))
+        for position, index in zip(positions, indices):
+            result[position] = index
+        return result
+
+    def _shard_weights(self) -> torch.Tensor:
+        weights = []
+        for rb in self._rbs:
+            sampler = rb._sampler
+            if isinstance(sampler, PrioritizedSampler) and len(rb):
+                weights.append(float(sampler._sum_tree.query(0, len(rb._storage))))
+            else:
+                weights.append(float(len(rb)))
+        return torch.tensor(weights, dtype=torch.double)
+
+    def sample(self, batch_size: int | None = None, return_info: bool = False) -> Any:
+        """Samples a batch of data from the shards.
+
+        Args:
+            batch_size (int, optional): the size of the batch. Defaults to the
+                batch-size passed to the constructor.
+            return_info (bool): whether to return info. If ``True``, the result
+                is a tuple ``(data, info)``, where ``info["index"]`` contains the
+                ``[B, 1 + D]`` indices of the elements.
+
+        """
+        if batch_size is None:
+            batch_size = self._batch_size
+        if batch_size is None:
+            raise RuntimeError(
+                "batch_size not specified. You can specify the batch_size when "
+                "constructing the replay buffer, or pass it to the sample method."
+            )
+        weights = self._shard_weights()
+        if not weights.sum():
+            raise RuntimeError("Cannot sample from an empty buffer.")
+        counts = torch.bincount(
+            torch.multinomial(
+                weights, batch_size, replacement=True, generator=self._rng
+            ),
+            minlength=self.num_shards,
+        ).tolist()
+        shards = [shard_id for shard_id, count in enumerate(counts) if count]
+
+        def sample_shard(shard_id):
+            return self._rbs[shard_id].sample(counts[shard_id], return_info=True)
+
+        samples = self._map(sample_shard, shards)
+        data = _cat_anything([sample for sample, _ in samples])
+        info = {}
+        for key in samples[0][1]:
+            vals = [shard_info[key] for _, shard_info in samples]
+            if key == "index":
+                vals = [
+                    torch.stack(val, -1) if isinstance(val, tuple) else val
+                    for val in vals
+                ]
+                vals = [
+                    self._global_index(shard_id, val)
+                    for shard_id, val in zip(shards, vals)
+                ]
+                info["index"] = torch.cat(vals)
+                info["shard_id"] = info["index"][:, 0]
+            else:
+                info[key] = _cat_anything(
+                    [
+                        val.reshape(1)
+                        if isinstance(val, torch.Tensor) and not val.ndim
+                        else val
+                        for val in vals
+                    ]
+                )
+        if is_tensor_collection(data) and not is_tensorclass(data):
+            data.set(
+                "shard_id",
+                expand_as_right(info["shard_id"].to(data.device), data),
+            )
+        if return_info:
+            return data, info
+        return data
+
+    def _split_by_shard(self, shard_ids: torch.Tensor):
+        shard_ids = shard_ids.to("cpu", torch.long)
+        shards = shard_ids.unique().tolist()
+        return shards, [(shard_ids == shard_id) for shard_id in shards]
+
+    def update_priority(
+        self, index: torch.Tensor, priority: int | float | torch.Tensor
+    ) -> None:
+        """Updates the priority of the elements at the ``[B, 1 + D]`` indices returned by the buffer."""
+        index = torch.as_tensor(index).reshape(-1, torch.as_tensor(index).shape[-1])
+        priority = torch.as_tensor(priority).reshape(-1)
+        if priority.numel() == 1:
+            priority = priority.expand(index.shape[0])
+        shards, masks = self._split_by_shard(index[:, 0])
+
+        def update_shard(shard_id, mask):
+            local_index = index[mask, 1:]
+            if local_index.shape[-1] == 1:
+                local_index = local_index.squeeze(-1)
+            else:
+                local_index = local_index.unbind(-1)
+            self._rbs[shard_id].update_priority(local_index, priority[mask])
+
+        self._map(update_shard, shards, masks)
+
+    def update_tensordict_priority(self, data: TensorDictBase) -> None:
+        """Updates the priorities of the shards from a tensordict sampled from this buffer."""
+        shards, masks = self._split_by_shard(
+            data.get("shard_id").reshape(*data.shape[:1], -1)[:, 0]
+        )
+
+        def update_shard(shard_id, mask):
+            self._rbs[shard_id].update_tensordict_priority(data[mask])
+
+        self._map(update_shard, shards, masks)
+
+    def empty(self, empty_write_count: bool = True) -> None:
+        """Empties all the shards."""
+        for rb in self._rbs:
+            rb.empty(empty_write_count=empty_write_count)
+
+    def state_dict(self) -> dict[str, Any]:
+        return {
+            "_shards": [rb.state_dict() for rb in self._rbs],
+            "_next_shard": self._next_shard,
+            "_batch_size": self._batch_size,
+        }
+
+    def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        for rb, shard_state_dict in _zip_strict(self._rbs, state_dict["_shards"]):
+            rb.load_state_dict(shard_state_dict)
+        self._next_shard = state_dict["_next_shard"]
+        self._batch_size = state_dict["_batch_size"]
+
+    def dumps(self, path):
+        """Saves each shard in a ``shard_<i>`` sub-directory of ``path``."""
+        path = Path(path).absolute()
+        path.mkdir(exist_ok=True)
+        self._map(
+            lambda shard_id: self._rbs[shard_id].dumps(path / f"shard_{shard_id}"),
+            range(self.num_shards),
+        )
+        with open(path / "buffer_metadata.json", "w") as file:
+            json.dump(
+                {
+                    "num_shards": self.num_shards,
+                    "next_shard": self._next_shard,
+                    "batch_size": self._batch_size,
+                },
+                file,
+            )
+
+    def loads(self, path):
+        """Loads shards saved with :meth:`dumps`."""
+        path = Path(path).absolute()
+        with open(path / "buffer_metadata.json") as file:
+            metadata = json.load(file)
+        if metadata["num_shards"] != self.num_shards:
+            raise RuntimeError(
+                f"Cannot load a buffer with {metadata['num_shards']} shards in a "
+                f"buffer with {self.num_shards} shards."
+            )
+        self._map(
+            lambda shard_id: self._rbs[shard_id].loads(path / f"shard_{shard_id}"),
+            range(self.num_shards),
+        )
+        self._next_shard = metadata["next_shard"]
+        self._batch_size = metadata["batch_size"]
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state["_executor"] = None
+        state["_routing_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        state["_routing_lock"] = threading.Lock()
+        self.__dict__.update(state)
+
+    def __repr__(self):
+        shards = textwrap.indent(
+            ",\n".join(f"{type(rb).__name__}(len={len(rb)})" for rb in self._rbs),
+            " " * 8,
+        )
+        return (
+            f"{self.__class__.__name__}(\n    shards=[\n{shards}],\n    "
+            f"routing={self.routing}, \n    batch_size={self._batch_size})"
+        )
+
+
+def _cat_anything(data):
+    if is_tensor_collection(data[0]) or isinstance(data[0], torch.Tensor):
+        return torch.cat(data)
+    if isinstance(data[0], list):
+        return sum(data, [])
+    return tree_map(
+        lambda *x: torch.cat(x),
+        *data,
+        is_leaf=lambda x: isinstance(x, torch.Tensor) or is_tensor_collection(x),
+    )
+
+
+def _prefetch_worker(
+    worker_id: int,
+    seed: int,
+    storage: TensorStorage,
+    collate_fn: Callable,
+    transform: Transform,
+    buffers: list[TensorDictBase],
+    in_queue: multiprocessing.Queue,
+    out_queue: multiprocessing.Queue,
+) -> None:
+    torch.manual_seed(seed + worker_id)
+    np.random.seed((seed + worker_id) % 2**32)
+    while True:
+        msg = in_queue.get()
+        if msg is None:
+            return
+        slot, index = msg
+        try:
+            index = tree_map(torch.as_tensor, index)
+            data = storage.get(index)
+            if not isinstance(index, INT_CLASSES):
+                data = collate_fn(data)
+            if transform is not None and len(transform):
+                with data.unlock_(), _set_dispatch_td_nn_modules(True):
+                    data = transform(data)
+            buffer = buffers[slot]
+            if data.batch_size != buffer.batch_size:
+                raise RuntimeError(
+                    f"Prefetching with worker processes requires batches of a fixed "
+                    f"shape, got {data.batch_size} but expected {buffer.batch_size}."
+                )
+            buffer.update_(data)
+            out_queue.put((slot, None))
+        except Exception:
+            out_queue.put((slot, traceback.format_exc()))
+
+
+class _ProcessPrefetcher:
+    """Gathers and transforms sampled batches in worker processes.
+
+    Batches are written in a ring of shared-memory tensordicts. A buffer is
+    handed back to the workers once the batch following it has been retrieved.
+    """
+
+    _TIMEOUT = 1.0
+
+    def __init__(
+        self,
+        *,
+        storage: TensorStorage,
+        collate_fn: Callable,
+        transform: Transform,
+        template: TensorDictBase,
+        num_workers: int,
+        num_buffers: int,
+        seed: int,
+    ):
+        # spawn (rather than fork) is required for the CPU storages to be moved
+        # to shared memory when they are sent to the workers
+        ctx = torch.multiprocessing.get_context("spawn")
+        self._buffers = [
+            template.clone().unlock_().share_memory_() for _ in range(num_buffers)
+        ]
+        self._free = collections.deque(range(num_buffers))
+        self._done = {}
+        self._held = None
+        self._count = 0
+        self._out_queue = ctx.Queue()
+        self._in_queues = []
+        self._workers = []
+        for worker_id in range(num_workers):
+            in_queue = ctx.Queue()
+            worker = ctx.Process(
+                target=_prefetch_worker,
+                args=(
+                    worker_id,
+                    seed,
+                    storage,
+                    collate_fn,
+                    transform,
+                    self._buffers,
+                    in_queue,
+                    self._out_queue,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._in_queues.append(in_queue)
+            self._workers.append(worker)
+
+    def submit(self, index: torch.Tensor | tuple[torch.Tensor, ...]) -> int:
+        slot = self._free.popleft()
+        index = tree_map(lambda x: x.cpu().numpy(), index)
+        # Batches are dispatched in a round-robin fashion such that each worker
+        # sees a deterministic sequence of batches.
+        self._in_queues[self._count % len(self._in_queues)].put((slot, index))
+        self._count += 1
+        return slot
+
+    def get(self, slot: int) -> TensorDictBase:
+        while slot not in self._done:
+            try:
+                done_slot, err = self._out_queue.get(timeout=self._TIMEOUT)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    raise RuntimeError("A prefetching worker died unexpectedly.")
+                continue
+            self._done[done_slot] = err
+        err = self._done.pop(slot)
+        if self._held is not None:
+            self._free.append(self._held)
+        self._held = slot
+        if err is not None:
+            raise RuntimeError(
+                f"A prefetching worker failed with the following error:\n{err}"
+            )
+        return self._buffers[slot].copy()
+
+    def shutdown(self) -> None:
+        for in_queue in self._in_queues:
+            in_queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=self._TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+        self._in_queues = []
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
@@ -21,9 +21,15 @@ from tensordict import MemoryMappedTensor, TensorDict
 from tensordict.utils import NestedKey
 from torch.utils._pytree import tree_map
 from torchrl._extension import EXTENSION_WARNING
-from torchrl._utils import _replace_last, logger, RL_WARNINGS
+from torchrl._utils import _replace_last, _STRDTYPE2DTYPE, logger, RL_WARNINGS
 from torchrl.data.replay_buffers.storages import Storage, StorageEnsemble, TensorStorage
-from torchrl.data.replay_buffers.utils import _auto_device, _is_int, unravel_index
+from torchrl.data.replay_buffers.utils import (
+    _auto_device,
+    _is_int,
+    _TensorMinSegmentTree,
+    _TensorSumSegmentTree,
+    unravel_index,
+)
 
 try:
     from torchrl._torchrl import (
@@ -162,6 +168,21 @@ class SamplerWithoutReplacement(Sampler):
             permuted. This enables to iterate over the replay buffer in the
             order the data was collected. Defaults to ``True``.
 
+    Keyword Args:
+        device (torch.device, optional): the device where the permutation of the
+            indices is drawn and kept. Defaults to the device of the storage, such
+            that the indices of a storage living on GPU never go through the host.
+            If the generator of the replay buffer lives on another device, a generator
+            on this device is seeded from it once.
+        chunk_size (int, optional): if provided and smaller than the storage, the
+            storage is split in chunks of ``chunk_size`` consecutive elements and the
+            sampler only keeps the permutation of the current chunk in memory: the
+            order of the chunks is shuffled, then each chunk is permuted when the
+            previous one is exhausted. This bounds the memory footprint of the
+            sampler for huge buffers, at the cost of a sample order that is only
+            shuffled within chunks (each element is still sampled exactly once
+            per epoch). Defaults to ``None`` (a single permutation of the storage).
+
     *Caution*: If the size of the storage changes in between two calls, the samples will be re-shuffled
     (as we can't generally keep track of which samples have been sampled before and which haven't).
 
@@ -174,12 +195,31 @@ class SamplerWithoutReplacement(Sampler):
 
     """
 
-    def __init__(self, drop_last: bool = False, shuffle: bool = True):
+    def __init__(
+        self,
+        drop_last: bool = False,
+        shuffle: bool = True,
+        *,
+        device: torch.device | str | None = None,
+        chunk_size: int | None = None,
+    ):
         self._sample_list = None
+        self._chunk_list = None
+        self._last_chunk_pos = None
         self.len_storage = 0
         self.drop_last = drop_last
         self._ran_out = False
         self.shuffle = shuffle
+        self.device = torch.device(device) if device is not None else None
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}.")
+        self.chunk_size = chunk_size
+        self._device_rng = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_device_rng"] = None
+        return state
 
     def dumps(self, path):
         path = Path(path)
@@ -191,37 +231,108 @@ class SamplerWithoutReplacement(Sampler):
         sd = TensorDict.load_memmap(path).to_dict()
         self.load_state_dict(sd)
 
-    def _get_sample_list(self, storage: Storage, len_storage: int, batch_size: int):
+    def _permutation_device(self, storage: Storage | None):
+        if self.device is not None:
+            return self.device
         if storage is None:
-            device = self._sample_list.device
-        else:
-            device = storage.device if hasattr(storage, "device") else None
+            return self._sample_list.device
+        device = getattr(storage, "device", None)
+        if device == "auto":
+            return None
+        return device
+
+    def _generator(self, device):
+        # The generator of the replay buffer may not live on the device of the
+        # permutation: in that case, a generator is created on this device and
+        # seeded once from the replay buffer generator, such that the permutations
+        # can be drawn without synchronizing with the host.
+        rng = self._rng
+        if rng is None or device is None:
+            return rng
+        device = torch.device(device)
+        if rng.device.type == device.type:
+            return rng
+        cached = self._device_rng
+        if cached is not None and cached[0] is rng and cached[1].device == device:
+            return cached[1]
+        device_rng = torch.Generator(device)
+        device_rng.manual_seed(
+            int(torch.randint(2**62, (), generator=rng, device=rng.device))
+        )
+        self._device_rng = (rng, device_rng)
+        return device_rng
 
+    def _permutation(self, n: int, device) -> torch.Tensor:
         if self.shuffle:
-            _sample_list = torch.randperm(
-                len_storage, device=device, generator=self._rng
-            )
-        else:
-            _sample_list = torch.arange(len_storage, device=device)
-        self._sample_list = _sample_list
+            return torch.randperm(n, device=device, generator=self._generator(device))
+        return torch.arange(n, device=device)
+
+    def _chunk_len(self, chunk: int, len_storage: int) -> int:
+        return min(self.chunk_size, len_storage - chunk * self.chunk_size)
+
+    def _num_remaining(self, len_storage: int) -> int:
+        num_remaining = self._sample_list.numel()
+        if self._chunk_list is not None:
+            num_chunks = -(len_storage // -self.chunk_size)
+            remaining_chunks = self._chunk_list.numel()
+            num_remaining += remaining_chunks * self.chunk_size
+            # the chunks are consumed in order: the last (and possibly shorter)
+            # chunk is still to be sampled if it comes after the consumed ones
+            if self._last_chunk_pos >= num_chunks - remaining_chunks:
+                num_remaining -= num_chunks * self.chunk_size - len_storage
+        return num_remaining
+
+    def _set_remaining_batches(self, len_storage: int, batch_size: int):
+        num_remaining = self._num_remaining(len_storage)
         if self.drop_last:
-            self._remaining_batches = self._sample_list.numel() // batch_size
+            self._remaining_batches = num_remaining // batch_size
         else:
-            self._remaining_batches = -(self._sample_list.numel() // -batch_size)
+            self._remaining_batches = -(num_remaining // -batch_size)
+        return num_remaining
+
+    def _get_sample_list(self, storage: Storage, len_storage: int, batch_size: int):
+        device = self._permutation_device(storage)
+        if self.chunk_size is not None and self.chunk_size < len_storage:
+            # Only the order of the chunks is drawn now, the permutation of each
+            # chunk is drawn when the previous one is exhausted. The order of the
+            # chunks is kept on cpu: reading it does not require a synchronization.
+            num_chunks = -(len_storage // -self.chunk_size)
+            self._chunk_list = self._permutation(num_chunks, None)
+            self._last_chunk_pos = int((self._chunk_list == num_chunks - 1).nonzero())
+            self._sample_list = torch.empty(0, dtype=torch.long, device=device)
+        else:
+            self._chunk_list = None
+            self._last_chunk_pos = None
+            self._sample_list = self._permutation(len_storage, device)
+        self._set_remaining_batches(len_storage, batch_size)
+
+    def _fill_sample_list(self, len_storage: int, batch_size: int):
+        chunk_list = self._chunk_list
+        if chunk_list is None:
+            return
+        sample_list = [self._sample_list]
+        num_samples = self._sample_list.numel()
+        while num_samples < batch_size and chunk_list.numel():
+            chunk, chunk_list = int(chunk_list[0]), chunk_list[1:]
+            chunk_len = self._chunk_len(chunk, len_storage)
+            sample_list.append(
+                self._permutation(chunk_len, self._sample_list.device)
+                + chunk * self.chunk_size
+            )
+            num_samples += chunk_len
+        self._chunk_list = chunk_list
+        if len(sample_list) > 1:
+            self._sample_list = torch.cat(sample_list)
 
     def _single_sample(self, len_storage, batch_size):
+        self._fill_sample_list(len_storage, batch_size)
         index = self._sample_list[:batch_size]
         self._sample_list = self._sample_list[batch_size:]
-        if self.drop_last:
-            self._remaining_batches = self._sample_list.numel() // batch_size
-        else:
-            self._remaining_batches = -(self._sample_list.numel() // -batch_size)
+        num_remaining = self._set_remaining_batches(len_storage, batch_size)
 
         # check if we have enough elements for one more batch, assuming same batch size
         # will be used each time sample is called
-        if self._sample_list.shape[0] == 0 or (
-            self.drop_last and len(self._sample_list) < batch_size
-        ):
+        if num_remaining == 0 or (self.drop_last and num_remaining < batch_size):
             self.ran_out = True
             self._get_sample_list(
                 storage=None, len_storage=len_storage, batch_size=batch_size
@@ -269,6 +380,8 @@ class SamplerWithoutReplacement(Sampler):
 
     def _empty(self):
         self._sample_list = None
+        self._chunk_list = None
+        self._last_chunk_pos = None
         self.len_storage = 0
         self._ran_out = False
 
@@ -276,19 +389,29 @@ class SamplerWithoutReplacement(Sampler):
         return OrderedDict(
             len_storage=self.len_storage,
             _sample_list=self._sample_list,
+            _chunk_list=self._chunk_list,
+            _last_chunk_pos=self._last_chunk_pos,
             drop_last=self.drop_last,
             _ran_out=self._ran_out,
         )
 
     def load_state_dict(self, state_dict: dict[str, Any]) -> None:
         self.len_storage = state_dict["len_storage"]
-        self._sample_list = state_dict["_sample_list"]
+        self._chunk_list = state_dict.get("_chunk_list")
+        self._last_chunk_pos = state_dict.get("_last_chunk_pos")
+        if self._last_chunk_pos is not None:
+            self._last_chunk_pos = int(self._last_chunk_pos)
+        # The sample list is empty between two chunks: the memory-mapped
+        # checkpoints do not keep empty tensors.
+        self._sample_list = state_dict.get("_sample_list")
+        if self._sample_list is None and self._chunk_list is not None:
+            self._sample_list = torch.empty(0, dtype=torch.long, device=self.device)
         self.drop_last = state_dict["drop_last"]
         self._ran_out = state_dict["_ran_out"]
 
     def __repr__(self):
         if self._sample_list is not None:
-            perc = len(self._sample_list) / self.len_storage * 100
+            perc = self._num_remaining(int(self.len_storage)) / self.len_storage * 100
         else:
             perc = 0.0
         return f"{self.__class__.__name__}({perc: 4.4f}% sampled)"
@@ -333,6 +456,18 @@ class PrioritizedSampler(Sampler):
         max_priority_within_buffer (bool, optional): if ``True``, the max-priority
             is tracked within the buffer. When ``False``, the max-priority tracks
             the maximum value since the instantiation of the sampler.
+        backend (str, optional): the implementation of the sum and min segment trees.
+            ``"cpp"`` uses the trees of the TorchRL C++ extension, which live on CPU.
+            ``"torch"`` uses flat tensor trees that live on ``device`` and can be
+            used with :func:`~torch.compile`: sampling and updating the priorities
+            of a buffer with a CUDA storage then never goes through the host
+            (except to track the max-priority when ``max_priority_within_buffer=True``).
+            Both backends return identical values for identical priorities and
+            random numbers (see :meth:`~torchrl.data.ReplayBuffer.set_rng`).
+            Defaults to ``"cpp"``.
+        device (torch.device, optional): the device of the trees when ``backend="torch"``.
+            If ``None``, the trees are moved to the device of the storage as soon
+            as it is known. Defaults to ``None``.
 
     **Parameter Guidelines**:
     - **:math:`\alpha` (alpha)**: Controls how much to prioritize high-error experiences
@@ -407,6 +542,8 @@ class PrioritizedSampler(Sampler):
         dtype: torch.dtype = torch.float,
         reduction: str = "max",
         max_priority_within_buffer: bool = False,
+        backend: str = "cpp",
+        device: torch.device | None = None,
     ) -> None:
         if alpha < 0:
             raise ValueError(
@@ -414,6 +551,10 @@ class PrioritizedSampler(Sampler):
             )
         if beta < 0:
             raise ValueError(f"beta must be greater or equal to 0, got beta={beta}")
+        if backend not in ("cpp", "torch"):
+            raise ValueError(
+                f"backend must be one of 'cpp' or 'torch', got backend={backend}"
+            )
 
         self._max_capacity = max_capacity
         self._alpha = alpha
@@ -422,8 +563,10 @@ class PrioritizedSampler(Sampler):
         self.reduction = reduction
         self.dtype = dtype
         self._max_priority_within_buffer = max_priority_within_buffer
+        self._backend = backend
+        self._device = torch.device(device) if device is not None else None
         self._init()
-        if RL_WARNINGS and SumSegmentTreeFp32 is None:
+        if RL_WARNINGS and backend == "cpp" and SumSegmentTreeFp32 is None:
             logger.warning(EXTENSION_WARNING)
 
     def __repr__(self):
@@ -457,6 +600,23 @@ class PrioritizedSampler(Sampler):
         return super().__getstate__()
 
     def _init(self) -> None:
+        if self.dtype in (torch.float, torch.FloatType, torch.float32):
+            self._tree_dtype = torch.float32
+        elif self.dtype in (torch.double, torch.DoubleTensor, torch.float64):
+            self._tree_dtype = torch.float64
+        else:
+            raise NotImplementedError(
+                f"dtype {self.dtype} not supported by PrioritizedSampler"
+            )
+        if self._backend == "torch":
+            self._sum_tree = _TensorSumSegmentTree(
+                self._max_capacity, dtype=self._tree_dtype, device=self._device
+            )
+            self._min_tree = _TensorMinSegmentTree(
+                self._max_capacity, dtype=self._tree_dtype, device=self._device
+            )
+            self._max_priority = None
+            return
         if SumSegmentTreeFp32 is None:
             raise RuntimeError(
                 "SumSegmentTreeFp32 is not available. See warning above."
@@ -473,18 +633,31 @@ class PrioritizedSampler(Sampler):
             raise RuntimeError(
                 "MinSegmentTreeFp64 is not available. See warning above."
             )
-        if self.dtype in (torch.float, torch.FloatType, torch.float32):
+        if self._tree_dtype == torch.float32:
             self._sum_tree = SumSegmentTreeFp32(self._max_capacity)
             self._min_tree = MinSegmentTreeFp32(self._max_capacity)
-        elif self.dtype in (torch.double, torch.DoubleTensor, torch.float64):
+        else:
             self._sum_tree = SumSegmentTreeFp64(self._max_capacity)
             self._min_tree = MinSegmentTreeFp64(self._max_capacity)
-        else:
-            raise NotImplementedError(
-                f"dtype {self.dtype} not supported by PrioritizedSampler"
-            )
         self._max_priority = None
 
+    @property
+    def _tree_device(self) -> torch.device:
+        if self._backend == "torch":
+            return self._sum_tree.device
+        return torch.device("cpu")
+
+    def _maybe_move_trees(self, storage: Storage | None) -> None:
+        # tensor trees without an explicit device follow the storage device
+        if self._backend != "torch" or self._device is not None or storage is None:
+            return
+        device = getattr(storage, "device", None)
+        if device is None or device == "auto":
+            return
+        self._device = torch.device(device)
+        self._sum_tree.to(self._device)
+        self._min_tree.to(self._device)
+
     def _empty(self) -> None:
         self._init()
 
@@ -540,42 +713,62 @@ class PrioritizedSampler(Sampler):
         mp = self._max_priority[0]
         if mp is None:
             mp = 1
+        elif self._backend == "torch":
+            mp = torch.where(mp == float("-inf"), 1, mp)
         return (mp + self._eps) ** self._alpha
 
     def sample(self, storage: Storage, batch_size: int) -> torch.Tensor:
         if len(storage) == 0:
             raise RuntimeError(_EMPTY_STORAGE_ERROR)
+        self._maybe_move_trees(storage)
         p_sum = self._sum_tree.query(0, len(storage))
         p_min = self._min_tree.query(0, len(storage))
 
-        if p_sum <= 0:
-            raise RuntimeError("non-positive p_sum")
-        if p_min <= 0:
-            raise RuntimeError("non-positive p_min")
-        # For some undefined reason, only np.random works here.
-        # All PT attempts fail, even when subsequently transformed into numpy
-        if self._rng is None:
-            mass = np.random.uniform(0.0, p_sum, size=batch_size)
+        if self._backend == "torch":
+            # Keep everything on device: the checks do not synchronize with the host
+            torch._assert_async(p_sum > 0, "non-positive p_sum")
+            torch._assert_async(p_min > 0, "non-positive p_min")
+            if self._rng is None:
+                mass = torch.rand(batch_size, device=p_sum.device)
+            else:
+                mass = torch.rand(
+                    batch_size, generator=self._rng, device=self._rng.device
+                ).to(p_sum.device)
+            mass = mass * p_sum
         else:
-            mass = torch.rand(batch_size, generator=self._rng) * p_sum
-
-        # mass = torch.zeros(batch_size, dtype=torch.double).uniform_(0.0, p_sum)
-        # mass = torch.rand(batch_size).mul_(p_sum)
+            if p_sum <= 0:
+                raise RuntimeError("non-positive p_sum")
+            if p_min <= 0:
+                raise RuntimeError("non-positive p_min")
+            # For some undefined reason, only np.random works here.
+            # All PT attempts fail, even when subsequently transformed into numpy
+            if self._rng is None:
+                mass = torch.from_numpy(np.random.uniform(0.0, p_sum, size=batch_size))
+            else:
+                mass = torch.rand(batch_size, generator=self._rng) * p_sum
+        # The trees have a batched code path for tensors with a matching dtype:
+        # the whole batch is searched in parallel without holding the GIL.
+        mass = mass.to(self._tree_dtype)
         index = self._sum_tree.scan_lower_bound(mass)
-        index = torch.as_tensor(index)
         if not index.ndim:
             index = index.unsqueeze(0)
         index.clamp_max_(len(storage) - 1)
-        weight = torch.as_tensor(self._sum_tree[index])
-        # get indices where weight is 0
-        zero_weight = weight == 0
-        index = index
-        while zero_weight.any():
-            index = torch.where(zero_weight, index - 1, index)
-            if (index < 0).any():
-                raise RuntimeError("Failed to find a suitable index")
+        if self._backend == "torch":
+            # Rounding errors can land on an element with a null priority: the
+            # last element with a non-null priority before it is picked instead.
+            index = self._sum_tree.last_nonzero(index)
+            torch._assert_async((index >= 0).all(), "Failed to find a suitable index")
+            weight = self._sum_tree[index]
+        else:
             weight = torch.as_tensor(self._sum_tree[index])
+            # get indices where weight is 0
             zero_weight = weight == 0
+            while zero_weight.any():
+                index = torch.where(zero_weight, index - 1, index)
+                if (index < 0).any():
+                    raise RuntimeError("Failed to find a suitable index")
+                weight = torch.as_tensor(self._sum_tree[index])
+                zero_weight = weight == 0
 
         # Importance sampling weight formula:
         #   w_i = (p_i / sum(p) * N) ^ (-beta)
@@ -620,8 +813,10 @@ class PrioritizedSampler(Sampler):
                 ``index.ndim > 2``.
 
         """
-        priority = torch.as_tensor(priority, device=torch.device("cpu")).detach()
-        index = torch.as_tensor(index, dtype=torch.long, device=torch.device("cpu"))
+        self._maybe_move_trees(storage)
+        device = self._tree_device
+        priority = torch.as_tensor(priority, device=device).detach()
+        index = torch.as_tensor(index, dtype=torch.long, device=device)
         # we need to reshape priority if it has more than one element or if it has
         # a different shape than index
         if priority.numel() > 1 and priority.shape != index.shape:
@@ -636,6 +831,8 @@ class PrioritizedSampler(Sampler):
         elif priority.numel() <= 1:
             priority = priority.squeeze()
 
+        if self._backend == "torch":
+            index = index.reshape(-1) if index.ndim < 2 else index
         # MaxValueWriter will set -1 for items in the data that we don't want
         # to update. We therefore have to keep only the non-negative indices.
         if _is_int(index):
@@ -655,23 +852,48 @@ class PrioritizedSampler(Sampler):
                         "Could not retrieve the storage shape. If your storage is not a TensorStorage subclass "
                         "or its shape isn't accessible via the shape attribute, submit an issue on GitHub."
                     )
-                index = torch.as_tensor(np.ravel_multi_index(index.unbind(-1), shape))
+                index = torch.as_tensor(
+                    np.ravel_multi_index(index.cpu().unbind(-1), shape), device=device
+                )
             valid_index = index >= 0
-            if not valid_index.any():
+            if self._backend == "torch":
+                # The trees ignore the negative indices: they are masked
+                # rather than filtered out, which would require a sync.
+                priority = priority.expand(index.shape)
+            elif not valid_index.any():
                 return
-            if not valid_index.all():
+            elif not valid_index.all():
                 index = index[valid_index]
                 if priority.ndim:
                     priority = priority[valid_index]
 
-        max_p, max_p_idx = priority.max(dim=0)
         cur_max_priority, cur_max_priority_index = self._max_priority
-        if cur_max_priority is None or max_p > cur_max_priority:
+        if self._backend == "torch":
+            # A max priority of -inf stands for "no priority seen yet".
+            max_p, max_p_idx = torch.where(valid_index, priority, float("-inf")).max(
+                dim=0
+            )
+            max_p_idx = index[max_p_idx]
+            if cur_max_priority is not None:
+                cur_max_priority = torch.as_tensor(cur_max_priority, device=device)
+                max_p_idx = torch.where(
+                    max_p > cur_max_priority,
+                    max_p_idx,
+                    torch.as_tensor(cur_max_priority_index, device=device),
+                )
+                max_p = torch.maximum(max_p, cur_max_priority)
             cur_max_priority, cur_max_priority_index = self._max_priority = (
                 max_p,
-                index[max_p_idx] if index.ndim else index,
+                max_p_idx,
             )
-        priority = torch.pow(priority + self._eps, self._alpha)
+        else:
+            max_p, max_p_idx = priority.max(dim=0)
+            if cur_max_priority is None or max_p > cur_max_priority:
+                cur_max_priority, cur_max_priority_index = self._max_priority = (
+                    max_p,
+                    index[max_p_idx] if index.ndim else index,
+                )
+        priority = torch.pow(priority + self._eps, self._alpha).to(self._tree_dtype)
         self._sum_tree[index] = priority
         self._min_tree[index] = priority
         if (
@@ -679,8 +901,8 @@ class PrioritizedSampler(Sampler):
             and cur_max_priority_index is not None
             and (index == cur_max_priority_index).any()
         ):
-            maxval, maxidx = torch.tensor(
-                [self._sum_tree[i] for i in range(self._max_capacity)]
+            maxval, maxidx = torch.as_tensor(
+                self._sum_tree[torch.arange(self._max_capacity)]
             ).max(0)
             self._max_priority = (maxval, maxidx)
 
@@ -715,46 +937,50 @@ class PrioritizedSampler(Sampler):
     def dumps(self, path):  # noqa: F811
         path = Path(path).absolute()
         path.mkdir(exist_ok=True)
-        try:
-            mm_st = MemoryMappedTensor.from_filename(
-                shape=(self._max_capacity,),
-                dtype=torch.float64,
-                filename=path / "sumtree.memmap",
-            )
-            mm_mt = MemoryMappedTensor.from_filename(
-                shape=(self._max_capacity,),
-                dtype=torch.float64,
-                filename=path / "mintree.memmap",
-            )
-        except FileNotFoundError:
-            mm_st = MemoryMappedTensor.empty(
-                (self._max_capacity,),
-                dtype=torch.float64,
-                filename=path / "sumtree.memmap",
-            )
-            mm_mt = MemoryMappedTensor.empty(
-                (self._max_capacity,),
-                dtype=torch.float64,
-                filename=path / "mintree.memmap",
-            )
-        mm_st.copy_(
-            torch.as_tensor([self._sum_tree[i] for i in range(self._max_capacity)])
-        )
-        mm_mt.copy_(
-            torch.as_tensor([self._min_tree[i] for i in range(self._max_capacity)])
-        )
+        if self._backend == "torch":
+            # The whole tree is saved, such that it can be mapped as is by loads.
+            tree_format = "nodes"
+            trees = {
+                "sumtree_nodes": self._sum_tree.values,
+                "mintree_nodes": self._min_tree.values,
+            }
+        else:
+            tree_format = "leaves"
+            leaves = torch.arange(self._max_capacity)
+            trees = {
+                "sumtree": torch.as_tensor(self._sum_tree[leaves], dtype=torch.float64),
+                "mintree": torch.as_tensor(self._min_tree[leaves], dtype=torch.float64),
+            }
+        for name, tree in trees.items():
+            try:
+                mm_tree = MemoryMappedTensor.from_filename(
+                    shape=tree.shape,
+                    dtype=tree.dtype,
+                    filename=path / f"{name}.memmap",
+                )
+            except FileNotFoundError:
+                mm_tree = MemoryMappedTensor.empty(
+                    tree.shape,
+                    dtype=tree.dtype,
+                    filename=path / f"{name}.memmap",
+                )
+            mm_tree.copy_(tree)
         with open(path / "sampler_metadata.json", "w") as file:
             json.dump(
-                tree_map(
-                    float,
-                    {
-                        "_alpha": self._alpha,
-                        "_beta": self._beta,
-                        "_eps": self._eps,
-                        "_max_priority": self._max_priority,
-                        "_max_capacity": self._max_capacity,
-                    },
-                ),
+                {
+                    **tree_map(
+                        float,
+                        {
+                            "_alpha": self._alpha,
+                            "_beta": self._beta,
+                            "_eps": self._eps,
+                            "_max_priority": self._max_priority,
+                            "_max_capacity": self._max_capacity,
+                        },
+                    ),
+                    "tree_format": tree_format,
+                    "tree_dtype": str(self._tree_dtype),
+                },
                 file,
             )
 
@@ -782,20 +1008,192 @@ class PrioritizedSampler(Sampler):
             raise RuntimeError(
                 f"max capacity of loaded metadata ({_max_capacity}) differs from self._max_capacity ({self._max_capacity})."
             )
-        mm_st = MemoryMappedTensor.from_filename(
-            shape=(self._max_capacity,),
-            dtype=torch.float64,
-            filename=path / "sumtree.memmap",
-        )
-        mm_mt = MemoryMappedTensor.from_filename(
-            shape=(self._max_capacity,),
-            dtype=torch.float64,
-            filename=path / "mintree.memmap",
+        if metadata.get("tree_format", "leaves") == "nodes":
+            dtype = _STRDTYPE2DTYPE[metadata["tree_dtype"]]
+            num_nodes = 2 * self._sum_tree.capacity
+            sum_nodes, min_nodes = (
+                # Private (copy-on-write) mapping: the restore does not depend on
+                # the size of the buffer and later updates do not affect the files.
+                torch.from_file(
+                    str(path / f"{name}.memmap"),
+                    shared=False,
+                    size=num_nodes,
+                    dtype=dtype,
+                )
+                for name in ("sumtree_nodes", "mintree_nodes")
+            )
+            if self._backend == "torch":
+                device = self._sum_tree.device
+                self._sum_tree.values = sum_nodes.to(device, self._tree_dtype)
+                self._min_tree.values = min_nodes.to(device, self._tree_dtype)
+                return
+            leaves = slice(self._sum_tree.capacity, None)
+            sum_leaves = sum_nodes[leaves][: self._max_capacity]
+            min_leaves = min_nodes[leaves][: self._max_capacity]
+        else:
+            sum_leaves, min_leaves = (
+                MemoryMappedTensor.from_filename(
+                    shape=(self._max_capacity,),
+                    dtype=torch.float64,
+                    filename=path / f"{name}.memmap",
+                )
+                for name in ("sumtree", "mintree")
+            )
+        # The trees are rebuilt bottom-up in a single pass rather than by
+        # updating each leaf.
+        self._sum_tree.load_leaves(sum_leaves.to(self._tree_dtype))
+        self._min_tree.load_leaves(min_leaves.to(self._tree_dtype))
+
+
+def _cursor_to_int(cursor) -> int:
+    if isinstance(cursor, torch.Tensor):
+        cursor = cursor[-1].item()
+    elif isinstance(cursor, range):
+        cursor = cursor[-1]
+    if not _is_int(cursor):
+        raise RuntimeError("cursor should be an integer or a 1d tensor or a range.")
+    return cursor
+
+
+def _slice_index(
+    start: torch.Tensor, seq_length: int | torch.Tensor, storage_length: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # Builds the flattened indices of the slices beginning at ``start`` (a 2d tensor
+    # resulting from nonzero()) with a single arange broadcast against the starts,
+    # without looping over the slices when their lengths differ.
+    # Returns the offset of each slice in the flattened index and the index itself.
+    if start.ndim == 1:
+        start = start.unsqueeze(-1)
+    num_slices = start.shape[0]
+    if isinstance(seq_length, int):
+        steps = torch.arange(seq_length, device=start.device, dtype=start.dtype)
+        offsets = torch.arange(
+            0,
+            num_slices * seq_length,
+            seq_length,
+            device=start.device,
+            dtype=start.dtype,
         )
-        for i, elt in enumerate(mm_st.tolist()):
-            self._sum_tree[i] = elt
-        for i, elt in enumerate(mm_mt.tolist()):
-            self._min_tree[i] = elt
+        index = (start[:, :1] + steps).remainder_(storage_length).unsqueeze(-1)
+        if start.shape[1] > 1:
+            index = torch.cat(
+                [index, start[:, None, 1:].expand(num_slices, seq_length, -1)], -1
+            )
+        return offsets, index.flatten(0, 1)
+    seq_length = seq_length.to(start.dtype)
+    offsets = seq_length.cumsum(0) - seq_length
+    # the total length is needed to allocate the index
+    numel = int(seq_length.sum())
+    slice_idx = torch.repeat_interleave(
+        torch.arange(num_slices, device=start.device),
+        seq_length,
+        output_size=numel,
+    )
+    steps = torch.arange(numel, device=start.device, dtype=start.dtype)
+    index = start[slice_idx]
+    index[:, 0] += steps - offsets[slice_idx]
+    index[:, 0] %= storage_length
+    return offsets, index
+
+
+class _TrajectoryIndex:
+    """Incrementally maintained trajectory boundaries of a 1-dimensional storage.
+
+    The index stores the sorted positions of the natural trajectory ends found in
+    the storage (ie, the ``end_key`` flags or the ``traj_key`` switches). Writes
+    reported by the writer are buffered and read back at the next call to
+    :meth:`get`, which only reads the written rows and their immediate
+    neighbours. The output matches :meth:`SliceSampler._find_start_stop_traj`
+    run over the whole storage.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._stops = None
+        self._len = 0
+        self._max_size = None
+
+    def reset(self) -> None:
+        self._pending = []
+        self._stops = None
+        self._len = 0
+        self._max_size = None
+
+    def write(self, index: int | torch.Tensor) -> None:
+        self._pending.append(torch.as_tensor(index, dtype=torch.long).reshape(-1))
+
+    @staticmethod
+    def supports(storage: Storage) -> bool:
+        return isinstance(storage, TensorStorage) and storage.ndim == 1
+
+    def _read(self, storage: TensorStorage, rows: torch.Tensor, key: NestedKey):
+        # Only the entry of the trajectory signal is read, not the whole rows
+        values = storage._storage.get(key)
+        values = values[rows.to(values.device)]
+        if values.numel() != rows.numel():
+            raise RuntimeError(
+                f"Expected one trajectory signal per storage entry, got a tensor of "
+                f"shape {values.shape} for {rows.numel()} entries."
+            )
+        return values.reshape(-1)
+
+    def _update(self, storage: TensorStorage, key: NestedKey, fetch_traj: bool):
+        length = len(storage)
+        max_size = storage.max_size
+        if self._stops is None or length < self._len or max_size != self._max_size:
+            # First call or the storage was emptied: index everything once
+            self._pending = [torch.arange(length)]
+            self._stops = None
+        self._len = length
+        self._max_size = max_size
+        if not self._pending:
+            return
+        written = torch.cat(self._pending).unique()
+        self._pending = []
+        written = written[written < length]
+        if fetch_traj:
+            # the boundary between a row and its successor changes whenever
+            # either of them is written
+            rows = torch.cat([written, (written - 1) % max_size]).unique()
+            rows = rows[rows < length]
+            succ = (rows + 1) % max_size
+            has_succ = succ < length
+            fetch = torch.cat([rows, succ[has_succ]]).unique()
+            values = self._read(storage, fetch, key)
+            ends = torch.ones(rows.shape, dtype=torch.bool, device=values.device)
+            ends[has_succ.to(values.device)] = (
+                values[torch.searchsorted(fetch, rows[has_succ]).to(values.device)]
+                != values[torch.searchsorted(fetch, succ[has_succ]).to(values.device)]
+            )
+        else:
+            rows = written
+            ends = self._read(storage, rows, key).bool()
+        rows = rows.to(ends.device)
+        stops = self._stops
+        if stops is None:
+            stops = rows[ends]
+        else:
+            stops = stops[~torch.isin(stops, rows)]
+            stops = torch.cat([stops, rows[ends]]).sort().values
+        self._stops = stops
+
+    def get(self, storage: TensorStorage, key: NestedKey, fetch_traj: bool):
+        self._update(storage, key, fetch_traj)
+        length = self._len
+        stops = self._stops
+        if storage._is_full:
+            cursor = getattr(storage, "_last_cursor", None)
+            forced = None if cursor is None else _cursor_to_int(cursor)
+        else:
+            forced = length - 1
+        if forced is not None:
+            stops = torch.cat([stops, stops.new_tensor([forced])]).unique()
+        elif not stops.numel():
+            stops = stops.new_tensor([length - 1])
+        start_idx = (stops.roll(1) + 1) % length
+        lengths = stops - start_idx + 1
+        lengths[lengths <= 0] = lengths[lengths <= 0] + length
+        return start_idx.unsqueeze(-1), stops.unsqueeze(-1), lengths
 
 
 class SliceSampler(Sampler):
@@ -882,6 +1280,21 @@ class SliceSampler(Sampler):
             will be used to retrieve the indices of the trajectory starts. This can significantly
             accelerate the sampling when the buffer content is large.
             Defaults to ``False``.
+        incremental_index (bool, optional): if ``True``, the trajectory start and
+            stop indices are tracked incrementally from the indices reported by the
+            writer at each :meth:`~.extend` or :meth:`~.add` call. Only the written
+            entries (and their neighbours when ``traj_key`` is used) are read
+            from the storage, such that the cost of the trajectory lookup no longer
+            grows with the size of the storage. The whole storage is scanned once
+            on first use, after the buffer is emptied or when it is loaded.
+            Only storages with a single batch dimension are indexed incrementally,
+            others are scanned on every call as usual.
+            Defaults to ``False``.
+
+            .. warning:: like ``cache_values=True``, the index is only kept up to
+                date with the writes made through the buffer that owns the sampler.
+                Writing to the storage directly or through another buffer will
+                produce stale trajectory boundaries.
 
     .. note:: To recover the trajectory splits in the storage,
         :class:`~torchrl.data.replay_buffers.samplers.SliceSampler` will first
@@ -1072,6 +1485,7 @@ class SliceSampler(Sampler):
         compile: bool | dict = False,
         span: bool | int | tuple[bool | int, bool | int] = False,
         use_gpu: torch.device | bool = False,
+        incremental_index: bool = False,
     ):
         self.num_slices = num_slices
         self.slice_len = slice_len
@@ -1082,6 +1496,7 @@ class SliceSampler(Sampler):
         self._fetch_traj = True
         self.strict_length = strict_length
         self._cache = {}
+        self._traj_index = _TrajectoryIndex() if incremental_index else None
         self.use_gpu = bool(use_gpu)
         self._gpu_device = (
             None
@@ -1163,17 +1578,32 @@ class SliceSampler(Sampler):
             )
         state = super().__getstate__()
         state["_cache"] = {}
+        if state.get("_traj_index") is not None:
+            # the index is rebuilt from the storage content on first use
+            state["_traj_index"] = _TrajectoryIndex()
         return state
 
     def extend(self, index: torch.Tensor) -> None:
         super().extend(index)
         if self.cache_values:
             self._cache.clear()
+        self._record_write(index)
 
     def add(self, index: torch.Tensor) -> None:
         super().add(index)
         if self.cache_values:
             self._cache.clear()
+        self._record_write(index)
+
+    def _record_write(self, index) -> None:
+        traj_index = getattr(self, "_traj_index", None)
+        if traj_index is None:
+            return
+        if isinstance(index, tuple):
+            # multidimensional storages are not indexed incrementally
+            traj_index.reset()
+        else:
+            traj_index.write(index)
 
     def __repr__(self):
         return (
@@ -1217,14 +1647,7 @@ class SliceSampler(Sampler):
             # we must have at least one end by traj to individuate trajectories
             # so if no end can be found we set it manually
             if cursor is not None:
-                if isinstance(cursor, torch.Tensor):
-                    cursor = cursor[-1].item()
-                elif isinstance(cursor, range):
-                    cursor = cursor[-1]
-                if not _is_int(cursor):
-                    raise RuntimeError(
-                        "cursor should be an integer or a 1d tensor or a range."
-                    )
+                cursor = _cursor_to_int(cursor)
                 end = torch.index_fill(
                     end,
                     index=torch.tensor(cursor, device=end.device, dtype=torch.long),
@@ -1278,63 +1701,25 @@ class SliceSampler(Sampler):
             return start_idx.to(device), stop_idx.to(device), lengths.to(device)
         return start_idx, stop_idx, lengths
 
-    def _start_to_end(self, st: torch.Tensor, length: int):
-
-        arange = torch.arange(length, device=st.device, dtype=st.dtype)
-        ndims = st.shape[-1] - 1 if st.ndim else 0
-        if ndims:
-            arange = torch.stack([arange] + [torch.zeros_like(arange)] * ndims, -1)
-        else:
-            arange = arange.unsqueeze(-1)
-        if st.shape != arange.shape:
-            # we do this to make sure that we're not broadcasting the start
-            # wrong as a tensor with shape [N] can't be expanded to [N, 1]
-            # without getting an error
-            st = st.expand_as(arange)
-        return arange + st
-
-    def _tensor_slices_from_startend(self, seq_length, start, storage_length):
-        # start is a 2d tensor resulting from nonzero()
-        # seq_length is a 1d tensor indicating the desired length of each sequence
-
-        if isinstance(seq_length, int):
-            arange = torch.arange(seq_length, device=start.device, dtype=start.dtype)
-            ndims = start.shape[-1] - 1 if (start.ndim - 1) else 0
-            if ndims:
-                arange_reshaped = torch.empty(
-                    arange.shape + torch.Size([ndims + 1]),
-                    device=start.device,
-                    dtype=start.dtype,
-                )
-                arange_reshaped[..., 0] = arange
-                arange_reshaped[..., 1:] = 0
-            else:
-                arange_reshaped = arange.unsqueeze(-1)
-            arange_expanded = arange_reshaped.expand(
-                torch.Size([start.shape[0]]) + arange_reshaped.shape
-            )
-            if start.shape != arange_expanded.shape:
-                n_missing_dims = arange_expanded.dim() - start.dim()
-                start_expanded = start[
-                    (slice(None),) + (None,) * n_missing_dims
-                ].expand_as(arange_expanded)
-            result = (start_expanded + arange_expanded).flatten(0, 1)
-
-        else:
-            # when padding is needed
-            result = torch.cat(
-                [
-                    self._start_to_end(_start, _seq_len)
-                    for _start, _seq_len in zip(start, seq_length)
-                ]
-            )
-        result[:, 0] = result[:, 0] % storage_length
-        return result
-
     def _get_stop_and_length(self, storage, fallback=True):
         if self.cache_values and "stop-and-length" in self._cache:
             return self._cache.get("stop-and-length")
 
+        traj_index = getattr(self, "_traj_index", None)
+        if traj_index is not None and traj_index.supports(storage):
+            key = self._used_traj_key if self._fetch_traj else self.end_key
+            try:
+                vals = traj_index.get(storage, key, self._fetch_traj)
+            except KeyError:
+                if fallback:
+                    traj_index.reset()
+                    self._fetch_traj = not self._fetch_traj
+                    return self._get_stop_and_length(storage, fallback=False)
+                raise
+            if self.cache_values:
+                self._cache["stop-and-length"] = vals
+            return vals
+
         if self._fetch_traj:
             # We first try with the traj_key
             try:
@@ -1552,21 +1937,15 @@ class SliceSampler(Sampler):
             * (end_point - start_point)
         ).floor().to(start_idx.dtype) + start_point
 
-        if self.span[0]:
-            out_of_traj = relative_starts < 0
-            if out_of_traj.any():
-                # a negative start means sampling fewer elements
-                seq_length = torch.where(
-                    ~out_of_traj, seq_length, seq_length + relative_starts
-                )
-                relative_starts = torch.where(~out_of_traj, relative_starts, 0)
-        if self.span[1]:
-            out_of_traj = relative_starts + seq_length > lengths[traj_idx]
-            if out_of_traj.any():
-                # a negative start means sampling fewer elements
-                seq_length = torch.minimum(
-                    seq_length, lengths[traj_idx] - relative_starts
-                )
+        if self.span[0] or self.span[1]:
+            # slices overflowing the trajectory are clipped: a negative start
+            # or a stop past the end of the trajectory means sampling fewer elements
+            relative_stops = relative_starts + seq_length
+            if self.span[0]:
+                relative_starts = relative_starts.clamp_min(0)
+            if self.span[1]:
+                relative_stops = torch.minimum(relative_stops, lengths[traj_idx])
+            seq_length = relative_stops - relative_starts
 
         starts = torch.cat(
             [
@@ -1575,7 +1954,7 @@ class SliceSampler(Sampler):
             ],
             1,
         )
-        index = self._tensor_slices_from_startend(seq_length, starts, storage_length)
+        offsets, index = _slice_index(starts, seq_length, storage_length)
         if self.truncated_key is not None:
             truncated_key = self.truncated_key
             done_key = _replace_last(truncated_key, "done")
@@ -1584,10 +1963,7 @@ class SliceSampler(Sampler):
             truncated = torch.zeros(
                 (index.shape[0], 1), dtype=torch.bool, device=index.device
             )
-            if isinstance(seq_length, int):
-                truncated.view(num_slices, -1)[:, -1] = 1
-            else:
-                truncated[seq_length.cumsum(0) - 1] = 1
+            truncated[offsets + seq_length - 1] = 1
             index = index.to(torch.long).unbind(-1)
             st_index = storage[index]
             done = st_index.get(done_key, default=None)
@@ -1623,7 +1999,12 @@ class SliceSampler(Sampler):
         self.__dict__["__used_end_key"] = value
 
     def _empty(self):
-        pass
+        self._reset_traj_index()
+
+    def _reset_traj_index(self):
+        traj_index = getattr(self, "_traj_index", None)
+        if traj_index is not None:
+            traj_index.reset()
 
     def dumps(self, path):
         # no op - cache does not need to be saved
@@ -1631,13 +2012,13 @@ class SliceSampler(Sampler):
 
     def loads(self, path):
         # no op
-        ...
+        self._reset_traj_index()
 
     def state_dict(self) -> dict[str, Any]:
         return {}
 
     def load_state_dict(self, state_dict: dict[str, Any]) -> None:
-        ...
+        self._reset_traj_index()
 
 
 class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
@@ -1702,6 +2083,21 @@ class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
             will be used to retrieve the indices of the trajectory starts. This can significantly
             accelerate the sampling when the buffer content is large.
             Defaults to ``False``.
+        incremental_index (bool, optional): if ``True``, the trajectory start and
+            stop indices are tracked incrementally from the indices reported by the
+            writer at each :meth:`~.extend` or :meth:`~.add` call. Only the written
+            entries (and their neighbours when ``traj_key`` is used) are read
+            from the storage, such that the cost of the trajectory lookup no longer
+            grows with the size of the storage. The whole storage is scanned once
+            on first use, after the buffer is emptied or when it is loaded.
+            Only storages with a single batch dimension are indexed incrementally,
+            others are scanned on every call as usual.
+            Defaults to ``False``.
+
+            .. warning:: like ``cache_values=True``, the index is only kept up to
+                date with the writes made through the buffer that owns the sampler.
+                Writing to the storage directly or through another buffer will
+                produce stale trajectory boundaries.
 
     .. note:: To recover the trajectory splits in the storage,
         :class:`~torchrl.data.replay_buffers.samplers.SliceSamplerWithoutReplacement` will first
@@ -1823,6 +2219,7 @@ class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
         shuffle: bool = True,
         compile: bool | dict = False,
         use_gpu: bool | torch.device = False,
+        incremental_index: bool = False,
     ):
         SliceSampler.__init__(
             self,
@@ -1837,6 +2234,7 @@ class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
             trajectories=trajectories,
             compile=compile,
             use_gpu=use_gpu,
+            incremental_index=incremental_index,
         )
         SamplerWithoutReplacement.__init__(self, drop_last=drop_last, shuffle=shuffle)
 
@@ -1858,6 +2256,7 @@ class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
 
     def _empty(self):
         self._cache = {}
+        self._reset_traj_index()
         SamplerWithoutReplacement._empty(self)
 
     def _storage_len(self, storage):
@@ -1909,6 +2308,7 @@ class SliceSamplerWithoutReplacement(SliceSampler, SamplerWithoutReplacement):
         return SamplerWithoutReplacement.state_dict(self)
 
     def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._reset_traj_index()
         return SamplerWithoutReplacement.load_state_dict(self, state_dict)
 
 
@@ -2043,6 +2443,16 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
             is tracked within the buffer. When ``False``, the max-priority tracks
             the maximum value since the instantiation of the sampler.
             Defaults to ``False``.
+        backend (str, optional): the implementation of the segment trees, ``"cpp"``
+            or ``"torch"``. See :class:`~torchrl.data.replay_buffers.PrioritizedSampler`.
+            Defaults to ``"cpp"``.
+        device (torch.device, optional): the device of the trees when ``backend="torch"``.
+            See :class:`~torchrl.data.replay_buffers.PrioritizedSampler`.
+            Defaults to ``None``.
+        incremental_index (bool, optional): if ``True``, the trajectory boundaries
+            are updated incrementally as data is written rather than recomputed
+            from the whole storage. See :class:`~torchrl.data.replay_buffers.SliceSampler`.
+            Defaults to ``False``.
 
     Examples:
         >>> import torch
@@ -2102,6 +2512,9 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
         compile: bool | dict = False,
         span: bool | int | tuple[bool | int, bool | int] = False,
         max_priority_within_buffer: bool = False,
+        backend: str = "cpp",
+        device: torch.device | None = None,
+        incremental_index: bool = False,
     ):
         SliceSampler.__init__(
             self,
@@ -2116,6 +2529,7 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
             trajectories=trajectories,
             compile=compile,
             span=span,
+            incremental_index=incremental_index,
         )
         PrioritizedSampler.__init__(
             self,
@@ -2126,6 +2540,8 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
             dtype=dtype,
             reduction=reduction,
             max_priority_within_buffer=max_priority_within_buffer,
+            backend=backend,
+            device=device,
         )
         if self.span[0]:
             # Span left is hard to achieve because we need to sample 'negative' starts, but to sample
@@ -2229,6 +2645,7 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
     def sample(self, storage: Storage, batch_size: int) -> tuple[torch.Tensor, dict]:
         # Sample `batch_size` indices representing the start of a slice.
         # The sampling is based on a weight vector.
+        self._maybe_move_trees(storage)
         start_idx, stop_idx, lengths = self._get_stop_and_length(storage)
         seq_length, num_slices = self._adjusted_batch_size(batch_size)
 
@@ -2243,18 +2660,21 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
             )
             preceding_stop_idx = (preceding_stop_idx[-1], *preceding_stop_idx[:-1])
             preceding_stop_idx = torch.as_tensor(
-                np.ravel_multi_index(preceding_stop_idx, storage.shape)
+                np.ravel_multi_index(
+                    tuple(idx.cpu() for idx in preceding_stop_idx), storage.shape
+                )
             )
 
         # force to not sample index at the end of a trajectory
-        vals = torch.tensor(self._sum_tree[preceding_stop_idx.cpu().numpy()])
-        self._sum_tree[preceding_stop_idx.cpu().numpy()] = 0.0
+        preceding_stop_idx = preceding_stop_idx.to(self._tree_device)
+        vals = torch.as_tensor(self._sum_tree[preceding_stop_idx])
+        self._sum_tree[preceding_stop_idx] = 0.0
         # and no need to update self._min_tree
 
         starts, info = PrioritizedSampler.sample(
             self, storage=storage, batch_size=batch_size // seq_length
         )
-        self._sum_tree[preceding_stop_idx.cpu().numpy()] = vals
+        self._sum_tree[preceding_stop_idx] = vals
         # We must truncate the seq_length if (1) not strict length or (2) span[1]
         if self.span[1] or not self.strict_length:
             if not isinstance(starts, torch.Tensor):
@@ -2297,8 +2717,8 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
         info["_weight"] = torch.as_tensor(info["_weight"], device=lengths.device)
 
         # extends starting indices of each slice with sequence_length to get indices of all steps
-        index = self._tensor_slices_from_startend(
-            seq_length, starts, storage_length=storage.shape[0]
+        offsets, index = _slice_index(
+            starts, seq_length, storage_length=storage.shape[0]
         )
 
         # repeat the weight of each slice to match the number of steps
@@ -2314,10 +2734,7 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
             truncated = torch.zeros(
                 (index.shape[0], 1), dtype=torch.bool, device=index.device
             )
-            if isinstance(seq_length, int):
-                truncated.view(num_slices, -1)[:, -1] = 1
-            else:
-                truncated[seq_length.cumsum(0) - 1] = 1
+            truncated[offsets + seq_length - 1] = 1
             index = index.to(torch.long).unbind(-1)
             st_index = storage[index]
             try:
@@ -2339,7 +2756,7 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
         return index.to(torch.long).unbind(-1), info
 
     def _empty(self):
-        # no op for SliceSampler
+        self._reset_traj_index()
         PrioritizedSampler._empty(self)
 
     def dumps(self, path):
@@ -2347,7 +2764,7 @@ class PrioritizedSliceSampler(SliceSampler, PrioritizedSampler):
         PrioritizedSampler.dumps(self, path)
 
     def loads(self, path):
-        # no op for SliceSampler
+        self._reset_traj_index()
         return PrioritizedSampler.loads(self, path)
 
     def state_dict(self):
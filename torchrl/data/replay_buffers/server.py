@@ -0,0 +1,382 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+from __future__ import annotations
+
+import traceback
+from multiprocessing.connection import Connection, wait
+
+import torch
+from tensordict import TensorDict, TensorDictBase
+
+from torchrl.data.replay_buffers.replay_buffers import (
+    ReplayBuffer,
+    TensorDictReplayBuffer,
+)
+
+
+class _ReplayBufferSlots:
+    """The shared-memory tensordicts exchanged between a client and the server."""
+
+    def __init__(
+        self,
+        template: TensorDictBase,
+        sample_template: TensorDictBase,
+        max_extend_size: int,
+        max_batch_size: int,
+    ):
+        self.extend = _expand_template(template, max_extend_size).share_memory_()
+        self.extend_index = torch.zeros(max_extend_size, dtype=torch.long)
+        self.sample = _expand_template(sample_template, max_batch_size)
+        self.sample.set("index", torch.zeros(max_batch_size, dtype=torch.long))
+        self.sample.set("_weight", torch.zeros(max_batch_size))
+        self.sample.share_memory_()
+        self.priority_index = torch.zeros(max_batch_size, dtype=torch.long)
+        self.priority = torch.zeros(max_batch_size)
+        for tensor in (self.extend_index, self.priority_index, self.priority):
+            tensor.share_memory_()
+        self.extend_keys = list(self.extend.keys(True, True))
+        self.sample_keys = list(sample_template.keys(True, True))
+
+
+def _expand_template(template: TensorDictBase, size: int) -> TensorDictBase:
+    if template.batch_dims:
+        raise ValueError(
+            f"Expected a template with an empty batch-size, got {template.batch_size}."
+        )
+    return template.expand(size).clone()
+
+
+def _server_loop(
+    replay_buffer_cls: type[ReplayBuffer],
+    rb_kwargs: dict,
+    control: Connection,
+    connections: list[Connection],
+    slots: list[_ReplayBufferSlots],
+) -> None:
+    try:
+        rb = replay_buffer_cls(**rb_kwargs)
+    except Exception:
+        control.send(("error", traceback.format_exc()))
+        return
+    control.send(("ok", None))
+    slot_of = {id(conn): slot for conn, slot in zip(connections, slots)}
+    connections = [control, *connections]
+    while True:
+        for conn in wait(connections):
+            try:
+                cmd, arg = conn.recv()
+            except EOFError:
+                # the client has been garbage collected or its process has exited
+                connections.remove(conn)
+                continue
+            if conn is control:
+                if cmd == "close":
+                    control.send(("ok", None))
+                    return
+                continue
+            try:
+                result = _handle(rb, cmd, arg, slot_of.get(id(conn)))
+                conn.send(("ok", result))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+
+
+def _handle(rb: ReplayBuffer, cmd: str, arg, slot: _ReplayBufferSlots):
+    if cmd == "extend":
+        data = slot.extend[:arg]
+        index = rb.extend(data.clone())
+        slot.extend_index[:arg] = torch.as_tensor(index).reshape(-1)
+        return None
+    if cmd == "sample":
+        data, info = rb.sample(arg, return_info=True)
+        out = slot.sample[:arg]
+        out.update_(data, keys_to_update=slot.sample_keys)
+        out.set_("index", torch.as_tensor(info["index"]).reshape(-1))
+        weight = info.get("_weight")
+        if weight is None:
+            out.get("_weight").fill_(1.0)
+        else:
+            out.set_("_weight", torch.as_tensor(weight, dtype=torch.float).reshape(-1))
+        return None
+    if cmd == "update_priority":
+        rb.update_priority(
+            slot.priority_index[:arg].clone(), slot.priority[:arg].clone()
+        )
+        return None
+    if cmd == "len":
+        return len(rb)
+    if cmd == "write_count":
+        return rb.write_count
+    if cmd == "empty":
+        return rb.empty()
+    raise RuntimeError(f"Unknown command {cmd}.")
+
+
+class ReplayBufferClient:
+    """A handle on a replay buffer owned by a :class:`ReplayBufferServer` process.
+
+    Clients are created by the server and can be sent to other processes. Commands
+    and sizes are sent to the server through a pipe while the tensors are exchanged
+    through shared-memory tensordicts allocated once for all.
+    A client must not be used by more than one thread at a time.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        slots: _ReplayBufferSlots,
+        batch_size: int | None = None,
+    ):
+        self._connection = connection
+        self._slots = slots
+        self._batch_size = batch_size
+
+    def _call(self, cmd: str, arg=None):
+        try:
+            self._connection.send((cmd, arg))
+            status, result = self._connection.recv()
+        except (EOFError, OSError) as err:
+            raise RuntimeError("The replay buffer server is not running.") from err
+        if status == "error":
+            raise RuntimeError(
+                f"The replay buffer server failed with the following error:\n{result}"
+            )
+        return result
+
+    @property
+    def max_extend_size(self) -> int:
+        return self._slots.extend.shape[0]
+
+    @property
+    def max_batch_size(self) -> int:
+        return self._slots.sample.shape[0]
+
+    def extend(self, data: TensorDictBase) -> torch.Tensor:
+        """Extends the replay buffer and returns the indices of the written elements.
+
+        Batches larger than the ``max_extend_size`` of the server are written in chunks.
+        """
+        indices = []
+        for start in range(0, data.shape[0], self.max_extend_size):
+            chunk = data[start : start + self.max_extend_size]
+            n = chunk.shape[0]
+            self._slots.extend[:n].update_(
+                chunk, keys_to_update=self._slots.extend_keys
+            )
+            self._call("extend", n)
+            indices.append(self._slots.extend_index[:n].clone())
+        return torch.cat(indices)
+
+    def add(self, data: TensorDictBase) -> int:
+        """Adds a single element to the replay buffer and returns its index."""
+        return int(self.extend(data.unsqueeze(0))[0])
+
+    def sample(
+        self, batch_size: int | None = None, *, reuse_output: bool = False
+    ) -> TensorDictBase:
+        """Samples a batch of data from the replay buffer.
+
+        The batch contains the ``"index"`` of the elements in the buffer and their
+        importance sampling ``"_weight"`` (ones if the sampler is not prioritized).
+
+        Args:
+            batch_size (int, optional): the size of the batch. Defaults to the
+                batch-size of the server.
+
+        Keyword Args:
+            reuse_output (bool, optional): if ``True``, the batch is a view on the
+                shared-memory buffer of the client, which is overwritten by the next
+                call to :meth:`sample`. Otherwise, a copy is returned.
+                Defaults to ``False``.
+
+        """
+        if batch_size is None:
+            batch_size = self._batch_size
+        if batch_size is None:
+            raise RuntimeError(
+                "batch_size not specified. You can specify the batch_size when "
+                "constructing the server, or pass it to the sample method."
+            )
+        if batch_size > self.max_batch_size:
+            raise ValueError(
+                f"Cannot sample {batch_size} elements, the maximum batch-size of the "
+                f"server is {self.max_batch_size}."
+            )
+        self._call("sample", batch_size)
+        out = self._slots.sample[:batch_size]
+        if not reuse_output:
+            out = out.clone()
+        return out
+
+    def update_priority(
+        self, index: torch.Tensor, priority: float | torch.Tensor
+    ) -> None:
+        """Updates the priority of the elements at ``index``."""
+        index = torch.as_tensor(index).reshape(-1)
+        priority = torch.as_tensor(priority, dtype=torch.float).reshape(-1)
+        priority = priority.expand(index.shape)
+        for start in range(0, index.numel(), self.max_batch_size):
+            n = min(self.max_batch_size, index.numel() - start)
+            self._slots.priority_index[:n] = index[start : start + n]
+            self._slots.priority[:n] = priority[start : start + n]
+            self._call("update_priority", n)
+
+    def empty(self) -> None:
+        """Empties the replay buffer."""
+        self._call("empty")
+
+    @property
+    def write_count(self) -> int:
+        return self._call("write_count")
+
+    def __len__(self) -> int:
+        return self._call("len")
+
+
+class ReplayBufferServer:
+    """A replay buffer living in a dedicated process and shared by several local clients.
+
+    On a single machine with several learner (or collector) processes,
+    :class:`~torchrl.data.RemoteTensorDictReplayBuffer` and
+    :class:`~torchrl.data.RayReplayBuffer` pay for an RPC and a serialization
+    of every batch. Here, the replay buffer is owned by a server process and
+    each client is given a set of shared-memory tensordicts, registered once
+    when the server is created: the data written or sampled is copied in these
+    buffers and only a command and a batch-size go through a pipe.
+
+    The replay buffer is instantiated in the server process with
+    ``replay_buffer_cls(**kwargs)``. As for :class:`~torchrl.data.RayReplayBuffer`,
+    the storage, sampler and writer should be passed as constructors.
+
+    Keyword Args:
+        template (TensorDictBase): an element of the data written in the buffer,
+            with an empty batch-size. Only its entries are exchanged with the server.
+        num_clients (int, optional): the number of clients to create. Defaults to ``1``.
+        batch_size (int, optional): the default batch-size of the clients.
+        max_batch_size (int, optional): the size of the shared sampling buffers.
+            Defaults to ``batch_size``.
+        max_extend_size (int, optional): the size of the shared writing buffers.
+            Larger batches are written in chunks. Defaults to ``1024``.
+        sample_template (TensorDictBase, optional): an element of the sampled
+            data, if the transforms of the buffer change its content.
+            Defaults to ``template``.
+        replay_buffer_cls (type[ReplayBuffer], optional): the replay buffer class.
+            Defaults to :class:`~torchrl.data.TensorDictReplayBuffer`.
+        **kwargs: keyword arguments to pass to the replay buffer class.
+
+    .. note:: Only storages with a single dimension are supported.
+
+    Examples:
+        >>> from functools import partial
+        >>> import torch
+        >>> from torch import multiprocessing as mp
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import LazyTensorStorage, ReplayBufferServer
+        >>>
+        >>> def learner(client):
+        ...     client.extend(TensorDict({"obs": torch.randn(100, 4)}, [100]))
+        ...     batch = client.sample()
+        ...     client.update_priority(batch["index"], batch["obs"].norm(dim=-1))
+        ...
+        >>> if __name__ == "__main__":
+        ...     server = ReplayBufferServer(
+        ...         template=TensorDict({"obs": torch.zeros(4)}),
+        ...         num_clients=2,
+        ...         batch_size=32,
+        ...         storage=partial(LazyTensorStorage, 1000),
+        ...     )
+        ...     procs = [mp.Process(target=learner, args=(client,)) for client in server.clients]
+        ...     for proc in procs:
+        ...         proc.start()
+        ...     for proc in procs:
+        ...         proc.join()
+        ...     assert len(server.clients[0]) == 200
+        ...     server.shutdown()
+
+    """
+
+    _TIMEOUT = 10.0
+
+    def __init__(
+        self,
+        *,
+        template: TensorDictBase,
+        num_clients: int = 1,
+        batch_size: int | None = None,
+        max_batch_size: int | None = None,
+        max_extend_size: int = 1024,
+        sample_template: TensorDictBase | None = None,
+        replay_buffer_cls: type[ReplayBuffer] = TensorDictReplayBuffer,
+        **kwargs,
+    ) -> None:
+        if max_batch_size is None:
+            max_batch_size = batch_size
+        if max_batch_size is None:
+            raise ValueError("max_batch_size or batch_size must be provided.")
+        if not isinstance(template, TensorDictBase):
+            template = TensorDict(template)
+        if sample_template is None:
+            sample_template = template
+        ctx = torch.multiprocessing.get_context("spawn")
+        slots = [
+            _ReplayBufferSlots(
+                template, sample_template, max_extend_size, max_batch_size
+            )
+            for _ in range(num_clients)
+        ]
+        pipes = [ctx.Pipe() for _ in range(num_clients)]
+        self._control, server_control = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_server_loop,
+            args=(
+                replay_buffer_cls,
+                kwargs,
+                server_control,
+                [server_end for _, server_end in pipes],
+                slots,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        # Only the server process holds the other end: if it dies, recv fails
+        # instead of waiting forever.
+        server_control.close()
+        self.clients = [
+            ReplayBufferClient(client_end, slot, batch_size=batch_size)
+            for (client_end, _), slot in zip(pipes, slots)
+        ]
+        while not self._control.poll(self._TIMEOUT):
+            if not self._process.is_alive():
+                break
+        try:
+            status, err = self._control.recv()
+        except EOFError:
+            self._process.join(timeout=self._TIMEOUT)
+            status = "error"
+            err = f"The server process exited with code {self._process.exitcode}."
+        if status == "error":
+            self._process.join()
+            raise RuntimeError(
+                f"The replay buffer could not be created in the server process:\n{err}"
+            )
+
+    def shutdown(self) -> None:
+        """Stops the server process."""
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._control.send(("close", None))
+            if self._control.poll(self._TIMEOUT):
+                self._control.recv()
+            self._process.join(timeout=self._TIMEOUT)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
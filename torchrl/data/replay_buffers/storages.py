@@ -5,15 +5,20 @@
 from __future__ import annotations
 
 import abc
+import json
 import logging
 import os
+import pickle
 import sys
 import textwrap
+import time
 import warnings
 from collections import OrderedDict
 from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 from multiprocessing.context import get_spawning_popen
+from pathlib import Path
 from typing import Any
 
 import numpy as np
@@ -28,7 +33,7 @@ from tensordict import (
 )
 from tensordict.base import _NESTED_TENSORS_AS_LISTS
 from tensordict.memmap import MemoryMappedTensor
-from tensordict.utils import _zip_strict
+from tensordict.utils import _unravel_key_to_tuple, _zip_strict, NestedKey
 from torch import multiprocessing as mp
 from torch.utils._pytree import tree_flatten, tree_map, tree_unflatten
 
@@ -41,8 +46,11 @@ from torchrl.data.replay_buffers.checkpointers import (
     TensorStorageCheckpointer,
 )
 from torchrl.data.replay_buffers.utils import (
+    _empty_batch,
+    _index_select_into,
     _init_pytree,
     _is_int,
+    _normalize_rows,
     INT_CLASSES,
     tree_iter,
 )
@@ -163,6 +171,11 @@ class Storage:
     def _empty(self):
         ...
 
+    def _enable_seqlock(self):
+        raise ValueError(
+            f"Lock-free writing is not supported by storages of type {type(self).__name__}."
+        )
+
     # TODO: Without this disable, compiler recompiles due to changing len(self) guards.
     @compile_disable()
     def _rand_given_ndim(self, batch_size):
@@ -572,6 +585,13 @@ class TensorStorage(Storage):
 
     _storage = None
     _default_checkpointer = TensorStorageCheckpointer
+    # per-row sequence counters used by lock-free writers (see RoundRobinWriter)
+    _row_seq = None
+    _supports_seqlock = True
+    _seqlock_timeout = 60.0
+    # rows modified since the last incremental checkpoint (see
+    # IncrementalStorageCheckpointer), None if they are not tracked
+    _dirty_rows = None
 
     def __init__(
         self,
@@ -900,6 +920,17 @@ class TensorStorage(Storage):
             self._storage[cursor] = data
         else:
             self._set_tree_map(cursor, data, self._storage)
+        self._mark_dirty(cursor)
+
+    def _mark_dirty(self, cursor) -> None:
+        dirty_rows = self._dirty_rows
+        if dirty_rows is None:
+            return
+        if isinstance(cursor, tuple):
+            cursor = cursor[0]
+        if isinstance(cursor, torch.Tensor):
+            cursor = cursor.cpu()
+        dirty_rows[cursor] = True
 
     @implement_for("torch", None, "2.0", compilable=True)
     def set(  # noqa: F811
@@ -954,8 +985,29 @@ class TensorStorage(Storage):
                     "batch size provided."
                 )
         self._storage[cursor] = data
+        self._mark_dirty(cursor)
 
-    def get(self, index: int | Sequence[int] | slice) -> Any:
+    def get(self, index: int | Sequence[int] | slice, *, out: Any = None) -> Any:
+        """Returns the elements of the storage at ``index``.
+
+        Args:
+            index (int, sequence of ints, slice or tensor): the index of the elements.
+
+        Keyword Args:
+            out (TensorDictBase, torch.Tensor or PyTree, optional): if provided, the
+                elements are written in this pre-allocated output, which is then
+                returned. When the index is a 1d tensor, the elements are gathered
+                with :func:`torch.index_select` and no intermediate tensor is
+                allocated.
+
+        """
+        if self._row_seq is not None:
+            return self._seqlock_get(index, out)
+        if out is not None:
+            return self._get_into(index, out)
+        return self._get(index)
+
+    def _get(self, index):
         _storage = self._storage
         is_tc = is_tensor_collection(_storage)
         if not self.initialized:
@@ -976,6 +1028,126 @@ class TensorStorage(Storage):
         else:
             return tree_map(lambda x: x[index], storage)
 
+    def _get_into(self, index, out):
+        if not self.initialized:
+            raise RuntimeError("Cannot get elements out of a non-initialized storage.")
+        _storage = self._storage
+        if isinstance(index, tuple) and len(index) == 1:
+            index = index[0]
+        if (
+            isinstance(index, torch.Tensor)
+            and index.ndim == 1
+            and (
+                isinstance(_storage, torch.Tensor)
+                or (
+                    isinstance(_storage, TensorDictBase)
+                    and not isinstance(_storage, LazyStackedTensorDict)
+                )
+            )
+        ):
+            # indices returned by the samplers are all within the filled part
+            # of the storage
+            return _index_select_into(_storage, index, out)
+        result = self.get(index)
+        if isinstance(out, torch.Tensor) or is_tensor_collection(out):
+            out.copy_(result)
+        else:
+            tree_map(lambda dest, source: dest.copy_(source), out, result)
+        return out
+
+    def _enable_seqlock(self):
+        if not self._supports_seqlock:
+            return super()._enable_seqlock()
+        if self._compilable or self.ndim != 1:
+            raise ValueError(
+                f"Lock-free writing is only supported by non-compilable storages "
+                f"with a single dimension, got {type(self).__name__} with "
+                f"ndim={self.ndim} and compilable={self._compilable}."
+            )
+        if self._row_seq is None:
+            # Non-negative even values mark committed rows (0 for rows that have
+            # been written before the seqlock was enabled), odd values rows being
+            # written. Rows that have never been written are marked with -1, such
+            # that readers wait for them if they are reserved but not yet written.
+            self._row_seq = torch.full((self.max_size,), -1, dtype=torch.long)
+            self._row_seq[: self._len] = 0
+            self._row_seq.share_memory_()
+
+    def _seqlock_set(self, index, data, position: torch.Tensor):
+        # position is the absolute write position of each row: a row written
+        # during the L-th pass over the storage goes from 2 * L (committed by the
+        # previous pass) to 2 * L + 1 (being written) and then 2 * L + 2.
+        lap = position // self.max_size
+        rows = position % self.max_size
+        # wait for the previous pass to be committed on these rows (the rows of the
+        # first pass have no previous writer)
+        previous = lap > 0
+        if previous.any():
+            self._seqlock_wait(rows[previous], 2 * lap[previous])
+        self._row_seq[rows] = 2 * lap + 1
+        self.set(index, data, set_cursor=False)
+        self._row_seq[rows] = 2 * lap + 2
+        with self._len_value.get_lock():
+            self._len = max(self._len, min(int(position.max()) + 1, self.max_size))
+
+    def _seqlock_wait(
+        self, rows: torch.Tensor, min_seq: torch.Tensor | None = None
+    ) -> torch.Tensor:
+        # Waits for the rows to be committed and returns their sequence counters
+        deadline = None
+        while True:
+            seq = self._row_seq[rows]
+            ready = ((seq & 1) == 0) & (seq >= 0)
+            if min_seq is not None:
+                ready &= seq >= min_seq
+            if ready.all():
+                return seq
+            if deadline is None:
+                deadline = time.monotonic() + self._seqlock_timeout
+            elif time.monotonic() > deadline:
+                raise RuntimeError(
+                    f"Timed out after {self._seqlock_timeout} seconds waiting for "
+                    f"rows of the storage to be written. A writer may have died "
+                    f"while writing."
+                )
+            time.sleep(1e-4)
+
+    def _seqlock_get(self, index, out):
+        if not self.initialized:
+            raise RuntimeError("Cannot get elements out of a non-initialized storage.")
+        if isinstance(index, tuple) and len(index) == 1:
+            index = index[0]
+        rows = _normalize_rows(index, self._len_along_dim0)
+        flat_rows = rows.reshape(-1)
+        seq = self._seqlock_wait(flat_rows)
+        data = self._get(flat_rows)
+        # rows that have been written during the read are read again
+        torn = (self._row_seq[flat_rows] != seq).nonzero().squeeze(-1)
+        while torn.numel():
+            seq = self._seqlock_wait(flat_rows[torn])
+            reread = self._get(flat_rows[torn])
+            if is_tensor_collection(data) or isinstance(data, torch.Tensor):
+                data[torn] = reread
+            else:
+                tree_map(
+                    lambda dest, source: dest.__setitem__(torn, source), data, reread
+                )
+            torn = torn[self._row_seq[flat_rows[torn]] != seq]
+        if rows.ndim != 1:
+            if is_tensor_collection(data):
+                data = data.reshape(rows.shape)
+            elif isinstance(data, torch.Tensor):
+                data = data.reshape(rows.shape + data.shape[1:])
+            else:
+                data = tree_map(lambda x: x.reshape(rows.shape + x.shape[1:]), data)
+        if out is None:
+            return data
+        if isinstance(out, torch.Tensor) or is_tensor_collection(out):
+            out.copy_(data)
+        else:
+            tree_map(lambda dest, source: dest.copy_(source), out, data)
+        return out
+
     # TODO: Without this disable, compiler recompiles due to changing _len_value guards.
     @compile_disable()
     def __len__(self):
@@ -985,6 +1157,10 @@ class TensorStorage(Storage):
         # assuming that the data structure is the same, we don't need to to
         # anything if the cursor is reset to 0
         self._len = 0
+        if self._row_seq is not None:
+            self._row_seq.fill_(-1)
+        # the next incremental checkpoint is a full one
+        self._dirty_rows = None
 
     def _init(self):
         raise NotImplementedError(
@@ -1195,6 +1371,16 @@ class LazyMemmapStorage(LazyTensorStorage):
         existsok (bool, optional): whether an error should be raised if any of the
             tensors already exists on disk. Defaults to ``True``. If ``False``, the
             tensor will be opened as is, not overewritten.
+        coalesce_reads (bool, optional): if ``True``, the rows requested with a
+            1d tensor of indices are sorted and deduplicated, close rows are
+            read from disk in contiguous chunks and the rows are then put back in
+            the requested order. This turns the scattered reads of random sampling
+            into sequential ones, which matters when the storage does not fit in
+            the page cache. Defaults to ``False``.
+        coalesce_gap (int, optional): maximum number of unrequested rows between
+            two requested rows for them to be read in a single chunk when
+            ``coalesce_reads=True``. Defaults to the number of rows that fit in
+            a 4 KB page.
 
     .. note:: When checkpointing a ``LazyMemmapStorage``, one can provide a path identical to where the storage is
         already stored to avoid executing long copies of data that is already stored on disk.
@@ -1273,8 +1459,12 @@ class LazyMemmapStorage(LazyTensorStorage):
         ndim: int = 1,
         existsok: bool = False,
         compilable: bool = False,
+        coalesce_reads: bool = False,
+        coalesce_gap: int | None = None,
     ):
         super().__init__(max_size, ndim=ndim, compilable=compilable)
+        self.coalesce_reads = coalesce_reads
+        self.coalesce_gap = coalesce_gap
         self.initialized = False
         self.scratch_dir = None
         self.existsok = existsok
@@ -1351,6 +1541,30 @@ class LazyMemmapStorage(LazyTensorStorage):
         self.initialized = state_dict["initialized"]
         self._len = state_dict["_len"]
 
+    def loads(self, path, *, in_place: bool = False):
+        """Loads the storage saved at ``path``.
+
+        Keyword Args:
+            in_place (bool, optional): if ``True`` and the storage is not initialized,
+                the memory-mapped files saved by the default
+                :class:`~torchrl.data.TensorStorageCheckpointer` are used as the
+                storage instead of being copied: loading is then immediate
+                regardless of the size of the storage, and ``path`` becomes the
+                ``scratch_dir`` of the storage.
+
+                .. warning:: The data written in the storage afterwards modifies
+                    the files saved at ``path``.
+
+                Defaults to ``False``.
+        """
+        if (
+            in_place
+            and not self.initialized
+            and type(self.checkpointer) is TensorStorageCheckpointer
+        ):
+            self.scratch_dir = str(Path(path).absolute()) + "/"
+        super().loads(path)
+
     def _init(self, data: TensorDictBase | torch.Tensor) -> None:
         torchrl_logger.debug("Creating a MemmapStorage...")
         if self.device == "auto":
@@ -1393,10 +1607,737 @@ class LazyMemmapStorage(LazyTensorStorage):
         self._storage = out
         self.initialized = True
 
-    def get(self, index: int | Sequence[int] | slice) -> Any:
-        result = super().get(index)
+    def get(self, index: int | Sequence[int] | slice, *, out: Any = None) -> Any:
+        if (
+            self.coalesce_reads
+            and self._row_seq is None
+            and self.initialized
+            and self.ndim == 1
+        ):
+            if isinstance(index, tuple) and len(index) == 1:
+                index = index[0]
+            if (
+                isinstance(index, torch.Tensor)
+                and index.ndim == 1
+                and (
+                    isinstance(self._storage, torch.Tensor)
+                    or is_tensor_collection(self._storage)
+                )
+            ):
+                # negative rows are counted from the end of the storage, as in
+                # the uncoalesced read
+                rows = _normalize_rows(index, len(self))
+                rows, inverse = torch.unique(rows, return_inverse=True)
+                result = self._read_sorted(rows, inverse)[0]
+                if out is None:
+                    return result
+                out.copy_(result)
+                return out
+        result = super().get(index, out=out)
+        return result
+
+    def _read_sorted(
+        self, rows: torch.Tensor, inverse: torch.Tensor | None = None
+    ) -> tuple[TensorDictBase | torch.Tensor, int]:
+        # Reads sorted unique rows. Rows that are less than coalesce_gap rows
+        # apart are merged in contiguous ranges, which are read with a single
+        # ascending gather. The rows are then returned in the order given by
+        # inverse (if any), together with the number of rows read.
+        gap = self.coalesce_gap
+        if gap is None:
+            gap = 4096 // max(self._row_nbytes, 1)
+        new_chunk = torch.ones_like(rows, dtype=torch.bool)
+        new_chunk[1:] = (rows[1:] - rows[:-1]) > gap + 1
+        chunk_id = new_chunk.cumsum(0) - 1
+        chunk_start = rows[new_chunk]
+        chunk_len = torch.zeros_like(chunk_start).scatter_reduce_(
+            0, chunk_id, rows, reduce="amax"
+        )
+        chunk_len = chunk_len - chunk_start + 1
+        chunk_offset = chunk_len.cumsum(0) - chunk_len
+        span = torch.arange(int(chunk_len.sum())) - chunk_offset.repeat_interleave(
+            chunk_len
+        )
+        span = span + chunk_start.repeat_interleave(chunk_len)
+        data = _index_select_into(
+            self._storage, span, _empty_batch(self._storage, span.numel())
+        )
+        position = None
+        if span.numel() != rows.numel():
+            position = rows - chunk_start[chunk_id] + chunk_offset[chunk_id]
+        if inverse is not None:
+            position = inverse if position is None else position[inverse]
+        if position is not None:
+            data = _index_select_into(
+                data, position, _empty_batch(data, position.numel())
+            )
+        return data, span.numel()
+
+    @property
+    def _row_nbytes(self) -> int:
+        if is_tensor_collection(self._storage):
+            leaves = self._storage.values(True, True)
+        else:
+            leaves = [self._storage]
+        return sum(leaf[0].numel() * leaf.element_size() for leaf in leaves)
+
+
+class FrameStackStorage(LazyTensorStorage):
+    """A storage for frame-stacked observations where each raw frame is stored once.
+
+    When :class:`~torchrl.envs.CatFrames` is used during data collection, the
+    stacked ``"pixels"`` and ``("next", "pixels")`` entries of a trajectory contain
+    every frame up to ``2 * N`` times. This storage keeps the raw frames in a
+    separate ring where each frame is written once, and every transition only
+    holds an index table of the ``N + 1`` frames that make up its stacked
+    observation and next observation. The stacked entries are rebuilt when the
+    data is read.
+
+    The data written in the storage must contain the unstacked frames at ``in_keys``
+    and ``("next", in_keys)`` (e.g., the output of the transforms that precede
+    :class:`~torchrl.envs.CatFrames`), and the transitions of a trajectory must be
+    written in order. Any stacked entry present at ``out_keys`` is discarded.
+    Trajectories end when ``("next", done_key)`` is ``True`` and, if the data
+    contains a ``traj_key`` entry, when the trajectory id changes. A trajectory
+    that is not done at the end of a write is continued by the next write with
+    the same trajectory id. The frames that precede the first frame of a
+    trajectory are padded like :class:`~torchrl.envs.CatFrames` does.
+
+    Args:
+        max_size (int): size of the storage, i.e. maximum number of transitions
+            stored in the buffer.
+        N (int): number of frames to concatenate.
+
+    Keyword Args:
+        dim (int, optional): dimension of the frames along which they are
+            concatenated. Must be negative. Defaults to ``-3``.
+        in_keys (sequence of NestedKey, optional): keys pointing to the raw frames.
+            The matching ``("next", key)`` entries are handled too.
+            Defaults to ``["pixels"]``.
+        out_keys (sequence of NestedKey, optional): keys where the stacked frames
+            are written when reading. Defaults to the value of ``in_keys``.
+            If they differ from ``in_keys``, the raw frames are returned as well.
+        padding (str, optional): the padding method. One of ``"same"`` or
+            ``"constant"``. Defaults to ``"same"``.
+        padding_value (:obj:`float`, optional): the value to use for padding if
+            ``padding="constant"``. Defaults to 0.
+        done_key (NestedKey, optional): the done key indicating the end of a
+            trajectory. Defaults to ``"done"``.
+        traj_key (NestedKey, optional): the key of the trajectory ids. Ignored if
+            absent from the data. Defaults to ``("collector", "traj_ids")``.
+        min_episode_len (int, optional): a lower bound on the number of steps of
+            the trajectories, used to size the frame ring. Defaults to ``1``.
+        frame_capacity (int, optional): number of frames in the frame ring.
+            A trajectory of ``T`` steps uses ``T + 1`` frames and the oldest
+            transition refers to up to ``N - 1`` frames that precede it, so the
+            ring must hold ``max_size`` frames plus one frame per trajectory
+            plus ``N``. An exception is raised when a transition refers to a
+            frame that has been overwritten. Defaults to
+            ``max_size + ceil(max_size / min_episode_len) + N``, which is enough
+            for any trajectory of at least ``min_episode_len`` steps.
+        device (torch.device, optional): device where the data is stored.
+            Defaults to ``"cpu"``.
+
+    Examples:
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import ReplayBuffer, FrameStackStorage
+        >>> frames = torch.arange(11.0).view(11, 1, 1, 1)
+        >>> done = torch.zeros(10, 1, dtype=torch.bool)
+        >>> done[4] = True
+        >>> data = TensorDict({
+        ...     "pixels": frames[:-1].clone(),
+        ...     "next": {"pixels": frames[1:].clone(), "done": done},
+        ... }, batch_size=[10])
+        >>> data["next", "pixels"][4] = -1  # last frame of the first trajectory
+        >>> data["pixels"][5] = -2  # reset frame of the second trajectory
+        >>> rb = ReplayBuffer(storage=FrameStackStorage(100, N=3))
+        >>> rb.extend(data)
+        >>> rb[1]["pixels"].flatten()
+        tensor([0., 0., 1.])
+        >>> rb[4]["next", "pixels"].flatten()
+        tensor([ 3.,  4., -1.])
+        >>> rb[6]["pixels"].flatten()
+        tensor([-2., -2.,  6.])
+
+    """
+
+    _FRAME_IDS_KEY = "_frame_ids"
+    _supports_seqlock = False
+    ACCEPTED_PADDING = {"same", "constant"}
+
+    def __init__(
+        self,
+        max_size: int,
+        N: int,
+        *,
+        dim: int = -3,
+        in_keys: Sequence[NestedKey] | None = None,
+        out_keys: Sequence[NestedKey] | None = None,
+        padding: str = "same",
+        padding_value: float = 0,
+        done_key: NestedKey = "done",
+        traj_key: NestedKey = ("collector", "traj_ids"),
+        min_episode_len: int = 1,
+        frame_capacity: int | None = None,
+        device: torch.device = "cpu",
+    ):
+        super().__init__(max_size, device=device)
+        if min_episode_len < 1:
+            raise ValueError(
+                f"min_episode_len must be a positive integer, got {min_episode_len}."
+            )
+        if dim >= 0:
+            raise ValueError(
+                "dim must be < 0 to accommodate for tensordict of "
+                "different batch-sizes (since negative dims are batch invariant)."
+            )
+        if padding not in self.ACCEPTED_PADDING:
+            raise ValueError(f"padding must be one of {self.ACCEPTED_PADDING}")
+        if in_keys is None:
+            in_keys = ["pixels"]
+        if out_keys is None:
+            out_keys = copy(in_keys)
+        if len(in_keys) != len(out_keys):
+            raise ValueError("in_keys and out_keys must have the same length.")
+        self.N = N
+        self.dim = dim
+        self.in_keys = [_unravel_key_to_tuple(key) for key in in_keys]
+        self.out_keys = [_unravel_key_to_tuple(key) for key in out_keys]
+        self.padding = padding
+        self.padding_value = padding_value
+        self.done_key = _unravel_key_to_tuple(done_key)
+        self.traj_key = _unravel_key_to_tuple(traj_key)
+        if frame_capacity is None:
+            frame_capacity = max_size + -(-max_size // min_episode_len) + N
+        self._frame_storage = LazyTensorStorage(frame_capacity, device=device)
+        # Frame ids are absolute: the frame with id i is stored at i % frame_capacity
+        self._frame_count = 0
+        # Last N frame ids of the trajectories that were not done at the end of
+        # the last write, indexed by trajectory id.
+        self._open_chains = {}
+
+    @property
+    def frame_capacity(self) -> int:
+        return self._frame_storage.max_size
+
+    def _excluded_keys(self):
+        keys = set(self.in_keys + self.out_keys)
+        return list(keys) + [("next", *key) for key in keys]
+
+    def set(
+        self,
+        cursor: int | Sequence[int] | slice,
+        data: TensorDictBase,
+        *,
+        set_cursor: bool = True,
+    ):
+        if not is_tensor_collection(data):
+            raise TypeError(
+                f"{type(self).__name__} only supports tensordict data, got {type(data)}."
+            )
+        if _is_int(cursor):
+            cursor = [cursor]
+            data = data.unsqueeze(0)
+        frame_ids = self._write_frames(data)
+        data = data.exclude(*self._excluded_keys())
+        data.set(self._FRAME_IDS_KEY, frame_ids)
+        super().set(cursor, data, set_cursor=set_cursor)
+
+    def _write_frames(self, data: TensorDictBase) -> torch.Tensor:
+        n = data.shape[0]
+        N = self.N
+        done = data.get(("next", *self.done_key)).reshape(n, -1).any(-1)
+        traj = data.get(self.traj_key, None)
+        if traj is not None:
+            traj = traj.reshape(n, -1)[:, 0]
+        starts = torch.zeros(n, dtype=torch.bool, device=done.device)
+        starts[0] = True
+        starts[1:] = done[:-1]
+        if traj is not None:
+            starts[1:] |= (traj[1:] != traj[:-1]).to(starts.device)
+        seg_starts = starts.nonzero().squeeze(-1).tolist()
+        seg_ends = seg_starts[1:] + [n]
+        done = done.tolist()
+
+        frame_count = self._frame_count
+        open_chains = dict(self._open_chains)
+        new_rows = []
+        new_ids = []
+        next_ids = []
+        windows = []
+        for start, end in _zip_strict(seg_starts, seg_ends):
+            key = traj[start].item() if traj is not None else None
+            tail = None
+            if start == 0 or not done[start - 1]:
+                tail = open_chains.pop(key, None)
+            if tail is None:
+                # new trajectory: the first frame is stored and the previous ones padded
+                first_id = frame_count
+                frame_count += 1
+                new_rows.append(start)
+                new_ids.append(first_id)
+                pad_id = first_id if self.padding == "same" else -1
+                tail = torch.tensor([pad_id] * (N - 1) + [first_id])
+            seg_next_ids = torch.arange(frame_count, frame_count + end - start)
+            frame_count += end - start
+            next_ids.append(seg_next_ids)
+            chain = torch.cat([tail, seg_next_ids])
+            windows.append(chain.unfold(0, N + 1, 1))
+            if not done[end - 1]:
+                open_chains[key] = chain[-N:]
+        if frame_count - self._frame_count > self.frame_capacity:
+            raise RuntimeError(
+                f"Cannot write {frame_count - self._frame_count} frames at once in a "
+                f"frame ring of capacity {self.frame_capacity}. Increase frame_capacity."
+            )
+        self._frame_count = frame_count
+        self._open_chains = open_chains
+
+        frame_cap = self.frame_capacity
+        frames = data.select(*self.in_keys)
+        next_frames = data.get("next").select(*self.in_keys)
+        next_ids = torch.cat(next_ids)
+        if new_rows:
+            self._frame_storage.set(
+                torch.tensor(new_ids) % frame_cap, frames[torch.tensor(new_rows)]
+            )
+        self._frame_storage.set(next_ids % frame_cap, next_frames)
+        return torch.cat(windows)
+
+    def get(self, index: int | Sequence[int] | slice, *, out: Any = None) -> Any:
+        result = super().get(index, out=out)
+        # The result can be the stored tensordict itself (e.g. a full slice): the
+        # frame ids are excluded rather than popped to leave it untouched.
+        frame_ids = result.get(self._FRAME_IDS_KEY)
+        result = result.exclude(self._FRAME_IDS_KEY)
+        return self._stack_frames(result, frame_ids)
+
+    def _stack_frames(self, result: TensorDictBase, frame_ids: torch.Tensor):
+        N = self.N
+        if (
+            (frame_ids >= 0) & (frame_ids < self._frame_count - self.frame_capacity)
+        ).any():
+            raise RuntimeError(
+                "Some of the frames of the requested transitions have been "
+                "overwritten. Increase the frame_capacity of the storage."
+            )
+        pad_mask = frame_ids < 0
+        slots = frame_ids.clamp_min(0) % self.frame_capacity
+        frames = self._frame_storage._storage
+        nbatch = frame_ids.ndim - 1
+        for in_key, out_key in _zip_strict(self.in_keys, self.out_keys):
+            frame = frames.get(in_key)
+            cat_dim = nbatch + frame.ndim - 1 + self.dim
+            for prefix, window in (((), slice(None, N)), (("next",), slice(1, None))):
+                stack = frame[slots[..., window].to(frame.device)]
+                if self.padding == "constant":
+                    mask = pad_mask[..., window].to(frame.device)
+                    mask = mask.view(*mask.shape, *(1,) * (frame.ndim - 1))
+                    stack = stack.masked_fill_(mask, self.padding_value)
+                if in_key != out_key:
+                    result.set((*prefix, *in_key), stack.select(nbatch, -1))
+                stack = stack.movedim(nbatch, cat_dim).flatten(cat_dim, cat_dim + 1)
+                result.set((*prefix, *out_key), stack)
         return result
 
+    def _empty(self):
+        super()._empty()
+        self._frame_storage._empty()
+        self._frame_count = 0
+        self._open_chains = {}
+
+    def state_dict(self) -> dict[str, Any]:
+        state_dict = super().state_dict()
+        state_dict["_frame_storage"] = self._frame_storage.state_dict()
+        state_dict["_frame_count"] = self._frame_count
+        state_dict["_open_chains"] = {
+            key: tail.tolist() for key, tail in self._open_chains.items()
+        }
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        super().load_state_dict(state_dict)
+        self._frame_storage.load_state_dict(state_dict["_frame_storage"])
+        self._frame_count = state_dict["_frame_count"]
+        self._open_chains = {
+            key: torch.tensor(tail) for key, tail in state_dict["_open_chains"].items()
+        }
+
+    def dumps(self, path):
+        path = Path(path)
+        super().dumps(path)
+        self._frame_storage.dumps(path / "frames")
+        with open(path / "frame_metadata.json", "w") as file:
+            json.dump(
+                {
+                    "frame_count": self._frame_count,
+                    "open_chains": [
+                        [key, tail.tolist()] for key, tail in self._open_chains.items()
+                    ],
+                },
+                file,
+            )
+
+    def loads(self, path):
+        path = Path(path)
+        super().loads(path)
+        self._frame_storage.loads(path / "frames")
+        with open(path / "frame_metadata.json") as file:
+            metadata = json.load(file)
+        self._frame_count = metadata["frame_count"]
+        self._open_chains = {
+            key: torch.tensor(tail) for key, tail in metadata["open_chains"]
+        }
+
+
+class TieredMemmapStorage(LazyMemmapStorage):
+    """A memory-mapped storage with an in-memory tier caching the hot rows.
+
+    :class:`LazyMemmapStorage` relies on the OS page cache: when the buffer does not
+    fit in RAM, random access turns into random page faults. This storage keeps
+    every row in memory-mapped files (the cold tier) and a copy of up to ``hot_size``
+    rows in a :class:`LazyTensorStorage` (the hot tier). Written rows are written
+    through to the memmap files and inserted in the hot tier. Rows that are read
+    from the cold tier are inserted in the hot tier too, evicting rows according
+    to ``eviction_policy``.
+
+    Reads from the cold tier are sorted and deduplicated, and rows that are
+    less than ``coalesce_gap`` rows apart are read as a single contiguous chunk.
+
+    The tier hit rate and the number of bytes read from the cold tier per sampled
+    row are reported by :meth:`stats`.
+
+    Args:
+        max_size (int): size of the storage, i.e. maximum number of elements stored
+            in the buffer.
+        hot_size (int): maximum number of rows kept in memory.
+
+    Keyword Args:
+        eviction_policy (str, optional): ``"lru"`` evicts the least recently
+            written or read rows. ``"priority"`` evicts the rows with the lowest
+            priority in the :class:`~torchrl.data.replay_buffers.PrioritizedSampler`
+            of the replay buffer that uses this storage. Defaults to ``"lru"``.
+        coalesce_gap (int, optional): maximum number of unrequested rows between
+            two requested rows for them to be read in a single chunk. Defaults
+            to the number of rows that fit in a 4 KB page.
+        scratch_dir (str or path, optional): directory where the memmap files
+            are stored.
+        existsok (bool, optional): whether an error should be raised if any of
+            the tensors already exists on disk. Defaults to ``False``.
+
+    Examples:
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import ReplayBuffer, TieredMemmapStorage
+        >>> storage = TieredMemmapStorage(1000, hot_size=100)
+        >>> rb = ReplayBuffer(storage=storage, batch_size=32)
+        >>> rb.extend(TensorDict({"obs": torch.randn(1000, 4)}, batch_size=[1000]))
+        >>> sample = rb.sample()
+        >>> # only the last 100 rows written are in memory
+        >>> storage.stats()["hit_rate"] < 0.5
+        True
+
+    """
+
+    EVICTION_POLICIES = ("lru", "priority")
+    _supports_seqlock = False
+
+    def __init__(
+        self,
+        max_size: int,
+        hot_size: int,
+        *,
+        eviction_policy: str = "lru",
+        coalesce_gap: int | None = None,
+        scratch_dir=None,
+        existsok: bool = False,
+    ):
+        super().__init__(
+            max_size,
+            scratch_dir=scratch_dir,
+            existsok=existsok,
+            coalesce_gap=coalesce_gap,
+        )
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise ValueError(
+                f"eviction_policy must be one of {self.EVICTION_POLICIES}, got {eviction_policy}."
+            )
+        if hot_size <= 0:
+            raise ValueError("hot_size must be strictly positive.")
+        self.hot_size = hot_size
+        self.eviction_policy = eviction_policy
+        self._hot_storage = LazyTensorStorage(hot_size)
+        self._reset_hot_tier()
+        self.reset_stats()
+
+    def _reset_hot_tier(self):
+        # slot of each row in the hot tier (-1 if cold) and row of each slot
+        self._slot_of_row = torch.full((self.max_size,), -1, dtype=torch.long)
+        self._row_of_slot = torch.full((self.hot_size,), -1, dtype=torch.long)
+        self._last_access = torch.zeros(self.hot_size, dtype=torch.long)
+        self._access_count = 0
+
+    def reset_stats(self) -> None:
+        """Resets the counters reported by :meth:`stats`."""
+        self._hits = 0
+        self._misses = 0
+        self._cold_bytes_read = 0
+
+    def stats(self) -> dict[str, float]:
+        """Returns the hit rate of the hot tier and the bytes read from disk.
+
+        The counters are accumulated since the construction of the storage or the
+        last call to :meth:`reset_stats`.
+        """
+        requested = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / requested if requested else 0.0,
+            "cold_bytes_read": self._cold_bytes_read,
+            "bytes_read_per_sample": self._cold_bytes_read / requested
+            if requested
+            else 0.0,
+        }
+
+    def set(
+        self,
+        cursor: int | Sequence[int] | slice,
+        data: TensorDictBase | torch.Tensor,
+        *,
+        set_cursor: bool = True,
+    ):
+        if not is_tensor_collection(data) and not isinstance(data, torch.Tensor):
+            raise TypeError(
+                f"{type(self).__name__} only supports tensor and tensordict data, got {type(data)}."
+            )
+        super().set(cursor, data, set_cursor=set_cursor)
+        if isinstance(cursor, range):
+            cursor = list(cursor)
+        rows = _normalize_rows(cursor, self.max_size)
+        if rows.ndim == 0:
+            rows = rows.unsqueeze(0)
+            data = data.unsqueeze(0)
+        self._admit(rows, data)
+
+    def _touch(self, slots: torch.Tensor) -> None:
+        self._access_count += 1
+        self._last_access[slots] = self._access_count
+
+    def _eviction_scores(self) -> torch.Tensor:
+        if self.eviction_policy == "lru":
+            scores = self._last_access.double()
+        else:
+            scores = torch.zeros(self.hot_size, dtype=torch.double)
+            used = self._row_of_slot >= 0
+            scores[used] = self._priorities(self._row_of_slot[used])
+        scores[self._row_of_slot < 0] = -float("inf")
+        return scores
+
+    def _priorities(self, rows: torch.Tensor) -> torch.Tensor:
+        for entity in self._attached_entities_iter():
+            sum_tree = getattr(getattr(entity, "_sampler", None), "_sum_tree", None)
+            if sum_tree is not None:
+                return torch.as_tensor(sum_tree[rows]).double().reshape(-1)
+        raise RuntimeError(
+            "The 'priority' eviction policy requires the storage to be used by a "
+            "replay buffer with a PrioritizedSampler."
+        )
+
+    def _admit(
+        self,
+        rows: torch.Tensor,
+        data: TensorDictBase | torch.Tensor,
+        written: bool = True,
+    ):
+        # Inserts rows in the hot tier. Rows already hot are updated in place.
+        # With the priority policy, rows read from the cold tier only replace
+        # hot rows with a lower priority.
+        prioritized = not written and self.eviction_policy == "priority"
+        if prioritized:
+            order = self._priorities(rows).argsort(descending=True)
+            rows, data = rows[order], data[order]
+        if rows.numel() > self.hot_size:
+            keep = (
+                slice(None, self.hot_size)
+                if prioritized
+                else slice(-self.hot_size, None)
+            )
+            rows, data = rows[keep], data[keep]
+        slots = self._slot_of_row[rows]
+        cold = slots < 0
+        num_cold = int(cold.sum())
+        if num_cold:
+            scores = self._eviction_scores()
+            # the hot rows that are being written cannot be evicted
+            scores[slots[~cold]] = float("inf")
+            victim_scores, victims = scores.topk(num_cold, largest=False)
+            if prioritized:
+                # the highest priority rows replace the lowest priority ones
+                replace = self._priorities(rows[cold]) > victim_scores
+                cold_idx = cold.nonzero().squeeze(-1)
+                cold[cold_idx[~replace]] = False
+                victims = victims[replace]
+            evicted = self._row_of_slot[victims]
+            self._slot_of_row[evicted[evicted >= 0]] = -1
+            self._row_of_slot[victims] = rows[cold]
+            self._slot_of_row[rows[cold]] = victims
+            slots = slots.clone()
+            slots[cold] = victims
+        stored = slots >= 0
+        if not stored.all():
+            slots, data = slots[stored], data[stored]
+        if slots.numel():
+            self._hot_storage.set(slots, data)
+            self._touch(slots)
+
+    def _read_cold(self, rows: torch.Tensor) -> TensorDictBase | torch.Tensor:
+        data, num_rows_read = self._read_sorted(rows)
+        self._cold_bytes_read += num_rows_read * self._row_nbytes
+        return data
+
+    def get(self, index: int | Sequence[int] | slice, *, out: Any = None) -> Any:
+        if not self.initialized:
+            raise RuntimeError("Cannot get elements out of a non-initialized storage.")
+        if isinstance(index, tuple) and len(index) == 1:
+            index = index[0]
+        rows = _normalize_rows(index, self._len_along_dim0)
+        result = self._get_rows(rows.reshape(-1)).reshape(rows.shape)
+        if out is None:
+            return result
+        out.copy_(result)
+        return out
+
+    def _get_rows(self, rows: torch.Tensor) -> TensorDictBase | torch.Tensor:
+        slots = self._slot_of_row[rows]
+        hit = slots >= 0
+        num_hits = int(hit.sum())
+        self._hits += num_hits
+        self._misses += rows.numel() - num_hits
+        hot = self._hot_storage._storage
+        if num_hits == rows.numel():
+            self._touch(slots)
+            return hot[slots]
+        result = _empty_batch(hot, rows.numel())
+        if num_hits:
+            result[hit] = hot[slots[hit]]
+            self._touch(slots[hit])
+        cold_rows, inverse = torch.unique(rows[~hit], return_inverse=True)
+        cold_data = self._read_cold(cold_rows)
+        result[~hit] = cold_data[inverse]
+        self._admit(cold_rows, cold_data, written=False)
+        return result
+
+    def _empty(self):
+        super()._empty()
+        self._reset_hot_tier()
+
+    def load_state_dict(self, state_dict):
+        super().load_state_dict(state_dict)
+        self._reset_hot_tier()
+
+    def loads(self, path, *, in_place: bool = False):
+        super().loads(path, in_place=in_place)
+        self._reset_hot_tier()
+
+    def __getstate__(self):
+        if get_spawning_popen() is not None:
+            raise RuntimeError(
+                f"Cannot share a storage of type {type(self)} between processes."
+            )
+        return super().__getstate__()
+
+
+def _zstd_codec():
+    if sys.version_info >= (3, 14):
+        from compression import zstd
+
+        def compress(data, level):
+            return zstd.compress(data, level=level)
+
+        return compress, zstd.decompress
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "The 'zstd' codec requires python >= 3.14 or the zstandard library. "
+            "Install it with `pip install zstandard`."
+        )
+
+    def compress(data, level):
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def decompress(data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return compress, decompress
+
+
+def _lz4_codec():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError(
+            "The 'lz4' codec requires the lz4 library. Install it with `pip install lz4`."
+        )
+
+    def compress(data, level):
+        return lz4.frame.compress(data, compression_level=level)
+
+    return compress, lz4.frame.decompress
+
+
+def _zlib_codec():
+    import zlib
+
+    def compress(data, level):
+        return zlib.compress(data, level=level)
+
+    return compress, zlib.decompress
+
+
+def _raw_codec():
+    def compress(data, level):
+        return bytes(data)
+
+    def decompress(data):
+        return data
+
+    return compress, decompress
+
+
+# Maps a codec name to a function returning its (compress, decompress) pair.
+# compress(buffer, level) -> bytes and decompress(buffer) -> bytes-like.
+_CODECS = {
+    "zstd": _zstd_codec,
+    "lz4": _lz4_codec,
+    "zlib": _zlib_codec,
+    "raw": _raw_codec,
+}
+# The codecs that are available in every process
+_BUILTIN_CODECS = frozenset(_CODECS)
+
+
+def _compressed_signature(metadata: dict) -> tuple | None:
+    # The structure of a compressed item, or None if it contains non-tensor data
+    if metadata["type"] == "tensor":
+        return (metadata["shape"], metadata["dtype"], metadata["device"])
+    if metadata["type"] == "tensordict":
+        signature = []
+        for key, field in metadata["fields"].items():
+            if field["type"] != "tensor":
+                return None
+            signature.append((key, field["shape"], field["dtype"], field["device"]))
+        return tuple(signature)
+    return None
+
+
+def _tensor_buffer(tensor: torch.Tensor) -> np.ndarray:
+    # A uint8 array sharing the memory of a contiguous cpu copy of the tensor
+    tensor = tensor.detach().cpu().contiguous().reshape(-1)
+    return tensor.view(torch.uint8).numpy()
+
 
 class CompressedListStorage(ListStorage):
     """A storage that compresses and decompresses data.
@@ -1409,11 +2350,25 @@ class CompressedListStorage(ListStorage):
         max_size (int): size of the storage, i.e. maximum number of elements stored
             in the buffer.
         compression_fn (callable, optional): function to compress data. Should take
-            a tensor and return a compressed byte tensor. Defaults to zstd compression.
+            a tensor and return a compressed byte tensor. Defaults to compression with ``codec``.
         decompression_fn (callable, optional): function to decompress data. Should take
-            a compressed byte tensor and return the original tensor. Defaults to zstd decompression.
+            a compressed byte tensor and return the original tensor. Defaults to decompression with ``codec``.
         compression_level (int, optional): compression level (1-22 for zstd) when using the default compression function.
             Defaults to 3.
+        codec (str, optional): the name of the codec used by the default compression
+            functions. One of ``"zstd"``, ``"lz4"``, ``"zlib"``, ``"raw"`` (no compression)
+            or any codec added with :meth:`register_codec`.
+            Defaults to ``"zstd"`` on python >= 3.14 and ``"zlib"`` otherwise.
+        num_threads (int, optional): number of threads used to compress and
+            decompress the elements of a batch in parallel. The codecs release the GIL,
+            such that (de)compression runs concurrently. ``0`` or ``1`` processes
+            the elements sequentially. Defaults to ``min(os.cpu_count(), 8)``.
+        stack_reads (bool, optional): if ``True``, the elements read with a list or
+            tensor of indices that share the same shapes and dtypes are
+            decompressed directly in a pre-allocated contiguous tensor (or
+            tensordict), which is returned instead of a list of elements. This
+            requires the default compression functions. Elements of different
+            structures are still returned as a list. Defaults to ``False``.
         device (torch.device, optional): device where the sampled tensors will be
             stored and sent. Default is :obj:`torch.device("cpu")`.
         compilable (bool, optional): whether the storage is compilable.
@@ -1449,11 +2404,27 @@ class CompressedListStorage(ListStorage):
         compression_fn: Callable | None = None,
         decompression_fn: Callable | None = None,
         compression_level: int = 3,
+        codec: str | None = None,
+        num_threads: int | None = None,
+        stack_reads: bool = False,
         device: torch.device = "cpu",
         compilable: bool = False,
     ):
         super().__init__(max_size, compilable=compilable, device=device)
         self.compression_level = compression_level
+        self.stack_reads = stack_reads
+        if codec is None:
+            codec = "zstd" if sys.version_info >= (3, 14) else "zlib"
+        if codec not in _CODECS:
+            raise ValueError(
+                f"Unknown codec {codec}. Registered codecs are {list(_CODECS)}."
+            )
+        self.codec = codec
+        self._compress_fn, self._decompress_fn = _CODECS[codec]()
+        if num_threads is None:
+            num_threads = min(os.cpu_count(), 8)
+        self.num_threads = num_threads
+        self._executor = None
 
         # Set up compression functions
         if compression_fn is None:
@@ -1470,55 +2441,59 @@ class CompressedListStorage(ListStorage):
         self._storage = []
         self._metadata = []  # Store shape, dtype, device info for each item
 
-    def _default_compression_fn(self, tensor: torch.Tensor) -> torch.Tensor:
-        """Default compression using zstd."""
-        if sys.version_info >= (3, 14):
-            from compression import zstd
-
-            compressor_fn = zstd.compress
-
-        else:
-            import zlib
-
-            compressor_fn = zlib.compress
+    @classmethod
+    def register_codec(
+        cls,
+        name: str,
+        compress: Callable[[Any, int], bytes],
+        decompress: Callable[[Any], Any],
+    ) -> None:
+        """Registers a codec that can be selected with the ``codec`` argument.
 
-        # Convert tensor to bytes
-        tensor_bytes = self.to_bytestream(tensor)
+        Args:
+            name (str): the name of the codec.
+            compress (callable): a function taking a bytes-like object and a
+                compression level and returning the compressed bytes.
+            decompress (callable): a function taking a bytes-like object and
+                returning the decompressed bytes-like object.
 
-        # Compress with zstd
-        compressed_bytes = compressor_fn(tensor_bytes, level=self.compression_level)
+        """
+        _CODECS[name] = lambda: (compress, decompress)
 
-        # Convert to tensor
+    def _default_compression_fn(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Default compression using the storage codec."""
+        compressed_bytes = self._compress_fn(
+            _tensor_buffer(tensor), self.compression_level
+        )
+        if not len(compressed_bytes):
+            return torch.empty(0, dtype=torch.uint8)
         return torch.frombuffer(bytearray(compressed_bytes), dtype=torch.uint8)
 
     def _default_decompression_fn(
         self, compressed_tensor: torch.Tensor, metadata: dict
     ) -> torch.Tensor:
-        """Default decompression using zstd."""
-        if sys.version_info >= (3, 14):
-            from compression import zstd
-
-            decompressor_fn = zstd.decompress
-
-        else:
-            import zlib
+        """Default decompression using the storage codec."""
+        tensor = torch.empty(metadata["shape"], dtype=metadata["dtype"])
+        self._decompress_into(compressed_tensor, tensor)
+        return tensor.to(metadata["device"])
 
-            decompressor_fn = zlib.decompress
-
-        # Convert tensor to bytes
-        compressed_bytes = self.to_bytestream(compressed_tensor.cpu())
-
-        # Decompress with zstd
-        decompressed_bytes = decompressor_fn(compressed_bytes)
-
-        # Convert back to tensor
-        tensor = torch.frombuffer(
-            bytearray(decompressed_bytes), dtype=metadata["dtype"]
-        )
-        tensor = tensor.reshape(metadata["shape"])
-        tensor = tensor.to(metadata["device"])
+    def _decompress_into(
+        self, compressed_tensor: torch.Tensor, out: torch.Tensor
+    ) -> None:
+        # Decompresses the bytes straight into a contiguous cpu tensor
+        decompressed = self._decompress_fn(_tensor_buffer(compressed_tensor))
+        if out.numel():
+            out.reshape(-1).view(torch.uint8).numpy()[:] = np.frombuffer(
+                decompressed, dtype=np.uint8
+            )
 
-        return tensor
+    def _map(self, fn: Callable, items: list) -> list:
+        # Applies fn to the items, in parallel if the storage has several threads
+        if self.num_threads <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        return list(self._executor.map(fn, items))
 
     def _compress_item(self, item: Any) -> tuple[torch.Tensor, dict]:
         """Compress a single item and return compressed data with metadata."""
@@ -1579,15 +2554,61 @@ class CompressedListStorage(ListStorage):
             # Return as-is for other types
             return metadata["value"]
 
+    def set(
+        self,
+        cursor: int | Sequence[int] | slice,
+        data: Any,
+        *,
+        set_cursor: bool = True,
+    ):
+        if (
+            isinstance(cursor, (INT_CLASSES, slice))
+            or (isinstance(cursor, (torch.Tensor, np.ndarray)) and cursor.ndim == 0)
+            or not isinstance(data, (torch.Tensor, TensorDictBase, list, tuple))
+        ):
+            return super().set(cursor, data, set_cursor=set_cursor)
+        # Batched write: the elements are compressed in parallel, then stored
+        if isinstance(cursor, (torch.Tensor, np.ndarray)):
+            cursor = cursor.tolist()
+        cursor = list(cursor)
+        if isinstance(data, (torch.Tensor, TensorDictBase)):
+            data = data.unbind(0)
+        if len(cursor) != len(data):
+            raise ValueError(
+                f"The cursor and data have different lengths: {len(cursor)} and {len(data)}."
+            )
+        length = len(self._storage)
+        for _cursor in cursor:
+            if _cursor > length:
+                raise RuntimeError(
+                    "Cannot append data located more than one item away from "
+                    f"the storage size: the storage size is {length} "
+                    f"and the index of the item to be set is {_cursor}."
+                )
+            if _cursor >= self.max_size:
+                raise RuntimeError(
+                    f"Cannot append data to the list storage: "
+                    f"maximum capacity is {self.max_size} "
+                    f"and the index of the item to be set is {_cursor}."
+                )
+            length = max(length, _cursor + 1)
+        compressed = self._map(
+            lambda item: self._compress_item(self._to_device(item)), data
+        )
+        for _cursor, (compressed_data, metadata) in _zip_strict(cursor, compressed):
+            self._store_item(_cursor, compressed_data, metadata)
+
     def _set_item(self, cursor: int, data: Any) -> None:
         """Set a single item in the compressed storage."""
+        # Compress and store
+        compressed_data, metadata = self._compress_item(data)
+        self._store_item(cursor, compressed_data, metadata)
+
+    def _store_item(self, cursor: int, compressed_data: Any, metadata: dict) -> None:
         # Ensure we have enough space
         while len(self._storage) <= cursor:
             self._storage.append(None)
             self._metadata.append(None)
-
-        # Compress and store
-        compressed_data, metadata = self._compress_item(data)
         self._storage[cursor] = compressed_data
         self._metadata[cursor] = metadata
 
@@ -1620,17 +2641,83 @@ class CompressedListStorage(ListStorage):
                 results.append(self._get_item(i))
         return results
 
-    def _get_list(self, index: list) -> list:
-        """Get a list of items from the compressed storage."""
-        if isinstance(index, torch.Tensor) and index.device.type != "cpu":
+    def _get_list(self, index: list) -> list | torch.Tensor | TensorDictBase:
+        """Get a list of items from the compressed storage.
+
+        With ``stack_reads=True``, if the items are decompressed with the default
+        decompression function and share the same shapes and dtypes, they are
+        decompressed in a single pre-allocated tensor (or tensordict) which is
+        returned instead of a list.
+        """
+        if isinstance(index, torch.Tensor):
             index = index.cpu().tolist()
 
-        results = []
         for i in index:
             if i >= len(self._storage) or self._storage[i] is None:
                 raise IndexError(f"Index {i} out of bounds or not set")
-            results.append(self._get_item(i))
-        return results
+        if self.stack_reads and self.decompression_fn == self._default_decompression_fn:
+            result = self._get_batch(index)
+            if result is not None:
+                return result
+        return self._map(self._get_item, index)
+
+    def _get_batch(self, index: list) -> torch.Tensor | TensorDictBase | None:
+        # Decompresses the items in contiguous tensors. Returns None if the
+        # items do not share the same structure.
+        if not len(index):
+            return None
+        metadata = [self._metadata[i] for i in index]
+        signature = _compressed_signature(metadata[0])
+        if signature is None or any(
+            _compressed_signature(md) != signature for md in metadata[1:]
+        ):
+            return None
+        if metadata[0]["type"] == "tensor":
+            fields = {None: metadata[0]}
+        else:
+            fields = metadata[0]["fields"]
+        outputs = {
+            key: torch.empty((len(index), *md["shape"]), dtype=md["dtype"])
+            for key, md in fields.items()
+        }
+
+        def decompress(i):
+            compressed = self._storage[index[i]]
+            for key, out in outputs.items():
+                self._decompress_into(
+                    compressed if key is None else compressed[key], out[i]
+                )
+
+        self._map(decompress, range(len(index)))
+        outputs = {key: out.to(fields[key]["device"]) for key, out in outputs.items()}
+        if metadata[0]["type"] == "tensor":
+            return outputs[None]
+        return TensorDict(outputs, batch_size=[len(index)])
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        codec_fns = (state.pop("_compress_fn"), state.pop("_decompress_fn"))
+        state["_executor"] = None
+        if self.codec not in _BUILTIN_CODECS:
+            # Registered codecs only exist in the process that registered them:
+            # their functions are sent along with the storage.
+            try:
+                pickle.dumps(codec_fns)
+            except Exception as err:
+                raise RuntimeError(
+                    f"The functions of the codec {self.codec} cannot be pickled. "
+                    "Register module-level functions to use this storage in "
+                    "another process."
+                ) from err
+            state["_codec_fns"] = codec_fns
+        return state
+
+    def __setstate__(self, state):
+        codec_fns = state.pop("_codec_fns", None)
+        self.__dict__.update(state)
+        if codec_fns is None:
+            codec_fns = _CODECS[self.codec]()
+        self._compress_fn, self._decompress_fn = codec_fns
 
     def __len__(self) -> int:
         """Get the length of the compressed storage."""
@@ -1912,11 +2999,18 @@ def _collate_id(x):
     return x
 
 
+def _collate_compressed(x):
+    # CompressedListStorage returns batches of identical items already stacked
+    if isinstance(x, list):
+        return lazy_stack(x)
+    return x
+
+
 def _get_default_collate(storage, _is_tensordict=False):
     if isinstance(storage, (LazyStackStorage, TensorStorage)):
         return _collate_id
     elif isinstance(storage, CompressedListStorage):
-        return lazy_stack
+        return _collate_compressed
     elif isinstance(storage, (ListStorage, StorageEnsemble)):
         return _stack_anything
     else:
@@ -18,6 +18,7 @@ from typing import Any, Union
 import numpy as np
 import torch
 from tensordict import (
+    is_tensor_collection,
     lazy_stack,
     MemoryMappedTensor,
     NonTensorData,
@@ -28,7 +29,7 @@ from tensordict import (
 from torch import Tensor
 from torch.nn import functional as F
 from torch.utils._pytree import LeafSpec, tree_flatten, tree_unflatten
-from torchrl._utils import implement_for, logger as torchrl_logger
+from torchrl._utils import _make_ordinal_device, implement_for, logger as torchrl_logger
 
 SINGLE_TENSOR_BUFFER_NAME = os.environ.get(
     "SINGLE_TENSOR_BUFFER_NAME", "_-single-tensor-_"
@@ -1040,3 +1041,420 @@ def _auto_device() -> torch.device:
     elif torch.mps.is_available():
         return torch.device("mps:0")
     return torch.device("cpu")
+
+
+class _TensorSegmentTree:
+    """A segment tree stored in a flat tensor.
+
+    This is the pure-torch counterpart of the C++ ``SegmentTree`` used by
+    :class:`~torchrl.data.replay_buffers.PrioritizedSampler`. It shares its memory
+    layout: the node ``i`` has children ``2 * i`` and ``2 * i + 1``, the root is
+    the node ``1`` and the leaves start at ``capacity``, the smallest power of
+    two greater than ``size``. Nodes are reduced in the same order as in the C++
+    implementation, so both trees produce identical values.
+
+    All the operations are vectorized over the batch and run on the device of
+    the tree, without any host synchronization, such that they can be used with
+    CUDA tensors and within :func:`~torch.compile`.
+
+    Args:
+        size (int): the number of leaves.
+        dtype (torch.dtype, optional): the dtype of the tree. Defaults to ``torch.float32``.
+        device (torch.device, optional): the device of the tree. Defaults to the default device.
+
+    """
+
+    def __init__(
+        self,
+        size: int,
+        dtype: torch.dtype = torch.float32,
+        device: torch.device | None = None,
+    ) -> None:
+        capacity = 1
+        while capacity <= size:
+            capacity <<= 1
+        self.size = size
+        self.capacity = capacity
+        self.values = torch.full(
+            (2 * capacity,), self._identity(dtype), dtype=dtype, device=device
+        )
+
+    @staticmethod
+    def _identity(dtype: torch.dtype) -> float:
+        raise NotImplementedError
+
+    @staticmethod
+    def _op(lhs: Tensor, rhs: Tensor) -> Tensor:
+        raise NotImplementedError
+
+    @property
+    def identity_element(self) -> float:
+        return self._identity(self.values.dtype)
+
+    @property
+    def device(self) -> torch.device:
+        return self.values.device
+
+    def to(self, device: torch.device) -> _TensorSegmentTree:
+        self.values = self.values.to(device)
+        return self
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int | Tensor) -> Tensor:
+        index = torch.as_tensor(index, dtype=torch.long, device=self.values.device)
+        return self.values[index | self.capacity]
+
+    def __setitem__(self, index: int | Tensor, value: float | Tensor) -> None:
+        self.update(index, value)
+
+    def at(self, index: int | Tensor) -> Tensor:
+        return self[index]
+
+    def update(self, index: int | Tensor, value: float | Tensor) -> None:
+        """Sets the leaves at ``index`` to ``value`` and refreshes their ancestors.
+
+        Like in the C++ tree, the last value is kept for duplicated indices.
+        Negative indices are ignored.
+        """
+        values = self.values
+        index = torch.as_tensor(index, dtype=torch.long, device=values.device)
+        index = index.reshape(-1)
+        value = torch.as_tensor(value, dtype=values.dtype, device=values.device)
+        value = value.reshape(-1).expand(index.shape)
+        # Sort the leaves such that the last write of a duplicated index can be
+        # identified. The other writes are routed to the unused node 0, which
+        # keeps the shapes static.
+        index, order = torch.sort(index, stable=True)
+        value = value[order]
+        is_last = torch.ones_like(index, dtype=torch.bool)
+        is_last[:-1] = index[1:] != index[:-1]
+        node = torch.where(is_last & (index >= 0), index | self.capacity, 0)
+        values[node] = value
+        # Refresh the ancestors level by level. Siblings share their parent,
+        # which is then written several times with the same value.
+        for _ in range(self.capacity.bit_length() - 1):
+            node = node >> 1
+            values[node] = self._op(values[node << 1], values[(node << 1) | 1])
+
+    def load_leaves(self, leaves: Tensor) -> None:
+        """Sets all the leaves at once and rebuilds the tree bottom-up, level by level."""
+        values = self.values
+        values[self.capacity : self.capacity + self.size] = leaves.to(values)
+        lo = self.capacity
+        while lo > 1:
+            lo >>= 1
+            values[lo : 2 * lo] = self._op(
+                values[2 * lo : 4 * lo : 2], values[2 * lo + 1 : 4 * lo : 2]
+            )
+
+    def query(self, l: int, r: int) -> Tensor:  # noqa: E741
+        """Reduces the leaves in the range ``[l, r)``."""
+        values = self.values
+        if l <= 0 and r >= self.size:
+            return values[1].clone()
+        ret = torch.full(
+            (), self.identity_element, dtype=values.dtype, device=values.device
+        )
+        l |= self.capacity  # noqa: E741
+        r |= self.capacity
+        while l < r:
+            if l & 1:
+                ret = self._op(ret, values[l])
+                l += 1  # noqa: E741
+            if r & 1:
+                r -= 1
+                ret = self._op(ret, values[r])
+            l >>= 1  # noqa: E741
+            r >>= 1
+        return ret
+
+
+class _TensorSumSegmentTree(_TensorSegmentTree):
+    """A sum segment tree stored in a flat tensor.
+
+    See :class:`~torchrl.data.replay_buffers.utils._TensorSegmentTree` for more info.
+    """
+
+    @staticmethod
+    def _identity(dtype: torch.dtype) -> float:
+        return 0.0
+
+    @staticmethod
+    def _op(lhs: Tensor, rhs: Tensor) -> Tensor:
+        return lhs + rhs
+
+    def scan_lower_bound(self, value: float | Tensor) -> Tensor:
+        """Gets the first index where the prefix sum is not less than value.
+
+        ``size`` is returned for the values exceeding the total sum.
+        """
+        values = self.values
+        value = torch.as_tensor(value, dtype=values.dtype, device=values.device)
+        current = value
+        index = torch.ones_like(value, dtype=torch.long)
+        for _ in range(self.capacity.bit_length() - 1):
+            index = index << 1
+            lvalue = values[index]
+            go_right = current > lvalue
+            current = torch.where(go_right, current - lvalue, current)
+            index = index | go_right.long()
+        return torch.where(value > values[1], self.size, index ^ self.capacity)
+
+    def last_nonzero(self, index: Tensor) -> Tensor:
+        """Gets, for each index, the last index at or before it with a non-zero leaf.
+
+        ``-1`` is returned when all the leaves up to the index are zero.
+        """
+        values = self.values
+        capacity = self.capacity
+        depth = capacity.bit_length() - 1
+        node = torch.as_tensor(index, dtype=torch.long, device=values.device)
+        node = node | capacity
+        found = values[node] != 0
+        target = torch.where(found, node, 0)
+        # Climb until a left sibling holds some mass...
+        for _ in range(depth):
+            left = (node & 1).bool() & (values[node ^ 1] != 0) & ~found
+            target = torch.where(left, node ^ 1, target)
+            found = found | left
+            node = node >> 1
+        # ...and descend to its rightmost non-zero leaf.
+        for _ in range(depth):
+            parent = torch.where(target < capacity, target, 0)
+            child = (parent << 1) | (values[(parent << 1) | 1] != 0).long()
+            target = torch.where(target < capacity, child, target)
+        return torch.where(found, target ^ capacity, -1)
+
+
+class _TensorMinSegmentTree(_TensorSegmentTree):
+    """A min segment tree stored in a flat tensor.
+
+    See :class:`~torchrl.data.replay_buffers.utils._TensorSegmentTree` for more info.
+    """
+
+    @staticmethod
+    def _identity(dtype: torch.dtype) -> float:
+        return torch.finfo(dtype).max
+
+    @staticmethod
+    def _op(lhs: Tensor, rhs: Tensor) -> Tensor:
+        return torch.minimum(lhs, rhs)
+
+    def argmin(self) -> Tensor:
+        """Gets the index of the smallest leaf (the first one in case of ties)."""
+        values = self.values
+        index = torch.ones((), dtype=torch.long, device=values.device)
+        for _ in range(self.capacity.bit_length() - 1):
+            index = index << 1
+            index = index | (values[index | 1] < values[index]).long()
+        return index ^ self.capacity
+
+
+def _batch_signature(data: Tensor | TensorDictBase) -> tuple:
+    if is_tensor_collection(data):
+        return (data.batch_size,) + tuple(
+            (key, val.shape, val.dtype)
+            for key, val in data.items(include_nested=True, leaves_only=True)
+        )
+    return (data.shape, data.dtype)
+
+
+def _empty_batch(
+    source: Tensor | TensorDictBase,
+    batch_size: int,
+    *,
+    device: torch.device | None = None,
+    pin_memory: bool = False,
+) -> Tensor | TensorDictBase:
+    """Allocates a batch of ``batch_size`` elements shaped like the elements of ``source``.
+
+    If no device is provided, each leaf is allocated on the device of its source.
+    """
+
+    def empty(tensor):
+        return torch.empty(
+            (batch_size, *tensor.shape[1:]),
+            dtype=tensor.dtype,
+            device=device if device is not None else tensor.device,
+            pin_memory=pin_memory,
+        )
+
+    if is_tensor_collection(source):
+        return source.apply(
+            empty,
+            batch_size=[batch_size, *source.batch_size[1:]],
+            device=device if device is not None else source.device,
+        )
+    return empty(source)
+
+
+def _index_select_into(
+    source: Tensor | TensorDictBase,
+    index: Tensor,
+    out: Tensor | TensorDictBase,
+) -> Tensor | TensorDictBase:
+    """Gathers ``source[index]`` along the first dimension in the pre-allocated ``out``."""
+    if is_tensor_collection(source):
+        if source.device is not None:
+            index = index.to(source.device)
+        for key, val in source.items(include_nested=True, leaves_only=True):
+            torch.index_select(val, 0, index.to(val.device), out=out.get(key))
+    else:
+        torch.index_select(source, 0, index.to(source.device), out=out)
+    return out
+
+
+def _normalize_rows(index, length: int) -> Tensor:
+    """Converts an index along the first dimension of a storage of ``length`` rows to a (cpu) tensor of non-negative rows."""
+    if isinstance(index, slice):
+        return torch.arange(*index.indices(length))
+    index = torch.as_tensor(index, device="cpu")
+    if index.dtype == torch.bool:
+        if index.shape != (length,):
+            raise IndexError(
+                f"Expected a boolean mask of shape {(length,)}, got {tuple(index.shape)}."
+            )
+        return index.nonzero().squeeze(-1)
+    if ((index < -length) | (index >= length)).any():
+        raise IndexError(
+            f"Index out of range for a storage with {length} elements: {index}."
+        )
+    return torch.where(index < 0, index + length, index).long()
+
+
+class _TransferStage:
+    """Output stage of a replay buffer, writing the batches in rotating pre-allocated buffers.
+
+    Samples are gathered in host buffers, which are pinned when the target
+    device is a CUDA device. They are then copied to device buffers with
+    non-blocking copies on a side stream. The current stream waits for the copy
+    before the batch is used, such that the transfer overlaps with the work
+    already queued for the previous batch.
+    On CPU, the host buffers are returned directly.
+
+    A buffer is reused ``num_buffers`` batches later: batches must be consumed
+    (or cloned) before then.
+    """
+
+    def __init__(self, device: torch.device, num_buffers: int = 2):
+        if num_buffers < 1:
+            raise ValueError(f"num_buffers must be at least 1, got {num_buffers}.")
+        self.device = _make_ordinal_device(torch.device(device))
+        if self.device.type not in ("cpu", "cuda"):
+            raise ValueError(
+                f"Only cpu and cuda devices are supported, got {self.device}."
+            )
+        self.num_buffers = num_buffers
+        self._reset()
+
+    def _reset(self) -> None:
+        num_buffers = self.num_buffers
+        self._host = [None] * num_buffers
+        self._host_keys = [None] * num_buffers
+        self._device = [None] * num_buffers
+        self._device_keys = [None] * num_buffers
+        self._copy_events = [None] * num_buffers
+        self._release_events = [None] * num_buffers
+        self._cursor = 0
+        self._last_slot = None
+        self._stream = None
+
+    @property
+    def _is_cuda(self) -> bool:
+        return self.device.type == "cuda"
+
+    def __getstate__(self):
+        # buffers, streams and events are re-created lazily
+        return {"device": self.device, "num_buffers": self.num_buffers}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def acquire(self) -> int:
+        """Returns the slot of the next batch and releases the previous one."""
+        if self._is_cuda and self._last_slot is not None:
+            # Everything queued so far may use the previous batch: its device
+            # buffer cannot be overwritten before this work is done.
+            event = self._release_events[self._last_slot]
+            if event is None:
+                event = self._release_events[self._last_slot] = torch.cuda.Event()
+            event.record(torch.cuda.current_stream(self.device))
+        slot = self._cursor
+        self._cursor = (slot + 1) % self.num_buffers
+        self._last_slot = slot
+        # The host buffer may still be read by a pending copy
+        event = self._copy_events[slot]
+        if event is not None:
+            event.synchronize()
+        return slot
+
+    def _host_buffer(self, slot: int, key: tuple, source, batch_size: int):
+        if self._host_keys[slot] != key:
+            self._host[slot] = _empty_batch(
+                source, batch_size, device=torch.device("cpu"), pin_memory=self._is_cuda
+            )
+            self._host_keys[slot] = key
+        return self._host[slot]
+
+    def gather(self, slot: int, storage, index: Tensor):
+        """Gathers ``storage[index]`` in the host buffer of ``slot``.
+
+        Falls back on ``storage.get(index)`` when the storage content cannot be
+        indexed in place.
+        """
+        source = getattr(storage, "_storage", None)
+        if isinstance(index, tuple) and len(index) == 1:
+            index = index[0]
+        if (
+            isinstance(index, Tensor)
+            and index.ndim == 1
+            and getattr(storage, "ndim", 1) == 1
+            and isinstance(source, (Tensor, TensorDict))
+            and source.device == torch.device("cpu")
+        ):
+            key = (id(source), index.numel())
+            out = self._host_buffer(slot, key, source, index.numel())
+            return storage.get(index, out=out)
+        return storage.get(index)
+
+    def transfer(self, slot: int, data: Tensor | TensorDictBase):
+        """Moves ``data`` to the device buffer of ``slot``."""
+        if not isinstance(data, Tensor) and not is_tensor_collection(data):
+            raise RuntimeError(
+                f"Cannot transfer a batch of type {type(data)} to pre-allocated buffers."
+            )
+        host = self._host[slot]
+        if data is not host:
+            if data.device == self.device:
+                return data
+            if not self._is_cuda:
+                # the data was not gathered in our buffers (e.g., it was
+                # transformed): copying it would not save any allocation
+                return data
+            key = _batch_signature(data)
+            host = self._host_buffer(slot, key, data, data.shape[0])
+            host.copy_(data)
+        if not self._is_cuda:
+            return host.copy() if is_tensor_collection(host) else host
+
+        key = _batch_signature(host)
+        if self._device_keys[slot] != key:
+            self._device[slot] = _empty_batch(host, host.shape[0], device=self.device)
+            self._device_keys[slot] = key
+        out = self._device[slot]
+        if self._stream is None:
+            self._stream = torch.cuda.Stream(self.device)
+        release_event = self._release_events[slot]
+        if release_event is not None:
+            self._stream.wait_event(release_event)
+        with torch.cuda.stream(self._stream):
+            out.copy_(host, non_blocking=True)
+            copy_event = self._copy_events[slot]
+            if copy_event is None:
+                copy_event = self._copy_events[slot] = torch.cuda.Event()
+            copy_event.record(self._stream)
+        torch.cuda.current_stream(self.device).wait_event(copy_event)
+        return out.copy() if is_tensor_collection(out) else out
@@ -16,9 +16,15 @@ from typing import Any
 
 import numpy as np
 import torch
-from tensordict import is_tensor_collection, MemoryMappedTensor, TensorDictBase
-from tensordict.utils import expand_as_right, is_tensorclass
+from tensordict import (
+    is_tensor_collection,
+    MemoryMappedTensor,
+    TensorDict,
+    TensorDictBase,
+)
+from tensordict.utils import expand_as_right, is_tensorclass, NestedKey
 from torch import multiprocessing as mp
+from torch.utils._pytree import tree_map
 from torchrl._utils import _STRDTYPE2DTYPE
 
 try:
@@ -37,7 +43,7 @@ except ImportError:
 
 
 from torchrl.data.replay_buffers.storages import Storage
-from torchrl.data.replay_buffers.utils import _is_int, _reduce
+from torchrl.data.replay_buffers.utils import _is_int, _reduce, _TensorMinSegmentTree
 
 
 class Writer(ABC):
@@ -152,12 +158,33 @@ class RoundRobinWriter(Writer):
             If ``True``, the writer cannot be shared between multiple processes.
             Defaults to ``False``.
 
+    Keyword Args:
+        lock_free (bool, optional): if ``True``, writers and samplers of a shared
+            buffer do not serialize on the buffer lock. Each extension reserves
+            its rows with a short atomic update of the cursor, and the rows are
+            protected by a per-row sequence counter (a seqlock): the counter is
+            odd while a row is being written and is increased to an even value
+            once the write is committed. Readers wait for the rows they sampled
+            to be committed and read again the rows that were modified during
+            the read, such that no partially written item is ever returned.
+            The storage must be a :class:`~torchrl.data.replay_buffers.TensorStorage`
+            with a single dimension. The write count of a lock-free writer is
+            always reset when the buffer is emptied. Defaults to ``False``.
+
     """
 
-    def __init__(self, compilable: bool = False) -> None:
+    def __init__(self, compilable: bool = False, *, lock_free: bool = False) -> None:
+        if lock_free and compilable:
+            raise ValueError("A lock-free writer cannot be compilable.")
         super().__init__(compilable=compilable)
+        self.lock_free = lock_free
         self._cursor = 0
 
+    def register_storage(self, storage: Storage) -> None:
+        super().register_storage(storage)
+        if self.lock_free:
+            storage._enable_seqlock()
+
     def dumps(self, path):
         path = Path(path).absolute()
         path.mkdir(exist_ok=True)
@@ -171,6 +198,12 @@ class RoundRobinWriter(Writer):
             self._cursor = metadata["cursor"]
 
     def add(self, data: Any) -> int | torch.Tensor:
+        if self.lock_free:
+            position = self._reserve(1, self._storage.max_size)
+            index = int(position) % self._storage.max_size
+            self._storage._seqlock_set(index, data, position)
+            self._mark_update_entities(index)
+            return index
         index = self._cursor
         _cursor = self._cursor
         # we need to update the cursor first to avoid race conditions between workers
@@ -196,6 +229,13 @@ class RoundRobinWriter(Writer):
         if batch_size == 0:
             raise RuntimeError(f"Expected at least one element in extend. Got {data=}")
         device = data.device if hasattr(data, "device") else None
+        if self.lock_free:
+            position = self._reserve(batch_size, self._storage.max_size)
+            index = position % self._storage.max_size
+            self._storage._seqlock_set(index, data, position)
+            index = index.to(device)
+            self._mark_update_entities(index)
+            return index
         max_size_along0 = self._storage._max_size_along_dim0(batched_data=data)
         index = (
             torch.arange(
@@ -213,6 +253,24 @@ class RoundRobinWriter(Writer):
         self._mark_update_entities(index)
         return index
 
+    def _reserve(self, batch_size: int, max_size: int) -> torch.Tensor:
+        # Atomically reserves batch_size rows and returns their absolute write
+        # positions (i.e., not wrapped around the storage capacity).
+        if batch_size > max_size:
+            raise RuntimeError(
+                f"Cannot write {batch_size} elements at once in a storage of "
+                f"capacity {max_size} with a lock-free writer."
+            )
+        _cursor_value = self.__dict__.get("_cursor_value", None)
+        if _cursor_value is None:
+            self._cursor = 0
+            _cursor_value = self._cursor_value
+        with _cursor_value.get_lock():
+            start = self._write_count
+            self._write_count = start + batch_size
+            _cursor_value.value = (start + batch_size) % max_size
+        return torch.arange(start, start + batch_size)
+
     def state_dict(self) -> dict[str, Any]:
         return {"_cursor": self._cursor}
 
@@ -221,7 +279,9 @@ class RoundRobinWriter(Writer):
 
     def _empty(self, empty_write_count: bool = True) -> None:
         self._cursor = 0
-        if empty_write_count:
+        # lock-free writers derive the rows (and their pass over the storage)
+        # from the write count, which must restart from 0 with the storage
+        if empty_write_count or self.lock_free:
             self._write_count = 0
 
     # TODO: Workaround for PyTorch nightly regression where compiler can't handle
@@ -259,7 +319,7 @@ class RoundRobinWriter(Writer):
         _write_count = self.__dict__.get("_write_count_value", None)
         if not self._compilable:
             if _write_count is None:
-                _write_count = self._write_count_value = mp.Value("i", 0)
+                _write_count = self._write_count_value = mp.Value("q", 0)
             return _write_count.value
         else:
             if _write_count is None:
@@ -271,7 +331,7 @@ class RoundRobinWriter(Writer):
         if not self._compilable:
             _write_count = self.__dict__.get("_write_count_value", None)
             if _write_count is None:
-                _write_count = self._write_count_value = mp.Value("i", 0)
+                _write_count = self._write_count_value = mp.Value("q", 0)
             _write_count.value = value
         else:
             self._write_count_value = value
@@ -302,11 +362,15 @@ class TensorDictRoundRobinWriter(RoundRobinWriter):
     """A RoundRobin Writer class for composable, tensordict-based replay buffers."""
 
     def add(self, data: Any) -> int | torch.Tensor:
-        index = self._cursor
-        # we need to update the cursor first to avoid race conditions between workers
-        max_size_along_dim0 = self._storage._max_size_along_dim0(single_data=data)
-        self._cursor = (index + 1) % max_size_along_dim0
-        self._write_count += 1
+        if self.lock_free:
+            position = self._reserve(1, self._storage.max_size)
+            index = int(position) % self._storage.max_size
+        else:
+            index = self._cursor
+            # we need to update the cursor first to avoid race conditions between workers
+            max_size_along_dim0 = self._storage._max_size_along_dim0(single_data=data)
+            self._cursor = (index + 1) % max_size_along_dim0
+            self._write_count += 1
         if not is_tensorclass(data):
             data.set(
                 "index",
@@ -314,25 +378,32 @@ class TensorDictRoundRobinWriter(RoundRobinWriter):
                     torch.as_tensor(index, device=data.device, dtype=torch.long), data
                 ),
             )
-        self._storage.set(index, data)
+        if self.lock_free:
+            self._storage._seqlock_set(index, data, position)
+        else:
+            self._storage.set(index, data)
         index = self._replicate_index(index)
         self._mark_update_entities(index)
         return index
 
     def extend(self, data: Sequence) -> torch.Tensor:
-        cur_size = self._cursor
         batch_size = len(data)
         device = data.device if hasattr(data, "device") else None
-        max_size_along_dim0 = self._storage._max_size_along_dim0(batched_data=data)
-        index = (
-            torch.arange(
-                cur_size, batch_size + cur_size, dtype=torch.long, device=device
+        if self.lock_free:
+            position = self._reserve(batch_size, self._storage.max_size)
+            index = (position % self._storage.max_size).to(device)
+        else:
+            cur_size = self._cursor
+            max_size_along_dim0 = self._storage._max_size_along_dim0(batched_data=data)
+            index = (
+                torch.arange(
+                    cur_size, batch_size + cur_size, dtype=torch.long, device=device
+                )
+                % max_size_along_dim0
             )
-            % max_size_along_dim0
-        )
-        # we need to update the cursor first to avoid race conditions between workers
-        self._cursor = (batch_size + cur_size) % max_size_along_dim0
-        self._write_count += batch_size
+            # we need to update the cursor first to avoid race conditions between workers
+            self._cursor = (batch_size + cur_size) % max_size_along_dim0
+            self._write_count += batch_size
         # storage must convert the data to the appropriate format if needed
         if not is_tensorclass(data):
             data.set(
@@ -343,7 +414,10 @@ class TensorDictRoundRobinWriter(RoundRobinWriter):
             )
         # Replicate index requires the shape of the storage to be known
         # Other than that, a "flat" (1d) index is ok to write the data
-        self._storage.set(index, data)
+        if self.lock_free:
+            self._storage._seqlock_set(index, data, position)
+        else:
+            self._storage.set(index, data)
         index = self._replicate_index(index)
         self._mark_update_entities(index)
         return index
@@ -654,6 +728,539 @@ class TensorDictMaxValueWriter(Writer):
         return f"{self.__class__.__name__}(cursor={int(self._cursor)}, full_storage={self._storage._is_full}, rank_key={self._rank_key}, reduction={self._reduction})"
 
 
+class _ReplacementWriter(Writer):
+    """Base class of the writers that choose which elements of a full storage are replaced."""
+
+    def register_storage(self, storage: Storage) -> None:
+        if storage.ndim > 1:
+            raise ValueError(
+                f"{type(self).__name__} is not compatible with storages with more than one dimension."
+            )
+        return super().register_storage(storage)
+
+    @property
+    def _write_count(self):
+        _write_count = self.__dict__.get("_write_count_value", None)
+        if not self._compilable:
+            if _write_count is None:
+                _write_count = self._write_count_value = mp.Value("q", 0)
+            return _write_count.value
+        else:
+            if _write_count is None:
+                _write_count = self._write_count_value = 0
+            return _write_count
+
+    @_write_count.setter
+    def _write_count(self, value):
+        if not self._compilable:
+            _write_count = self.__dict__.get("_write_count_value", None)
+            if _write_count is None:
+                _write_count = self._write_count_value = mp.Value("q", 0)
+            _write_count.value = value
+        else:
+            self._write_count_value = value
+
+    @compile_disable()
+    def _mark_update_entities(self, index: torch.Tensor) -> None:
+        """Mark entities as updated with the given index."""
+        for ent in self._storage._attached_entities_iter():
+            ent.mark_update(index)
+
+
+class PriorityEvictionWriter(_ReplacementWriter):
+    """A writer that replaces the elements with the lowest priority once the storage is full.
+
+    Until the storage is full, the data is written in order. Then, instead of
+    overwriting the oldest elements like :class:`~torchrl.data.replay_buffers.RoundRobinWriter`,
+    each batch replaces the elements with the lowest priority according to the
+    min-tree of the :class:`~torchrl.data.replay_buffers.PrioritizedSampler` of
+    the replay buffer. Rare, high-priority elements are therefore kept in the
+    buffer for as long as their priority is not updated to a lower value.
+    The elements with the lowest priority are found by descending the min-tree
+    for small batches, and with a single scan of the priorities of all the
+    elements for large batches (or on the device of the trees with
+    ``backend="torch"``).
+
+    The elements written are given the default priority of the sampler (the
+    maximum priority seen so far), such that they can only be evicted once their
+    priority has been updated.
+
+    Args:
+        compilable (bool, optional): whether the writer is compilable.
+            If ``True``, the writer cannot be shared between multiple processes.
+            Defaults to ``False``.
+
+    .. note:: If a batch is larger than the storage, only its last elements are
+        written and the index of the others is ``-1``.
+
+    .. note:: This class isn't compatible with storages with more than one dimension.
+
+    Examples:
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import LazyTensorStorage, PriorityEvictionWriter, TensorDictReplayBuffer
+        >>> from torchrl.data.replay_buffers.samplers import PrioritizedSampler
+        >>> rb = TensorDictReplayBuffer(
+        ...     storage=LazyTensorStorage(10),
+        ...     sampler=PrioritizedSampler(10, alpha=1.0, beta=1.0),
+        ...     writer=PriorityEvictionWriter(),
+        ... )
+        >>> rb.extend(TensorDict({"obs": torch.arange(10)}, [10]))
+        >>> rb.update_priority(torch.arange(10), torch.arange(10) + 1.0)
+        >>> # the elements with the lowest priority are replaced
+        >>> rb.extend(TensorDict({"obs": torch.arange(10, 13)}, [3]))
+        tensor([0, 1, 2])
+        >>> rb[:]["obs"]
+        tensor([10, 11, 12,  3,  4,  5,  6,  7,  8,  9])
+
+    """
+
+    def __init__(self, compilable: bool = False) -> None:
+        super().__init__(compilable=compilable)
+        self._cursor = 0
+
+    def _min_tree(self):
+        for entity in self._storage._attached_entities_iter():
+            sampler = getattr(entity, "_sampler", entity)
+            min_tree = getattr(sampler, "_min_tree", None)
+            if min_tree is not None:
+                return min_tree
+        raise RuntimeError(
+            f"{type(self).__name__} requires the storage to be attached to a "
+            "replay buffer with a PrioritizedSampler."
+        )
+
+    def _get_index(self, batch_size: int) -> torch.Tensor:
+        # Returns the indices where the last elements of the batch are written:
+        # the free slots of the storage first, then the elements with the lowest
+        # priority. The returned tensor may be shorter than the batch if the
+        # batch is larger than the storage.
+        max_size = self._storage.max_size
+        num_stored = len(self._storage)
+        num_free = min(batch_size, max_size - num_stored)
+        index = torch.arange(num_stored, num_stored + num_free)
+        self._cursor = (num_stored + num_free) % max_size
+        num_evict = min(batch_size - num_free, num_stored)
+        if num_evict:
+            index = torch.cat([index, self._lowest_priority(num_evict, num_stored)])
+        return index
+
+    def _lowest_priority(self, num_evict: int, num_stored: int) -> torch.Tensor:
+        # Returns the (cpu) indices of the num_evict stored elements with the
+        # lowest priority.
+        min_tree = self._min_tree()
+        if isinstance(min_tree, _TensorMinSegmentTree):
+            # The leaves past the stored elements hold the identity element
+            if num_evict == 1:
+                return min_tree.argmin().reshape(1).cpu()
+            # The leaves are contiguous in the tree: they are selected at once on
+            # the device of the tree
+            leaves = min_tree.values[min_tree.capacity : min_tree.capacity + num_stored]
+            return torch.topk(leaves, num_evict, largest=False).indices.cpu()
+        depth = (num_stored - 1).bit_length()
+        if num_evict * depth * depth >= num_stored:
+            # Large batches: a single scan of the leaves is cheaper
+            priority = torch.as_tensor(min_tree[torch.arange(num_stored)])
+            return torch.topk(priority, num_evict, largest=False).indices
+        # Small batches: each element is found by descending the tree with range
+        # queries, and is excluded from the next descents until all are found
+        index, priority = [], []
+        for _ in range(num_evict):
+            lo, hi = 0, num_stored
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if min_tree.query(lo, mid) <= min_tree.query(mid, hi):
+                    hi = mid
+                else:
+                    lo = mid
+            index.append(lo)
+            priority.append(min_tree[lo])
+            min_tree[lo] = min_tree.identity_element
+        for i, p in zip(index, priority):
+            min_tree[i] = p
+        return torch.tensor(index, dtype=torch.long)
+
+    def add(self, data: Any) -> int:
+        index = int(self._get_index(1)[0])
+        self._storage.set(index, data)
+        self._write_count += 1
+        self._mark_update_entities(index)
+        return index
+
+    def extend(self, data: Sequence) -> torch.Tensor:
+        batch_size = len(data)
+        device = data.device if hasattr(data, "device") else None
+        index = self._get_index(batch_size)
+        num_dropped = batch_size - index.numel()
+        if num_dropped:
+            data = data[num_dropped:]
+        self._storage.set(index, data)
+        self._write_count += batch_size
+        # -1 will be interpreted as invalid by prioritized buffers
+        out_index = torch.full((batch_size,), -1, dtype=torch.long, device=device)
+        out_index[num_dropped:] = index.to(device)
+        self._mark_update_entities(out_index)
+        return out_index
+
+    def _empty(self, empty_write_count: bool = True) -> None:
+        self._cursor = 0
+        if empty_write_count:
+            self._write_count = 0
+
+    def dumps(self, path):
+        path = Path(path).absolute()
+        path.mkdir(exist_ok=True)
+        with open(path / "metadata.json", "w") as file:
+            json.dump({"cursor": self._cursor}, file)
+
+    def loads(self, path):
+        path = Path(path).absolute()
+        with open(path / "metadata.json") as file:
+            metadata = json.load(file)
+            self._cursor = metadata["cursor"]
+
+    def state_dict(self) -> dict[str, Any]:
+        return {"_cursor": self._cursor}
+
+    def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._cursor = state_dict["_cursor"]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(cursor={int(self._cursor)}, full_storage={self._storage._is_full})"
+
+
+class ReservoirWriter(_ReplacementWriter):
+    """A writer that keeps a uniform sample of all the elements ever written.
+
+    The storage is filled in order. Then, the ``n``-th element written
+    replaces a random element of the storage with probability ``max_size / n``
+    (reservoir sampling), such that the content of the buffer is a uniform
+    sample of all the data written so far, as opposed to the recency window of
+    :class:`~torchrl.data.replay_buffers.RoundRobinWriter`. This is usually
+    what is needed in lifelong and continual RL settings.
+
+    The replaced indices of a whole batch are drawn at once: the result is the
+    same as if the elements were written one at a time.
+
+    Args:
+        compilable (bool, optional): whether the writer is compilable.
+            If ``True``, the writer cannot be shared between multiple processes.
+            Defaults to ``False``.
+
+    .. note:: The index of the elements that are not written, or that are
+        overwritten by a later element of the same batch, is ``-1``.
+
+    .. note:: This class isn't compatible with storages with more than one dimension.
+
+    Examples:
+        >>> import torch
+        >>> from torchrl.data import LazyMemmapStorage, ReplayBuffer, ReservoirWriter
+        >>> rb = ReplayBuffer(storage=LazyMemmapStorage(100), writer=ReservoirWriter())
+        >>> for i in range(100):
+        ...     rb.extend(torch.arange(i * 100, (i + 1) * 100))
+        >>> len(rb), rb.write_count
+        (100, 10000)
+        >>> # the buffer content is spread over all the data written
+        >>> (rb[:] // 1000).unique().numel() > 5
+        True
+
+    """
+
+    def __init__(self, compilable: bool = False) -> None:
+        super().__init__(compilable=compilable)
+        self._num_seen = 0
+
+    def _get_index(self, batch_size: int) -> tuple[torch.Tensor, torch.Tensor]:
+        # Returns the position in the batch and in the storage of the elements
+        # that are written.
+        max_size = self._storage.max_size
+        position = torch.arange(self._num_seen, self._num_seen + batch_size)
+        self._num_seen += batch_size
+        draw = torch.rand(batch_size, generator=self._rng, dtype=torch.float64)
+        storage_index = torch.where(
+            position < max_size, position, (draw * (position + 1)).long()
+        )
+        data_index = (storage_index < max_size).nonzero().squeeze(-1)
+        storage_index = storage_index[data_index]
+        # a later element of the batch overwrites an earlier one
+        is_last = _is_last_write(storage_index)
+        return data_index[is_last], storage_index[is_last]
+
+    def add(self, data: Any) -> int:
+        _, storage_index = self._get_index(1)
+        self._write_count += 1
+        if not storage_index.numel():
+            return -1
+        index = int(storage_index[0])
+        self._storage.set(index, data)
+        self._mark_update_entities(index)
+        return index
+
+    def extend(self, data: Sequence) -> torch.Tensor:
+        batch_size = len(data)
+        device = data.device if hasattr(data, "device") else None
+        data_index, storage_index = self._get_index(batch_size)
+        if data_index.numel():
+            self._storage.set(storage_index, _take(data, data_index))
+        self._write_count += batch_size
+        # -1 will be interpreted as invalid by prioritized buffers
+        out_index = torch.full((batch_size,), -1, dtype=torch.long, device=device)
+        out_index[data_index.to(device)] = storage_index.to(device)
+        self._mark_update_entities(storage_index.to(device))
+        return out_index
+
+    def _empty(self, empty_write_count: bool = True) -> None:
+        self._num_seen = 0
+        if empty_write_count:
+            self._write_count = 0
+
+    def dumps(self, path):
+        path = Path(path).absolute()
+        path.mkdir(exist_ok=True)
+        with open(path / "metadata.json", "w") as file:
+            json.dump({"num_seen": self._num_seen}, file)
+
+    def loads(self, path):
+        path = Path(path).absolute()
+        with open(path / "metadata.json") as file:
+            metadata = json.load(file)
+            self._num_seen = metadata["num_seen"]
+
+    def state_dict(self) -> dict[str, Any]:
+        return {"_num_seen": self._num_seen}
+
+    def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._num_seen = state_dict["_num_seen"]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(num_seen={self._num_seen}, full_storage={self._storage._is_full})"
+
+
+class StratifiedWriter(_ReplacementWriter):
+    """A writer that gives an equal share of the storage to each stratum (e.g., each task) of the data.
+
+    Each stratum, identified by the integer value of ``stratum_key`` in the data,
+    owns at most ``max_size // num_strata`` elements of the storage. The elements
+    of a stratum are written in the next free slots of the storage until the
+    stratum is full, such that the written elements are always contiguous and
+    the writer can be used with any sampler. Then, the elements of a stratum
+    replace elements of the same stratum:
+
+    - with ``strategy="reservoir"``, the ``n``-th element of a stratum replaces
+      a random element of this stratum with probability ``quota / n``: each
+      stratum holds a uniform sample of all its data (see
+      :class:`~torchrl.data.replay_buffers.ReservoirWriter`);
+    - with ``strategy="round_robin"``, the oldest element of the stratum is replaced.
+
+    The indices of a whole batch are computed at once: the result is the same
+    as if the elements were written one at a time.
+
+    Args:
+        num_strata (int): the number of strata.
+        stratum_key (NestedKey, optional): the key of the stratum of each element
+            in the data. Defaults to ``"task_id"``.
+
+    Keyword Args:
+        strategy (str, optional): ``"reservoir"`` or ``"round_robin"``.
+            Defaults to ``"reservoir"``.
+        compilable (bool, optional): whether the writer is compilable.
+            If ``True``, the writer cannot be shared between multiple processes.
+            Defaults to ``False``.
+
+    .. note:: The index of the elements that are not written is ``-1``.
+
+    .. note:: This class isn't compatible with storages with more than one dimension.
+
+    Examples:
+        >>> import torch
+        >>> from tensordict import TensorDict
+        >>> from torchrl.data import LazyTensorStorage, StratifiedWriter, TensorDictReplayBuffer
+        >>> rb = TensorDictReplayBuffer(
+        ...     storage=LazyTensorStorage(100),
+        ...     writer=StratifiedWriter(num_strata=2),
+        ... )
+        >>> # a lot of data from the first task, then a little from the second
+        >>> rb.extend(TensorDict({"task_id": torch.zeros(1000, dtype=torch.long)}, [1000]))
+        >>> rb.extend(TensorDict({"task_id": torch.ones(10, dtype=torch.long)}, [10]))
+        >>> rb[:]["task_id"].bincount()
+        tensor([50, 10])
+
+    """
+
+    def __init__(
+        self,
+        num_strata: int,
+        stratum_key: NestedKey = "task_id",
+        *,
+        strategy: str = "reservoir",
+        compilable: bool = False,
+    ) -> None:
+        if strategy not in ("reservoir", "round_robin"):
+            raise ValueError(
+                f"Unknown strategy {strategy}, expected 'reservoir' or 'round_robin'."
+            )
+        super().__init__(compilable=compilable)
+        self.num_strata = num_strata
+        self.stratum_key = stratum_key
+        self.strategy = strategy
+        self._cursor = 0
+        self._num_seen = torch.zeros(num_strata, dtype=torch.long)
+        # the storage index of the elements of each stratum
+        self._rows = None
+
+    @property
+    def quota(self) -> int:
+        return self._storage.max_size // self.num_strata
+
+    def _get_index(
+        self, stratum: torch.Tensor
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        # Returns the position in the batch and in the storage of the elements
+        # written in new slots and of the elements replacing other ones.
+        quota = self.quota
+        if quota == 0:
+            raise RuntimeError(
+                f"The storage is too small to hold {self.num_strata} strata."
+            )
+        if self._rows is None:
+            self._rows = torch.full((self.num_strata, quota), -1, dtype=torch.long)
+        stratum = stratum.reshape(-1).long().cpu()
+        if ((stratum < 0) | (stratum >= self.num_strata)).any():
+            raise ValueError(
+                f"Expected strata between 0 and {self.num_strata - 1}, got {stratum.unique().tolist()}."
+            )
+        rank, counts = _rank_within_groups(stratum, self.num_strata)
+        # the position of each element in the stream of its stratum
+        position = self._num_seen[stratum] + rank
+        self._num_seen += counts
+        is_new = position < quota
+        new_index = is_new.nonzero().squeeze(-1)
+        new_rows = torch.arange(self._cursor, self._cursor + new_index.numel())
+        self._cursor += new_index.numel()
+        self._rows[stratum[new_index], position[new_index]] = new_rows
+
+        replace_index = (~is_new).nonzero().squeeze(-1)
+        position = position[replace_index]
+        if self.strategy == "reservoir":
+            draw = torch.rand(position.shape, generator=self._rng, dtype=torch.float64)
+            slot = (draw * (position + 1)).long()
+            keep = slot < quota
+            replace_index, slot = replace_index[keep], slot[keep]
+        else:
+            slot = position % quota
+        replace_rows = self._rows[stratum[replace_index], slot]
+        # a later element of the batch overwrites an earlier one
+        is_last = _is_last_write(replace_rows)
+        return new_index, new_rows, replace_index[is_last], replace_rows[is_last]
+
+    def _get_stratum(self, data: Any) -> torch.Tensor:
+        if not is_tensor_collection(data):
+            raise RuntimeError(
+                f"{type(self).__name__} expects data to be a tensor collection (tensordict or tensorclass). Found a {type(data)} instead."
+            )
+        return torch.as_tensor(data.get(self.stratum_key))
+
+    def add(self, data: Any) -> int:
+        index = self.extend(data.unsqueeze(0))
+        return int(index[0])
+
+    def extend(self, data: Sequence) -> torch.Tensor:
+        batch_size = len(data)
+        device = data.device if hasattr(data, "device") else None
+        new_index, new_rows, replace_index, replace_rows = self._get_index(
+            self._get_stratum(data)
+        )
+        # The new elements grow the storage. Replacements always come after the
+        # new elements they may overwrite in the batch.
+        if new_index.numel():
+            self._storage.set(new_rows, data[new_index])
+        if replace_index.numel():
+            self._storage.set(replace_rows, data[replace_index], set_cursor=False)
+        self._write_count += batch_size
+        # the new elements that are replaced within the batch are not stored
+        kept = _is_last_write(torch.cat([new_rows, replace_rows]))[: new_rows.numel()]
+        new_index, new_rows = new_index[kept], new_rows[kept]
+        out_index = torch.full((batch_size,), -1, dtype=torch.long, device=device)
+        out_index[new_index.to(device)] = new_rows.to(device)
+        out_index[replace_index.to(device)] = replace_rows.to(device)
+        self._mark_update_entities(torch.cat([new_rows, replace_rows]).to(device))
+        return out_index
+
+    def _empty(self, empty_write_count: bool = True) -> None:
+        self._cursor = 0
+        self._num_seen = torch.zeros(self.num_strata, dtype=torch.long)
+        self._rows = None
+        if empty_write_count:
+            self._write_count = 0
+
+    def dumps(self, path):
+        path = Path(path).absolute()
+        path.mkdir(exist_ok=True)
+        TensorDict(
+            {
+                key: val
+                for key, val in self.state_dict().items()
+                if isinstance(val, torch.Tensor)
+            }
+        ).memmap(path)
+        with open(path / "metadata.json", "w") as file:
+            json.dump({"cursor": self._cursor}, file)
+
+    def loads(self, path):
+        path = Path(path).absolute()
+        with open(path / "metadata.json") as file:
+            metadata = json.load(file)
+        state_dict = TensorDict.load_memmap(path).to_dict()
+        state_dict["_cursor"] = metadata["cursor"]
+        self.load_state_dict(state_dict)
+
+    def state_dict(self) -> dict[str, Any]:
+        state_dict = {"_cursor": self._cursor, "_num_seen": self._num_seen.clone()}
+        if self._rows is not None:
+            state_dict["_rows"] = self._rows.clone()
+        return state_dict
+
+    def load_state_dict(self, state_dict: dict[str, Any]) -> None:
+        self._cursor = state_dict["_cursor"]
+        self._num_seen = torch.as_tensor(state_dict["_num_seen"]).clone()
+        rows = state_dict.get("_rows")
+        self._rows = torch.as_tensor(rows).clone() if rows is not None else None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(num_strata={self.num_strata}, stratum_key={self.stratum_key}, strategy={self.strategy}, cursor={self._cursor})"
+
+
+def _is_last_write(index: torch.Tensor) -> torch.Tensor:
+    # Marks the last occurrence of each index.
+    sorted_index, order = torch.sort(index, stable=True)
+    is_last_sorted = torch.ones_like(sorted_index, dtype=torch.bool)
+    is_last_sorted[:-1] = sorted_index[1:] != sorted_index[:-1]
+    is_last = torch.empty_like(is_last_sorted)
+    is_last[order] = is_last_sorted
+    return is_last
+
+
+def _rank_within_groups(
+    group: torch.Tensor, num_groups: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # Returns the rank of each element among the elements of its group, in
+    # order of appearance, and the size of each group.
+    sorted_group, order = torch.sort(group, stable=True)
+    counts = torch.bincount(sorted_group, minlength=num_groups)
+    starts = torch.cumsum(counts, 0) - counts
+    rank = torch.empty_like(group)
+    rank[order] = torch.arange(group.numel()) - starts[sorted_group]
+    return rank, counts
+
+
+def _take(data: Any, index: torch.Tensor) -> Any:
+    if is_tensor_collection(data) or isinstance(data, torch.Tensor):
+        return data[index]
+    if isinstance(data, list):
+        return [data[i] for i in index.tolist()]
+    return tree_map(lambda x: x[index], data)
+
+
 class WriterEnsemble(Writer):
     """An ensemble of writers.
 
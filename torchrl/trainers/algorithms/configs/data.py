@@ -179,6 +179,8 @@ class SamplerWithoutReplacementConfig(SamplerConfig):
     _target_: str = "torchrl.data.replay_buffers.SamplerWithoutReplacement"
     drop_last: bool = False
     shuffle: bool = True
+    device: Any = None
+    chunk_size: int | None = None
 
 
 @dataclass